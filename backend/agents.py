@@ -1,14 +1,18 @@
 from abc import ABC, abstractmethod
-import openai
 import os
 from dotenv import load_dotenv
 from typing import Optional, List, Dict
 import json
 
+from utils.lazy_import import lazy_module
+
 load_dotenv()
 
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
+def _configure_openai(module) -> None:
+    module.api_key = os.getenv("OPENAI_API_KEY")
+
+# Initialize OpenAI client on first use; importing openai is slow
+openai = lazy_module("openai", on_load=_configure_openai)
 
 class BaseAgent(ABC):
     def __init__(self):
@@ -0,0 +1,345 @@
+"""baseline schema
+
+The tables as they were before migrations were introduced, written out
+explicitly so that later model changes cannot alter this revision. Tables
+that already exist (databases set up by the old ``create_all`` at startup)
+are left alone, so old and fresh databases end up at the same revision.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    """(表名, 列与约束, 索引) in dependency order."""
+    return [
+        ("users", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String()),
+            sa.Column("username", sa.String()),
+            sa.Column("hashed_password", sa.String()),
+            sa.Column("is_active", sa.Boolean()),
+            sa.Column("is_admin", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("last_login", sa.DateTime()),
+        ], [
+            ("ix_users_id", ["id"], False),
+            ("ix_users_email", ["email"], True),
+            ("ix_users_username", ["username"], True),
+        ]),
+        ("roles", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(50), nullable=False, unique=True),
+            sa.Column("description", sa.String(200)),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], []),
+        ("permissions", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(50), nullable=False, unique=True),
+            sa.Column("description", sa.String(200)),
+            sa.Column("resource_type", sa.String(50)),
+            sa.Column("action", sa.String(50)),
+            sa.Column("created_at", sa.DateTime()),
+        ], []),
+        ("role_permissions", [
+            sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id")),
+            sa.Column("permission_id", sa.Integer(), sa.ForeignKey("permissions.id")),
+        ], []),
+        ("user_roles", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id")),
+            sa.Column("created_at", sa.DateTime()),
+        ], []),
+        # files 表没有对应的模型，file_id 上的外键无处可指，只保留列
+        ("file_permissions", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("file_id", sa.Integer()),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("permission_type", sa.String(20)),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], []),
+        ("permission_audit_logs", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("action", sa.String(50)),
+            sa.Column("resource_type", sa.String(50)),
+            sa.Column("resource_id", sa.Integer()),
+            sa.Column("details", sa.JSON()),
+            sa.Column("ip_address", sa.String(50)),
+            sa.Column("timestamp", sa.DateTime()),
+        ], []),
+        ("knowledge_base", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("content", sa.Text()),
+            sa.Column("category", sa.String()),
+            sa.Column("file_path", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("metadata", sa.JSON(), nullable=True),
+        ], [
+            ("ix_knowledge_base_id", ["id"], False),
+            ("ix_knowledge_base_title", ["title"], False),
+            ("ix_knowledge_base_category", ["category"], False),
+        ]),
+        ("portfolio_progress", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("student_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("project_name", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("feedback", sa.Text(), nullable=True),
+            sa.Column("last_updated", sa.DateTime()),
+        ], [
+            ("ix_portfolio_progress_id", ["id"], False),
+            ("ix_portfolio_progress_project_name", ["project_name"], False),
+        ]),
+        ("chat_history", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("message", sa.Text()),
+            sa.Column("response", sa.Text()),
+            sa.Column("timestamp", sa.DateTime()),
+            sa.Column("agent_type", sa.String()),
+        ], [
+            ("ix_chat_history_id", ["id"], False),
+        ]),
+        ("application_checklist", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("school_name", sa.String()),
+            sa.Column("checklist_items", sa.JSON()),
+            sa.Column("visa_requirements", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], [
+            ("ix_application_checklist_id", ["id"], False),
+            ("ix_application_checklist_school_name", ["school_name"], False),
+        ]),
+        ("course_summaries", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("course_name", sa.String()),
+            sa.Column("summary_content", sa.Text()),
+            sa.Column("homework_requirements", sa.JSON()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("audio_file_path", sa.String(), nullable=True),
+            sa.Column("transcription", sa.Text(), nullable=True),
+        ], [
+            ("ix_course_summaries_id", ["id"], False),
+            ("ix_course_summaries_course_name", ["course_name"], False),
+        ]),
+        ("chat_sessions", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("title", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("is_active", sa.Boolean()),
+        ], [
+            ("ix_chat_sessions_id", ["id"], False),
+        ]),
+        ("chat_messages", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("session_id", sa.Integer(), sa.ForeignKey("chat_sessions.id")),
+            sa.Column("role", sa.String()),
+            sa.Column("content", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("knowledge_references", sa.JSON()),
+            sa.Column("sentiment", sa.String()),
+            sa.Column("intent", sa.String()),
+        ], [
+            ("ix_chat_messages_id", ["id"], False),
+        ]),
+        ("student_profiles", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), unique=True),
+            sa.Column("learning_style", sa.String()),
+            sa.Column("interests", sa.JSON()),
+            sa.Column("study_goals", sa.Text()),
+            sa.Column("preferred_topics", sa.JSON()),
+            sa.Column("chat_history_summary", sa.Text()),
+            sa.Column("last_interaction", sa.DateTime()),
+        ], [
+            ("ix_student_profiles_id", ["id"], False),
+        ]),
+        ("chatbot_knowledge", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("category", sa.String()),
+            sa.Column("title", sa.String()),
+            sa.Column("content", sa.Text()),
+            sa.Column("keywords", sa.JSON()),
+            sa.Column("related_topics", sa.JSON()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("usage_count", sa.Integer()),
+            sa.Column("rating", sa.Float()),
+        ], [
+            ("ix_chatbot_knowledge_id", ["id"], False),
+        ]),
+        ("platform_integrations", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("platform_type", sa.String()),
+            sa.Column("platform_user_id", sa.String()),
+            sa.Column("access_token", sa.String()),
+            sa.Column("refresh_token", sa.String()),
+            sa.Column("token_expires_at", sa.DateTime()),
+            sa.Column("platform_settings", sa.JSON()),
+            sa.Column("is_active", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], [
+            ("ix_platform_integrations_id", ["id"], False),
+        ]),
+        ("platform_messages", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("platform_integration_id", sa.Integer(), sa.ForeignKey("platform_integrations.id")),
+            sa.Column("message_type", sa.String()),
+            sa.Column("content", sa.String()),
+            sa.Column("platform_message_id", sa.String()),
+            sa.Column("direction", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("metadata", sa.JSON()),
+            sa.Column("created_at", sa.DateTime()),
+        ], [
+            ("ix_platform_messages_id", ["id"], False),
+        ]),
+        # 学习模块引用了 students、courses 表但基线没有定义它们，这里建出最小的表以满足外键
+        ("students", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+        ], [
+            ("ix_students_id", ["id"], False),
+        ]),
+        ("courses", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String()),
+            sa.Column("description", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+        ], [
+            ("ix_courses_id", ["id"], False),
+        ]),
+        ("enrollments", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id")),
+            sa.Column("course_id", sa.Integer(), sa.ForeignKey("courses.id")),
+            sa.Column("status", sa.String()),
+            sa.Column("progress", sa.Float()),
+            sa.Column("last_activity", sa.DateTime()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], [
+            ("ix_enrollments_id", ["id"], False),
+        ]),
+        ("activities", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id")),
+            sa.Column("course_id", sa.Integer(), sa.ForeignKey("courses.id")),
+            sa.Column("description", sa.Text()),
+            sa.Column("status", sa.String()),
+            sa.Column("date", sa.DateTime()),
+            sa.Column("created_at", sa.DateTime()),
+        ], [
+            ("ix_activities_id", ["id"], False),
+        ]),
+        ("milestones", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id")),
+            sa.Column("title", sa.String()),
+            sa.Column("description", sa.Text()),
+            sa.Column("progress", sa.Float()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], [
+            ("ix_milestones_id", ["id"], False),
+        ]),
+        ("visa_checklist_items", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("description", sa.Text()),
+            sa.Column("category", sa.String()),
+            sa.Column("completed", sa.Boolean()),
+            sa.Column("deadline", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], [
+            ("ix_visa_checklist_items_id", ["id"], False),
+        ]),
+        ("visa_mock_interviews", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("description", sa.Text()),
+            sa.Column("level", sa.String()),
+            sa.Column("duration", sa.Integer()),
+            sa.Column("preparation_steps", sa.Text()),
+            sa.Column("interview_url", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], [
+            ("ix_visa_mock_interviews_id", ["id"], False),
+        ]),
+        ("visa_interview_questions", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("interview_id", sa.Integer(), sa.ForeignKey("visa_mock_interviews.id")),
+            sa.Column("question", sa.Text()),
+            sa.Column("answer", sa.Text()),
+            sa.Column("category", sa.String()),
+            sa.Column("difficulty", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+        ], [
+            ("ix_visa_interview_questions_id", ["id"], False),
+        ]),
+        ("visa_interview_feedback", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("interview_id", sa.Integer(), sa.ForeignKey("visa_mock_interviews.id")),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("rating", sa.Integer()),
+            sa.Column("feedback", sa.Text()),
+            sa.Column("strengths", sa.Text()),
+            sa.Column("weaknesses", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+        ], [
+            ("ix_visa_interview_feedback_id", ["id"], False),
+        ]),
+        ("visa_application_status", [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("status", sa.String()),
+            sa.Column("current_step", sa.String()),
+            sa.Column("next_deadline", sa.DateTime()),
+            sa.Column("completed_steps", sa.Text()),
+            sa.Column("pending_steps", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ], [
+            ("ix_visa_application_status_id", ["id"], False),
+        ]),
+    ]
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, columns, indexes in _tables():
+        if name in existing:
+            continue
+        op.create_table(name, *columns)
+        for index_name, index_columns, unique in indexes:
+            op.create_index(index_name, name, index_columns, unique=unique)
+
+
+def downgrade():
+    pass
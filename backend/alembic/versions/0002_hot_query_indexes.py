@@ -0,0 +1,79 @@
+"""composite indexes for the hot query predicates
+
+Every index matches the filter columns followed by the sort columns of a
+router query. Indexes that already exist (for example because the table was
+created from the current models) are skipped. On Postgres they are built
+CONCURRENTLY so that large tables are not locked for writes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 列)
+HOT_INDEXES = [
+    ("ix_chat_history_user_agent_timestamp", "chat_history", ["user_id", "agent_type", "timestamp"]),
+    ("ix_chat_history_user_timestamp", "chat_history", ["user_id", "timestamp"]),
+    ("ix_chat_sessions_user_active_updated", "chat_sessions", ["user_id", "is_active", "updated_at", "id"]),
+    ("ix_chat_messages_session_created", "chat_messages", ["session_id", "created_at", "id"]),
+    ("ix_chatbot_knowledge_category", "chatbot_knowledge", ["category"]),
+    ("ix_knowledge_base_owner_id", "knowledge_base", ["owner_id", "id"]),
+    ("ix_knowledge_base_owner_category_id", "knowledge_base", ["owner_id", "category", "id"]),
+    ("ix_portfolio_progress_student_id", "portfolio_progress", ["student_id", "id"]),
+    ("ix_portfolio_progress_student_updated", "portfolio_progress", ["student_id", "last_updated"]),
+    ("ix_application_checklist_user_id", "application_checklist", ["user_id", "id"]),
+    ("ix_file_permissions_file_user", "file_permissions", ["file_id", "user_id"]),
+    ("ix_user_roles_user_role", "user_roles", ["user_id", "role_id"]),
+    ("ix_platform_integrations_platform_user", "platform_integrations", ["platform_type", "platform_user_id", "is_active"]),
+    ("ix_platform_integrations_user_active", "platform_integrations", ["user_id", "is_active"]),
+    ("ix_platform_messages_integration_created", "platform_messages", ["platform_integration_id", "created_at"]),
+    ("ix_enrollments_student_status", "enrollments", ["student_id", "status"]),
+    ("ix_enrollments_student_last_activity", "enrollments", ["student_id", "last_activity", "id"]),
+    ("ix_activities_student_date", "activities", ["student_id", "date"]),
+    ("ix_milestones_student_id", "milestones", ["student_id", "id"]),
+    ("ix_visa_interview_questions_interview_id", "visa_interview_questions", ["interview_id"]),
+]
+
+
+def _existing_indexes():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    return tables, {
+        table: {index["name"] for index in inspector.get_indexes(table)}
+        for table in tables
+    }
+
+
+def upgrade():
+    tables, indexes = _existing_indexes()
+    missing = [
+        (name, table, columns)
+        for name, table, columns in HOT_INDEXES
+        if table in tables and name not in indexes[table]
+    ]
+    if not missing:
+        return
+
+    if op.get_bind().dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY 不能在事务中执行
+        with op.get_context().autocommit_block():
+            for name, table, columns in missing:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in missing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    tables, indexes = _existing_indexes()
+    for name, table, _ in HOT_INDEXES:
+        if table in tables and name in indexes[table]:
+            op.drop_index(name, table_name=table)
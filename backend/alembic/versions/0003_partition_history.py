@@ -0,0 +1,95 @@
+"""monthly range partitioning for history tables
+
+Converts chat_history, chat_messages and platform_messages into tables
+partitioned by month on their timestamp column, with a DEFAULT partition
+for anything outside the created ranges. Existing rows are copied over.
+SQLite has no partitioning, so there the tables stay as they are.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from utils.history_archive import (
+    HISTORY_PARTITIONS_AHEAD,
+    HISTORY_TABLES,
+    add_months,
+    create_month_partition,
+    is_partitioned,
+    month_start,
+)
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def _recreate(table, column, partitioned):
+    """Copy ``table`` into a new table (partitioned or plain) with the same indexes and FKs."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    indexes = inspector.get_indexes(table)
+    foreign_keys = inspector.get_foreign_keys(table)
+    legacy = f"{table}_legacy"
+
+    op.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    if partitioned:
+        # 分区键必须属于主键，且不能为空
+        op.execute(f'UPDATE "{legacy}" SET "{column}" = now() WHERE "{column}" IS NULL')
+        op.execute(
+            f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ("{column}")'
+        )
+        op.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, "{column}")')
+
+        oldest = bind.execute(sa.text(f'SELECT min("{column}") FROM "{legacy}"')).scalar()
+        current = month_start(datetime.utcnow())
+        month = month_start(oldest) if oldest else current
+        while month <= add_months(current, HISTORY_PARTITIONS_AHEAD):
+            create_month_partition(bind, table, month)
+            month = add_months(month, 1)
+        op.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+    else:
+        op.execute(f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS)')
+        op.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id)')
+
+    # id 序列随旧表一起删除，先转移所有权
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": legacy}).scalar()
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id')
+
+    op.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    op.execute(f'DROP TABLE "{legacy}"')
+
+    for index in indexes:
+        op.create_index(index["name"], table, index["column_names"], unique=index["unique"] and not partitioned)
+    for fk in foreign_keys:
+        op.create_foreign_key(
+            fk["name"], table, fk["referred_table"],
+            fk["constrained_columns"], fk["referred_columns"]
+        )
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    tables = set(sa.inspect(bind).get_table_names())
+    for table, column in HISTORY_TABLES.items():
+        if table in tables and not is_partitioned(bind, table):
+            _recreate(table, column, partitioned=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    for table, column in HISTORY_TABLES.items():
+        if is_partitioned(bind, table):
+            _recreate(table, column, partitioned=False)
@@ -0,0 +1,40 @@
+"""bitmask column for file permissions
+
+Adds file_permissions.permission_mask and backfills it from the
+comma-separated permission_type (read=1, write=2, delete=4, share=8).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# 迁移时的位定义，与 utils.permission_utils.FILE_PERMISSION_BITS 保持一致，但不随其改动
+FILE_PERMISSION_BITS = {"read": 1, "write": 2, "delete": 4, "share": 8}
+
+
+def upgrade():
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("file_permissions")}
+    if "permission_mask" not in columns:
+        with op.batch_alter_table("file_permissions") as batch_op:
+            batch_op.add_column(sa.Column("permission_mask", sa.Integer(), nullable=True))
+
+    # 在逗号两端补上分隔符再匹配，避免子串误判
+    padded = "',' || replace(permission_type, ' ', '') || ','"
+    terms = " + ".join(
+        f"CASE WHEN {padded} LIKE '%,{name},%' THEN {bit} ELSE 0 END"
+        for name, bit in FILE_PERMISSION_BITS.items()
+    )
+    op.execute(f"UPDATE file_permissions SET permission_mask = {terms} WHERE permission_mask IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table("file_permissions") as batch_op:
+        batch_op.drop_column("permission_mask")
@@ -0,0 +1,64 @@
+"""doc_key on knowledge entries for batch permission resolution
+
+Search hits only carry the vector store doc_key; storing it on the entry
+lets a page of hits be resolved to entries and permissions in one query.
+Existing rows are backfilled from the "id" stored in their metadata JSON.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade():
+    bind = op.get_bind()
+    columns = {column["name"] for column in sa.inspect(bind).get_columns("knowledge_base")}
+    if "doc_key" not in columns:
+        with op.batch_alter_table("knowledge_base") as batch_op:
+            batch_op.add_column(sa.Column("doc_key", sa.String(), nullable=True))
+            batch_op.create_index("ix_knowledge_base_doc_key", ["doc_key"])
+
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, metadata FROM knowledge_base "
+            "WHERE id > :last_id AND doc_key IS NULL ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, metadata in rows:
+            if isinstance(metadata, str):
+                try:
+                    metadata = json.loads(metadata)
+                except ValueError:
+                    metadata = None
+            # 路由写入前已 json.dumps，JSON 列里存的是字符串，需要再解析一次
+            if isinstance(metadata, str):
+                try:
+                    metadata = json.loads(metadata)
+                except ValueError:
+                    metadata = None
+            if isinstance(metadata, dict) and metadata.get("id"):
+                updates.append({"id": row_id, "doc_key": str(metadata["id"])})
+        if updates:
+            bind.execute(sa.text("UPDATE knowledge_base SET doc_key = :doc_key WHERE id = :id"), updates)
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    with op.batch_alter_table("knowledge_base") as batch_op:
+        batch_op.drop_index("ix_knowledge_base_doc_key")
+        batch_op.drop_column("doc_key")
@@ -0,0 +1,48 @@
+"""unique (role_id, permission_id) on role_permissions
+
+Startup seeding used to append every permission to the admin role on each
+boot, so the association table holds duplicate pairs. They are removed and
+a unique constraint stops them from coming back; seeding now relies on it
+for ON CONFLICT DO NOTHING.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+CONSTRAINT_NAME = "uq_role_permissions_role_permission"
+
+
+def upgrade():
+    bind = op.get_bind()
+    constraints = {c["name"] for c in sa.inspect(bind).get_unique_constraints("role_permissions")}
+    if CONSTRAINT_NAME in constraints:
+        return
+
+    # 每组重复的关联只保留一行
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "DELETE FROM role_permissions a USING role_permissions b "
+            "WHERE a.ctid > b.ctid AND a.role_id = b.role_id AND a.permission_id = b.permission_id"
+        )
+    else:
+        op.execute(
+            "DELETE FROM role_permissions WHERE rowid NOT IN "
+            "(SELECT min(rowid) FROM role_permissions GROUP BY role_id, permission_id)"
+        )
+
+    with op.batch_alter_table("role_permissions") as batch_op:
+        batch_op.create_unique_constraint(CONSTRAINT_NAME, ["role_id", "permission_id"])
+
+
+def downgrade():
+    with op.batch_alter_table("role_permissions") as batch_op:
+        batch_op.drop_constraint(CONSTRAINT_NAME, type_="unique")
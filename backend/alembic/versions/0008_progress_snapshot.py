@@ -0,0 +1,38 @@
+"""precomputed learning progress snapshot per student
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "student_progress_snapshot" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "student_progress_snapshot",
+        sa.Column("student_id", sa.Integer(), sa.ForeignKey("students.id"), primary_key=True),
+        sa.Column("completed", sa.Integer()),
+        sa.Column("in_progress", sa.Integer()),
+        sa.Column("not_started", sa.Integer()),
+        sa.Column("activity_count", sa.Integer()),
+        sa.Column("milestone_count", sa.Integer()),
+        sa.Column("courses", sa.JSON()),
+        sa.Column("recent_activities", sa.JSON()),
+        sa.Column("milestones", sa.JSON()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("student_progress_snapshot")
@@ -0,0 +1,46 @@
+"""unique doc_key on knowledge entries
+
+A bulk import committed its batch before writing the checkpoint, so a crash
+or a rerun under a new job id inserted the same documents again. Duplicate
+entries are removed (the oldest row is kept) and the doc_key index becomes
+unique; the importer upserts on it, so a rerun no longer needs the checkpoint
+to stay idempotent.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "ix_knowledge_base_doc_key"
+
+
+def upgrade():
+    indexes = {index["name"]: index for index in sa.inspect(op.get_bind()).get_indexes("knowledge_base")}
+    if indexes.get(INDEX_NAME, {}).get("unique"):
+        return
+
+    # 每个 doc_key 只保留最早的条目
+    op.execute(
+        "DELETE FROM knowledge_base WHERE doc_key IS NOT NULL AND id NOT IN "
+        "(SELECT min_id FROM (SELECT min(id) AS min_id FROM knowledge_base "
+        "WHERE doc_key IS NOT NULL GROUP BY doc_key) AS keep)"
+    )
+
+    with op.batch_alter_table("knowledge_base") as batch_op:
+        if INDEX_NAME in indexes:
+            batch_op.drop_index(INDEX_NAME)
+        batch_op.create_index(INDEX_NAME, ["doc_key"], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table("knowledge_base") as batch_op:
+        batch_op.drop_index(INDEX_NAME)
+        batch_op.create_index(INDEX_NAME, ["doc_key"])
@@ -4,6 +4,8 @@ from openai import OpenAI
 import numpy as np
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from utils.metrics import record_embedding_batch, record_llm_usage, track_llm_call
+
 class OpenAIEmbeddings:
     def __init__(self, api_key: str, model: str = "text-embedding-3-small"):
         """
@@ -27,10 +29,13 @@ class OpenAIEmbeddings:
             return []
             
         # 批量处理文本
-        response = self.client.embeddings.create(
-            model=self.model,
-            input=texts
-        )
+        record_embedding_batch("embed_documents", len(texts))
+        with track_llm_call("openai", "embedding"):
+            response = self.client.embeddings.create(
+                model=self.model,
+                input=texts
+            )
+        record_llm_usage("openai", response.usage)
         
         # 提取嵌入向量
         embeddings = [data.embedding for data in response.data]
@@ -43,10 +48,13 @@ class OpenAIEmbeddings:
         :param text: 查询文本
         :return: 嵌入向量
         """
-        response = self.client.embeddings.create(
-            model=self.model,
-            input=text
-        )
+        record_embedding_batch("embed_query", 1)
+        with track_llm_call("openai", "embedding"):
+            response = self.client.embeddings.create(
+                model=self.model,
+                input=text
+            )
+        record_llm_usage("openai", response.usage)
         return response.data[0].embedding
 
     def get_embedding_dimension(self) -> int:
@@ -14,6 +14,8 @@ import yaml
 from dataclasses import dataclass
 from enum import Enum
 
+from utils.metrics import record_llm_usage, track_llm_call
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -46,6 +48,9 @@ class ModelConfig:
 
 class BaseLLM(ABC):
     """大模型服务基类"""
+
+    # 指标中的 provider 标签
+    provider = "unknown"
     
     def __init__(self, config: ModelConfig):
         self.config = config
@@ -79,6 +84,8 @@ class BaseLLM(ABC):
 
 class OpenAILLM(BaseLLM):
     """OpenAI 模型服务"""
+
+    provider = ModelProvider.OPENAI.value
     
     def __init__(self, config: ModelConfig):
         super().__init__(config)
@@ -99,18 +106,20 @@ class OpenAILLM(BaseLLM):
         try:
             self._log_request("chat_completion", messages=messages)
             
-            response = self.client.chat.completions.create(
-                model=self.config.model,
-                messages=messages,
-                temperature=temperature or self.config.temperature,
-                max_tokens=max_tokens or self.config.max_tokens,
-                stream=stream
-            )
+            with track_llm_call(self.provider, "chat_completion"):
+                response = self.client.chat.completions.create(
+                    model=self.config.model,
+                    messages=messages,
+                    temperature=temperature or self.config.temperature,
+                    max_tokens=max_tokens or self.config.max_tokens,
+                    stream=stream
+                )
             
             if stream:
                 self._log_response("chat_completion", "streaming response")
                 return response
             else:
+                record_llm_usage(self.provider, response.usage)
                 result = {
                     "content": response.choices[0].message.content,
                     "role": response.choices[0].message.role,
@@ -127,10 +136,12 @@ class OpenAILLM(BaseLLM):
         try:
             self._log_request("get_embedding", text=text)
             
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
+            with track_llm_call(self.provider, "embedding"):
+                response = self.client.embeddings.create(
+                    model="text-embedding-3-small",
+                    input=text
+                )
+            record_llm_usage(self.provider, response.usage)
             
             embedding = response.data[0].embedding
             self._log_response("get_embedding", f"vector length: {len(embedding)}")
@@ -141,6 +152,8 @@ class OpenAILLM(BaseLLM):
 
 class QwenLLM(BaseLLM):
     """通义千问模型服务"""
+
+    provider = ModelProvider.QWEN.value
     
     def __init__(self, config: ModelConfig):
         super().__init__(config)
@@ -157,18 +170,20 @@ class QwenLLM(BaseLLM):
         try:
             self._log_request("chat_completion", messages=messages)
             
-            response = Generation.call(
-                model=self.config.model,
-                messages=messages,
-                temperature=temperature or self.config.temperature,
-                max_tokens=max_tokens or self.config.max_tokens,
-                stream=stream
-            )
+            with track_llm_call(self.provider, "chat_completion"):
+                response = Generation.call(
+                    model=self.config.model,
+                    messages=messages,
+                    temperature=temperature or self.config.temperature,
+                    max_tokens=max_tokens or self.config.max_tokens,
+                    stream=stream
+                )
             
             if stream:
                 self._log_response("chat_completion", "streaming response")
                 return response
             else:
+                record_llm_usage(self.provider, getattr(response, "usage", None))
                 result = {
                     "content": response.output.text,
                     "role": "assistant",
@@ -184,10 +199,11 @@ class QwenLLM(BaseLLM):
         try:
             self._log_request("get_embedding", text=text)
             
-            response = Generation.call(
-                model="text-embedding-v1",
-                input=text
-            )
+            with track_llm_call(self.provider, "embedding"):
+                response = Generation.call(
+                    model="text-embedding-v1",
+                    input=text
+                )
             
             embedding = response.output.embeddings[0]
             self._log_response("get_embedding", f"vector length: {len(embedding)}")
@@ -198,6 +214,8 @@ class QwenLLM(BaseLLM):
 
 class AnthropicLLM(BaseLLM):
     """Anthropic Claude 模型服务"""
+
+    provider = ModelProvider.ANTHROPIC.value
     
     def __init__(self, config: ModelConfig):
         super().__init__(config)
@@ -231,13 +249,14 @@ class AnthropicLLM(BaseLLM):
                 "stream": stream
             }
             
-            response = requests.post(
-                f"{self.api_base}/complete",
-                headers=headers,
-                json=data,
-                timeout=self.config.timeout
-            )
-            response.raise_for_status()
+            with track_llm_call(self.provider, "chat_completion"):
+                response = requests.post(
+                    f"{self.api_base}/complete",
+                    headers=headers,
+                    json=data,
+                    timeout=self.config.timeout
+                )
+                response.raise_for_status()
             
             result = response.json()
             self._log_response("chat_completion", result)
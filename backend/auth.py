@@ -1,15 +1,26 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from database import AsyncSessionLocal
 import models
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from utils.metrics import record_cache
+from utils.rate_limit import login_limiter, login_limits
+from utils.redis_client import call_redis, get_redis, redis_in_background
+
 load_dotenv()
 
 # Security configuration
@@ -17,15 +28,45 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt 成本参数；修改后旧哈希会在用户下次登录时自动重新计算
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 专用哈希线程数（bcrypt 计算时释放 GIL）和排队上限
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots: Optional[asyncio.Semaphore] = None
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def _run_hashing(func, *args):
+    """Run a bcrypt call on the hashing pool so the event loop keeps serving requests."""
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+    async with _hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+
+async def averify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also returns a new hash when the stored one uses outdated parameters."""
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def aget_password_hash(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -36,9 +77,153 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_access_token(user: models.User, expires_delta: Optional[timedelta] = None) -> str:
+    """Access token carrying the user id, flags and token version as claims."""
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "adm": bool(user.is_admin),
+            "act": bool(user.is_active),
+            "ver": user.token_version or 0
+        },
+        expires_delta=expires_delta
+    )
+
+# 已解码令牌的 LRU 缓存，避免每个请求都做签名校验
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+# 用户信息缓存的有效期（秒）；配置 Redis 时用户变更会立即使所有进程的缓存失效
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+
+class TokenCache:
+    """LRU of decoded token payloads; expired payloads are never returned."""
+
+    def __init__(self, max_entries: int = AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, token: str) -> dict:
+        with self._lock:
+            payload = self._entries.get(token)
+            if payload is not None:
+                self._entries.move_to_end(token)
+        record_cache("auth_token", payload is not None)
+        if payload is not None:
+            if payload.get("exp", 0) > time.time():
+                return payload
+            with self._lock:
+                self._entries.pop(token, None)
+            raise JWTError("Signature has expired.")
+
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with self._lock:
+            self._entries[token] = payload
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+class UserCache:
+    """Short-TTL cache of the user fields that authentication needs, keyed by ``sub``.
+
+    Every user update bumps ``auth_user:{id}`` in Redis after commit; a cached
+    entry whose stamp no longer matches is reloaded, so deactivation and
+    token revocation take effect on the next request in every worker. Without
+    Redis only the local worker is invalidated and others rely on the TTL.
+    ``get`` and ``put`` read the stamp from Redis, so async callers go
+    through ``call_redis``.
+    """
+
+    KEY_PREFIX = "auth_user:"
+
+    def __init__(self, ttl: float = AUTH_USER_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Optional[int], dict]] = {}
+        self._lock = threading.Lock()
+
+    def _stamp(self, user_id: Optional[int]) -> Optional[int]:
+        client = get_redis()
+        if client is None or user_id is None:
+            return None
+        try:
+            return int(client.get(self.KEY_PREFIX + str(user_id)) or 0)
+        except Exception:
+            return None
+
+    def get(self, sub: str, user_id: Optional[int]) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(sub)
+        if entry is None:
+            return None
+        expires_at, stamp, fields = entry
+        if expires_at < time.monotonic() or stamp != self._stamp(user_id if user_id is not None else fields["id"]):
+            self.discard(sub)
+            return None
+        return fields
+
+    def put(self, sub: str, fields: dict) -> None:
+        stamp = self._stamp(fields["id"])
+        with self._lock:
+            self._entries[sub] = (time.monotonic() + self.ttl, stamp, fields)
+
+    def discard(self, sub: str) -> None:
+        with self._lock:
+            self._entries.pop(sub, None)
+
+    def _bump(self, user_id: int) -> None:
+        client = get_redis()
+        if client is not None:
+            try:
+                client.incr(self.KEY_PREFIX + str(user_id))
+            except Exception:
+                pass
+
+    def invalidate(self, user_id: int, username: Optional[str] = None) -> None:
+        # 提交后的事件可能在事件循环线程中触发，Redis 写入放到后台
+        redis_in_background(self._bump, user_id)
+        with self._lock:
+            for sub in [sub for sub, (_, _, fields) in self._entries.items() if fields["id"] == user_id]:
+                del self._entries[sub]
+            if username is not None:
+                self._entries.pop(username, None)
+
+token_cache = TokenCache()
+user_cache = UserCache()
+
+# 用户信息变更时提交后使缓存失效
+def _mark_user_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("auth_users_changed", set()).add((target.id, target.username))
+
+for _event in ("after_update", "after_delete"):
+    event.listen(models.User, _event, _mark_user_changed)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session) -> None:
+    for user_id, username in session.info.pop("auth_users_changed", ()):
+        user_cache.invalidate(user_id, username)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_changes(session) -> None:
+    session.info.pop("auth_users_changed", None)
+
+def _user_fields(user: models.User) -> dict:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "is_active": user.is_active,
+        "is_admin": user.is_admin,
+        "token_version": user.token_version or 0
+    }
+
+def revoke_user_tokens(user: models.User) -> None:
+    """Invalidate every token issued to ``user``; takes effect once the caller commits."""
+    user.token_version = (user.token_version or 0) + 1
+
 async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme)
 ) -> models.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,17 +231,34 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = token_cache.decode(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    user_id = payload.get("uid")
+    fields = await call_redis(user_cache.get, username, user_id)
+    record_cache("auth_user", fields is not None)
+    if fields is None:
+        async with AsyncSessionLocal() as db:
+            if user_id is not None:
+                user = await db.get(models.User, user_id)
+            else:
+                result = await db.execute(select(models.User).where(models.User.username == username))
+                user = result.scalars().first()
+        if user is None or user.username != username:
+            raise credentials_exception
+        fields = _user_fields(user)
+        await call_redis(user_cache.put, username, fields)
+    
+    # Tokens issued before the last revocation carry an older version
+    if payload.get("ver", 0) != fields["token_version"]:
         raise credentials_exception
-    return user
+    
+    # Detached snapshot of the user; routes only read its columns
+    return models.User(**fields)
 
 async def get_current_active_user(
     current_user: models.User = Depends(get_current_user)
@@ -65,10 +267,34 @@ async def get_current_active_user(
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
-    user = db.query(models.User).filter(models.User.username == username).first()
+async def authenticate_user(
+    db: AsyncSession,
+    username: str,
+    password: str,
+    client_ip: Optional[str] = None
+) -> Optional[models.User]:
+    limits = login_limits(username, client_ip)
+    retry_after = await call_redis(login_limiter.retry_after, limits.items())
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+    
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    user = result.scalars().first()
     if not user:
+        await call_redis(login_limiter.record_failure, limits)
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await averify_password(password, user.hashed_password)
+    if not valid:
+        await call_redis(login_limiter.record_failure, limits)
         return None
+    
+    await call_redis(login_limiter.reset, f"login:account:{username.lower()}")
+    if new_hash:
+        # 成本参数已变更，用新参数重新保存哈希
+        user.hashed_password = new_hash
+        await db.commit()
     return user 
\ No newline at end of file
@@ -1,30 +1,300 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from contextvars import ContextVar, Token
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import itertools
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from utils.db_metrics import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    label_pool,
+    pool_snapshots
+)
+from utils.redis_client import call_redis, get_redis, redis_in_background
+
 load_dotenv()
 
 # Database URL from environment variable or default to SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ai_course_system.db")
 
+def to_async_url(url: str) -> str:
+    """Map a sync database URL to its asyncio driver (asyncpg / aiosqlite)."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite:///"):
+        return "sqlite+aiosqlite:///" + url[len("sqlite:///"):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+# Connection pool settings (per engine, per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "true")
+# 通过 PgBouncer (transaction 模式) 连接时由 PgBouncer 负责连接池，并关闭预编译语句缓存
+DB_PGBOUNCER = _env_flag("DB_PGBOUNCER", "false")
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Pool and driver options for an engine on ``url``."""
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}} if not is_async else {}
+
+    if DB_PGBOUNCER:
+        options = {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+        if is_async:
+            options["connect_args"] = {"statement_cache_size": 0}
+        return options
+
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def pgbouncer_async_url(url: str) -> str:
+    if DB_PGBOUNCER and url.startswith("postgresql+asyncpg://"):
+        return url + ("&" if "?" in url else "?") + "prepared_statement_cache_size=0"
+    return url
+
 # Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+label_pool(engine.pool, "primary")
+
+# Async engine used by the FastAPI routes so DB I/O does not block the event loop
+ASYNC_DATABASE_URL = pgbouncer_async_url(ASYNC_DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+label_pool(async_engine.sync_engine.pool, "primary_async")
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Objects stay usable after commit, since async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create Base class
 Base = declarative_base()
 
+# Read replicas (comma separated URLs); reads fall back to the primary when none is usable
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+# 用户写入后在该时间窗口内的读取都走主库，保证读到自己的写入
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+
+# 复制延迟（秒）；主从已同步时为 0
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class Replica:
+    """A read replica with its own engines and a cached replication-lag check."""
+
+    def __init__(self, index: int, url: str):
+        self.name = f"replica{index}"
+        self.engine = create_engine(url, **engine_options(url))
+        label_pool(self.engine.pool, self.name)
+        async_url = pgbouncer_async_url(to_async_url(url))
+        self.async_engine = create_async_engine(async_url, **engine_options(async_url, is_async=True))
+        label_pool(self.async_engine.sync_engine.pool, f"{self.name}_async")
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.AsyncSessionLocal = sessionmaker(
+            self.async_engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+
+    def _needs_check(self) -> bool:
+        return time.monotonic() - self.checked_at >= DB_REPLICA_CHECK_INTERVAL
+
+    def _record(self, lag: Optional[float]) -> None:
+        self.lag = lag
+        self.healthy = lag is not None and lag <= DB_REPLICA_MAX_LAG_SECONDS
+        self.checked_at = time.monotonic()
+
+    def is_usable(self) -> bool:
+        if self._needs_check():
+            try:
+                with self.engine.connect() as conn:
+                    self._record(float(conn.execute(REPLICA_LAG_QUERY).scalar() or 0))
+            except Exception:
+                self._record(None)
+        return self.healthy
+
+    async def is_usable_async(self) -> bool:
+        if self._needs_check():
+            try:
+                async with self.async_engine.connect() as conn:
+                    self._record(float((await conn.execute(REPLICA_LAG_QUERY)).scalar() or 0))
+            except Exception:
+                self._record(None)
+        return self.healthy
+
+replicas = [Replica(i, url) for i, url in enumerate(DATABASE_REPLICA_URLS)]
+_replica_cursor = itertools.count()
+
+# Identity of the caller for read-your-writes stickiness, bound per request
+_request_identity: ContextVar[Optional[str]] = ContextVar("request_identity", default=None)
+
+def bind_request_identity(credentials: Optional[str]) -> Token:
+    key = hashlib.sha1(credentials.encode("utf-8")).hexdigest() if credentials else None
+    return _request_identity.set(key)
+
+def reset_request_identity(token: Token) -> None:
+    _request_identity.reset(token)
+
+# 本进程的写入标记（身份 -> 过期时间）；有效期都相同，按插入顺序即按过期顺序
+_local_recent_writes: "OrderedDict[str, float]" = OrderedDict()
+_local_recent_writes_lock = threading.Lock()
+
+def _remember_write_shared(key: str) -> None:
+    client = get_redis()
+    if client is not None:
+        try:
+            client.setex(f"recent_write:{key}", max(1, int(DB_READ_YOUR_WRITES_SECONDS)), 1)
+        except Exception:
+            pass
+
+def mark_recent_write() -> None:
+    """Route the current caller's reads to the primary for a short window."""
+    key = _request_identity.get()
+    if key is None or not replicas:
+        return
+    # 本进程立即可见；Redis 写入（其他 worker 可见）不阻塞事件循环
+    now = time.monotonic()
+    with _local_recent_writes_lock:
+        _local_recent_writes[key] = now + DB_READ_YOUR_WRITES_SECONDS
+        _local_recent_writes.move_to_end(key)
+        # 插入时从头部淘汰已过期的标记，字典只保留有效期内的身份
+        while next(iter(_local_recent_writes.values())) < now:
+            _local_recent_writes.popitem(last=False)
+    redis_in_background(_remember_write_shared, key)
+
+def has_recent_write() -> bool:
+    """Blocking when Redis is configured; async callers use ``ahas_recent_write``."""
+    key = _request_identity.get()
+    if key is None:
+        return False
+    expires = _local_recent_writes.get(key)
+    if expires is not None and expires >= time.monotonic():
+        return True
+    client = get_redis()
+    if client is not None:
+        try:
+            return bool(client.exists(f"recent_write:{key}"))
+        except Exception:
+            pass
+    return False
+
+async def ahas_recent_write() -> bool:
+    if _request_identity.get() is None:
+        return False
+    return await call_redis(has_recent_write)
+
+@event.listens_for(Session, "after_flush")
+def _flag_orm_writes(session, flush_context) -> None:
+    session.info["has_writes"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_bulk_writes(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+@event.listens_for(Session, "after_commit")
+def _remember_commit(session) -> None:
+    if session.info.pop("has_writes", False):
+        mark_recent_write()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session) -> None:
+    session.info.pop("has_writes", None)
+
+def _replica_order() -> list:
+    start = next(_replica_cursor)
+    return [replicas[(start + i) % len(replicas)] for i in range(len(replicas))]
+
+def read_session_factory():
+    """Session factory for a read-only request: a healthy replica, or the primary."""
+    if replicas and not has_recent_write():
+        for replica in _replica_order():
+            if replica.is_usable():
+                return replica.SessionLocal
+    return SessionLocal
+
+async def async_read_session_factory():
+    if replicas and not await ahas_recent_write():
+        for replica in _replica_order():
+            if await replica.is_usable_async():
+                return replica.AsyncSessionLocal
+    return AsyncSessionLocal
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency to get a read-only DB session (replica when possible)
+def get_read_db():
+    db = read_session_factory()()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency to get a read-only async DB session (replica when possible)
+async def get_async_read_db():
+    factory = await async_read_session_factory()
+    async with factory() as db:
+        yield db
+
+def get_pool_stats() -> list:
+    """Pool usage and checkout wait-time histogram for every engine."""
+    pools = {
+        "primary": engine.pool,
+        "primary_async": async_engine.sync_engine.pool,
+    }
+    for replica in replicas:
+        pools[replica.name] = replica.engine.pool
+        pools[f"{replica.name}_async"] = replica.async_engine.sync_engine.pool
+    return pool_snapshots(pools)
+
+def get_replica_status() -> list:
+    return [
+        {"name": replica.name, "healthy": replica.healthy, "lag_seconds": replica.lag}
+        for replica in replicas
+    ]
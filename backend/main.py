@@ -1,26 +1,48 @@
-from fastapi import FastAPI, Request, Response
+import time
+
+# 记录 worker 冷启动耗时（模块导入 + 启动钩子）
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import uvicorn
-import time
-from typing import Callable
 
-from database import engine, Base
+from auth import get_current_active_user
+from database import engine, SessionLocal, get_pool_stats, get_replica_status
 from routes import auth, users, files, courses, notifications, permissions, learning, visa, chatbot, platform
-from utils.permission_utils import initialize_permissions
-from utils.logger import api_logger, error_logger, log_error
+from utils.permission_utils import compile_permissions
+from utils.logger import api_logger, log_error, logging_stats, stop_logging
+from utils import metrics
+from utils.history_writer import history_writer
+from utils.schema_version import check_schema_version
+from utils.request_middleware import RequestMiddleware
+from utils.tracing import get_slow_trace, setup_tracing, shutdown_tracing, slow_traces
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create database tables on startup
-    Base.metadata.create_all(bind=engine)
-    initialize_permissions()
-    api_logger.info("Application startup")
+    startup_started = time.perf_counter()
+    setup_tracing()
+    # 建表和初始数据由 scripts/bootstrap.py 负责，这里只检查表结构版本
+    check_schema_version(engine)
+    # 编译权限位和角色掩码，权限检查只需一次按位与
+    with SessionLocal() as db:
+        compile_permissions(db)
+    await history_writer.start()
+    ready = time.perf_counter()
+    app.state.cold_start = {
+        "import_ms": round((startup_started - _IMPORT_STARTED) * 1000, 1),
+        "startup_ms": round((ready - startup_started) * 1000, 1),
+    }
+    api_logger.info(f"Application startup: {app.state.cold_start}")
     yield
-    # Cleanup on shutdown
+    # Cleanup on shutdown: flush buffered chat history before exiting
+    await history_writer.stop()
     api_logger.info("Application shutdown")
-    pass
+    shutdown_tracing()
+    # 写完队列中剩余的日志
+    stop_logging()
 
 app = FastAPI(
     title="AI-Assisted Course System",
@@ -48,45 +70,8 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
-# 请求日志中间件
-@app.middleware("http")
-async def log_requests(request: Request, call_next: Callable) -> Response:
-    # 记录请求开始
-    start_time = time.time()
-    
-    # 记录请求信息
-    request_info = {
-        'method': request.method,
-        'url': str(request.url),
-        'client': request.client.host if request.client else None,
-        'headers': dict(request.headers),
-    }
-    api_logger.info(f"Request started: {request_info}")
-    
-    try:
-        # 处理请求
-        response = await call_next(request)
-        
-        # 计算处理时间
-        process_time = time.time() - start_time
-        
-        # 记录响应信息
-        response_info = {
-            'status_code': response.status_code,
-            'process_time': f"{process_time:.3f}s",
-        }
-        api_logger.info(f"Request completed: {response_info}")
-        
-        return response
-        
-    except Exception as e:
-        # 记录错误信息
-        error_info = {
-            'error': str(e),
-            'process_time': f"{time.time() - start_time:.3f}s",
-        }
-        error_logger.error(f"Request failed: {error_info}")
-        raise
+# 请求日志、指标、写后读一致绑定和链路追踪合并为一个 ASGI 中间件，根 span 覆盖流式响应体
+app.add_middleware(RequestMiddleware)
 
 # Configure CORS
 app.add_middleware(
@@ -119,13 +104,67 @@ async def root():
     )
 
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
     return JSONResponse(
         content={
             "status": "healthy",
+            "cold_start": getattr(request.app.state, "cold_start", None),
             "timestamp": time.time()
         }
     )
 
+@app.get("/health/db-pool")
+async def db_pool_stats():
+    return JSONResponse(
+        content={
+            "pools": get_pool_stats(),
+            "replicas": get_replica_status(),
+            "timestamp": time.time()
+        }
+    )
+
+db_pool_checked_out = metrics.registry.gauge("db_pool_checked_out", "Connections checked out per pool", ("pool",))
+log_queue_depth = metrics.registry.gauge("log_queue_depth", "Records waiting in the log queue", ("logger",))
+log_dropped = metrics.registry.gauge("log_records_dropped", "Log records dropped because the queue was full", ("logger", "level"))
+
+def _collect_runtime_metrics() -> None:
+    for pool in get_pool_stats():
+        if "checked_out" in pool:
+            db_pool_checked_out.set(pool["checked_out"], pool=pool["name"])
+    for name, stats in logging_stats().items():
+        log_queue_depth.set(stats["queued"], logger=name)
+        log_dropped.set(stats["dropped"] - stats["dropped_errors"], logger=name, level="below_error")
+        log_dropped.set(stats["dropped_errors"], logger=name, level="error")
+
+metrics.registry.add_collector(_collect_runtime_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+def _require_admin(current_user=Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view traces")
+    return current_user
+
+@app.get("/debug/traces", include_in_schema=False)
+async def list_slow_traces(current_user=Depends(_require_admin)):
+    """Recent slow requests and jobs in this worker, newest first, with per-stage self time."""
+    return JSONResponse(
+        content={
+            "traces": [
+                {key: value for key, value in entry.items() if key != "spans"}
+                for entry in reversed(slow_traces)
+            ]
+        }
+    )
+
+@app.get("/debug/traces/{trace_id}", include_in_schema=False)
+async def read_slow_trace(trace_id: str, current_user=Depends(_require_admin)):
+    entry = get_slow_trace(trace_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Trace not found in this worker")
+    return JSONResponse(content=entry)
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON, Table, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -8,7 +8,8 @@ role_permissions = Table(
     'role_permissions',
     Base.metadata,
     Column('role_id', Integer, ForeignKey('roles.id')),
-    Column('permission_id', Integer, ForeignKey('permissions.id'))
+    Column('permission_id', Integer, ForeignKey('permissions.id')),
+    UniqueConstraint('role_id', 'permission_id', name='uq_role_permissions_role_permission')
 )
 
 class Role(Base):
@@ -42,6 +43,9 @@ class Permission(Base):
 class UserRole(Base):
     """用户-角色关联表"""
     __tablename__ = "user_roles"
+    __table_args__ = (
+        Index("ix_user_roles_user_role", "user_id", "role_id"),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -51,13 +55,20 @@ class UserRole(Base):
 class FilePermission(Base):
     """文件权限模型"""
     __tablename__ = "file_permissions"
+    __table_args__ = (
+        Index("ix_file_permissions_file_user", "file_id", "user_id"),
+    )
     
     id = Column(Integer, primary_key=True)
-    file_id = Column(Integer, ForeignKey("files.id"))
+    file_id = Column(Integer)  # files 表尚无模型，不建外键
     user_id = Column(Integer, ForeignKey("users.id"))
     permission_type = Column(String(20))  # read, write, delete, share
+    permission_mask = Column(Integer)  # permission_type 编码后的位掩码，写入时自动维护
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 关联
+    user = relationship("User", back_populates="file_permissions")
 
 class PermissionAuditLog(Base):
     """权限审计日志模型"""
@@ -71,6 +82,9 @@ class PermissionAuditLog(Base):
     details = Column(JSON)  # 详细信息
     ip_address = Column(String(50))  # IP地址
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    # 关联
+    user = relationship("User", back_populates="audit_logs")
 
 class User(Base):
     __tablename__ = "users"
@@ -83,6 +97,8 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime)
+    # 递增后此前签发的所有令牌失效
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     
     # 关联
     roles = relationship("Role", secondary="user_roles", back_populates="users")
@@ -91,9 +107,17 @@ class User(Base):
     chat_history = relationship("ChatHistory", back_populates="user")
     file_permissions = relationship("FilePermission", back_populates="user")
     audit_logs = relationship("PermissionAuditLog", back_populates="user")
+    chat_sessions = relationship("ChatSession", back_populates="user")
+    student_profile = relationship("StudentProfile", back_populates="user", uselist=False)
+    platform_integrations = relationship("PlatformIntegration", back_populates="user")
 
 class KnowledgeBase(Base):
     __tablename__ = "knowledge_base"
+    # 游标分页：按所有者（及分类）过滤后按 id 排序
+    __table_args__ = (
+        Index("ix_knowledge_base_owner_id", "owner_id", "id"),
+        Index("ix_knowledge_base_owner_category_id", "owner_id", "category", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -102,13 +126,19 @@ class KnowledgeBase(Base):
     file_path = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id"))
-    metadata = Column(JSON, nullable=True)  # Store file metadata as JSON
+    # metadata 是 Declarative 的保留属性名，列名不变
+    meta_data = Column("metadata", JSON, nullable=True)  # Store file metadata as JSON
+    doc_key = Column(String, nullable=True, index=True, unique=True)  # 向量库中分块的 doc_key，用于把检索结果映射回条目；导入按它去重
     
     # Relationships
     owner = relationship("User", back_populates="knowledge_base")
 
 class PortfolioProgress(Base):
     __tablename__ = "portfolio_progress"
+    __table_args__ = (
+        Index("ix_portfolio_progress_student_id", "student_id", "id"),
+        Index("ix_portfolio_progress_student_updated", "student_id", "last_updated"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id"))
@@ -122,6 +152,10 @@ class PortfolioProgress(Base):
 
 class ChatHistory(Base):
     __tablename__ = "chat_history"
+    __table_args__ = (
+        Index("ix_chat_history_user_agent_timestamp", "user_id", "agent_type", "timestamp"),
+        Index("ix_chat_history_user_timestamp", "user_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -135,6 +169,9 @@ class ChatHistory(Base):
 
 class ApplicationChecklist(Base):
     __tablename__ = "application_checklist"
+    __table_args__ = (
+        Index("ix_application_checklist_user_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -153,4 +190,7 @@ class CourseSummary(Base):
     homework_requirements = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     audio_file_path = Column(String, nullable=True)
-    transcription = Column(Text, nullable=True) 
\ No newline at end of file
+    transcription = Column(Text, nullable=True)
+
+# 分模块的模型与上面的模型互相引用，一并注册
+from models import chatbot, learning, platform, visa  # noqa: E402,F401
@@ -1,10 +1,37 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from ..database import Base
+from database import Base
+
+class Student(Base):
+    __tablename__ = "students"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    enrollments = relationship("Enrollment", back_populates="student")
+    activities = relationship("Activity", back_populates="student")
+    milestones = relationship("Milestone", back_populates="student")
+
+class Course(Base):
+    __tablename__ = "courses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    description = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    enrollments = relationship("Enrollment", back_populates="course")
+    activities = relationship("Activity", back_populates="course")
 
 class Enrollment(Base):
     __tablename__ = "enrollments"
+    # Covers the per-student status aggregate on the progress dashboard
+    __table_args__ = (
+        Index("ix_enrollments_student_status", "student_id", "status"),
+        Index("ix_enrollments_student_last_activity", "student_id", "last_activity", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"))
@@ -20,6 +47,9 @@ class Enrollment(Base):
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        Index("ix_activities_student_date", "student_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"))
@@ -34,6 +64,9 @@ class Activity(Base):
 
 class Milestone(Base):
     __tablename__ = "milestones"
+    __table_args__ = (
+        Index("ix_milestones_student_id", "student_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"))
@@ -43,4 +76,19 @@ class Milestone(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    student = relationship("Student", back_populates="milestones") 
\ No newline at end of file
+    student = relationship("Student", back_populates="milestones") 
+
+class StudentProgressSnapshot(Base):
+    """Precomputed dashboard for one student, kept current by the learning write routes."""
+    __tablename__ = "student_progress_snapshot"
+
+    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+    completed = Column(Integer, default=0)
+    in_progress = Column(Integer, default=0)
+    not_started = Column(Integer, default=0)
+    activity_count = Column(Integer, default=0)
+    milestone_count = Column(Integer, default=0)
+    courses = Column(JSON)  # 第一页课程进度
+    recent_activities = Column(JSON)  # 最近活动
+    milestones = Column(JSON)  # 第一页里程碑
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
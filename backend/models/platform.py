@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from ..database import Base
+from database import Base
 
 class PlatformIntegration(Base):
     __tablename__ = "platform_integrations"
+    __table_args__ = (
+        Index("ix_platform_integrations_platform_user", "platform_type", "platform_user_id", "is_active"),
+        Index("ix_platform_integrations_user_active", "user_id", "is_active"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -19,9 +23,13 @@ class PlatformIntegration(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="platform_integrations")
+    messages = relationship("PlatformMessage", back_populates="platform_integration")
 
 class PlatformMessage(Base):
     __tablename__ = "platform_messages"
+    __table_args__ = (
+        Index("ix_platform_messages_integration_created", "platform_integration_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     platform_integration_id = Column(Integer, ForeignKey("platform_integrations.id"))
@@ -30,7 +38,7 @@ class PlatformMessage(Base):
     platform_message_id = Column(String)  # 平台消息ID
     direction = Column(String)  # incoming, outgoing
     status = Column(String)  # sent, delivered, read, failed
-    metadata = Column(JSON)  # 消息元数据
+    meta_data = Column("metadata", JSON)  # 消息元数据（metadata 是保留属性名）
     created_at = Column(DateTime, default=datetime.utcnow)
 
     platform_integration = relationship("PlatformIntegration", back_populates="messages") 
\ No newline at end of file
@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from ..database import Base
+from database import Base
 
 class ChecklistItem(Base):
     __tablename__ = "visa_checklist_items"
@@ -34,7 +34,7 @@ class InterviewQuestion(Base):
     __tablename__ = "visa_interview_questions"
 
     id = Column(Integer, primary_key=True, index=True)
-    interview_id = Column(Integer, ForeignKey("visa_mock_interviews.id"))
+    interview_id = Column(Integer, ForeignKey("visa_mock_interviews.id"), index=True)
     question = Column(Text)
     answer = Column(Text)
     category = Column(String)  # 个人背景、学习计划、资金证明等
@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
 import json
 import asyncio
 from datetime import datetime
 
-from database import get_db
+from database import get_async_read_db
 import models
 import auth
+from utils.history_archive import read_archived
+from utils.history_writer import history_writer
 from agents import CourseQAAgent, PortfolioAgent, VisaAgent
 
 router = APIRouter()
@@ -51,7 +55,7 @@ portfolio_agent = PortfolioAgent()
 visa_agent = VisaAgent()
 
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket, user_id: int):
     await manager.connect(websocket, user_id)
     try:
         while True:
@@ -76,15 +80,14 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, db: Session = D
             # Get AI response
             response = await agent.get_response(message_data["message"])
             
-            # Save to chat history
-            chat_entry = models.ChatHistory(
-                user_id=user_id,
-                message=message_data["message"],
-                response=response,
-                agent_type=message_data["agent_type"]
-            )
-            db.add(chat_entry)
-            db.commit()
+            # Save to chat history (written in batches by the history writer)
+            await history_writer.enqueue(models.ChatHistory, {
+                "user_id": user_id,
+                "message": message_data["message"],
+                "response": response,
+                "agent_type": message_data["agent_type"],
+                "timestamp": datetime.utcnow()
+            })
             
             # Send response
             await manager.send_personal_message(
@@ -102,27 +105,39 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int, db: Session = D
 async def get_chat_history(
     agent_type: Optional[str] = None,
     limit: int = 50,
-    db: Session = Depends(get_db),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    query = db.query(models.ChatHistory).filter(
+    query = select(models.ChatHistory).where(
         models.ChatHistory.user_id == current_user.id
     )
     if agent_type:
-        query = query.filter(models.ChatHistory.agent_type == agent_type)
+        query = query.where(models.ChatHistory.agent_type == agent_type)
+    
+    result = await db.execute(query.order_by(models.ChatHistory.timestamp.desc()).limit(limit))
+    history = [(entry.response, entry.timestamp) for entry in result.scalars().all()]
+    
+    # Older months live in archive files; only read them when asked to
+    if include_archived and len(history) < limit:
+        archived = await run_in_threadpool(
+            read_archived,
+            "chat_history",
+            lambda row: row["user_id"] == current_user.id and (not agent_type or row["agent_type"] == agent_type),
+            limit - len(history)
+        )
+        history += [(row["response"], row["timestamp"]) for row in archived]
     
-    history = query.order_by(models.ChatHistory.timestamp.desc()).limit(limit).all()
     return [
         ChatResponse(
-            response=entry.response,
-            timestamp=entry.timestamp
-        ) for entry in history
+            response=response,
+            timestamp=timestamp
+        ) for response, timestamp in history
     ]
 
 @router.post("/message", response_model=ChatResponse)
 async def send_message(
     message: ChatMessage,
-    db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     # Get appropriate agent
@@ -140,17 +155,17 @@ async def send_message(
     # Get AI response
     response = await agent.get_response(message.message)
     
-    # Save to chat history
-    chat_entry = models.ChatHistory(
-        user_id=current_user.id,
-        message=message.message,
-        response=response,
-        agent_type=message.agent_type
-    )
-    db.add(chat_entry)
-    db.commit()
+    # Save to chat history (written in batches by the history writer)
+    timestamp = datetime.utcnow()
+    await history_writer.enqueue(models.ChatHistory, {
+        "user_id": current_user.id,
+        "message": message.message,
+        "response": response,
+        "agent_type": message.agent_type,
+        "timestamp": timestamp
+    })
     
     return ChatResponse(
         response=response,
-        timestamp=chat_entry.timestamp
+        timestamp=timestamp
     ) 
\ No newline at end of file
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from ..database import get_db
+from ..database import get_async_db, get_async_read_db, read_session_factory
 from ..models.chatbot import ChatSession, ChatMessage, StudentProfile, ChatbotKnowledge
 from ..schemas.chatbot import (
     ChatSessionResponse,
@@ -19,40 +21,49 @@ from ..utils.chatbot_utils import (
     generate_response,
     update_student_profile
 )
+from ..utils.history_writer import history_writer
+from ..utils.history_archive import read_archived
+from ..utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, apply_keyset, decode_cursor, encode_cursor, paginate
 
 router = APIRouter()
 
+def _search_knowledge(query: str, category: Optional[str] = None):
+    # 嵌入接口、查询缓存版本（Redis）和知识库查询都是阻塞调用，在线程池中用同步会话执行
+    with read_session_factory()() as sync_db:
+        return search_knowledge_base(query, sync_db, category)
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """处理聊天请求并返回响应"""
     try:
         # 获取或创建聊天会话
         if request.session_id:
-            session = db.query(ChatSession).filter(ChatSession.id == request.session_id).first()
+            session = await db.get(ChatSession, request.session_id)
         else:
             session = ChatSession(
                 title=f"Chat Session {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}",
                 user_id=request.context.get("user_id") if request.context else None
             )
             db.add(session)
-            db.commit()
-            db.refresh(session)
+            await db.commit()
+            await db.refresh(session)
 
-        # 保存用户消息
-        user_message = ChatMessage(
-            session_id=session.id,
-            role="user",
-            content=request.message,
-            sentiment=analyze_sentiment(request.message),
-            intent=classify_intent(request.message)
-        )
-        db.add(user_message)
+        # 保存用户消息（由历史写入器批量落库）
+        await history_writer.enqueue(ChatMessage, {
+            "session_id": session.id,
+            "role": "user",
+            "content": request.message,
+            "sentiment": analyze_sentiment(request.message),
+            "intent": classify_intent(request.message),
+            "knowledge_references": None,
+            "created_at": datetime.utcnow()
+        })
 
         # 搜索相关知识
-        knowledge_results = search_knowledge_base(request.message, db)
+        knowledge_results = await run_in_threadpool(_search_knowledge, request.message)
         
         # 生成响应
         response_content = generate_response(
@@ -62,24 +73,28 @@ async def chat(
         )
 
         # 保存助手响应
-        assistant_message = ChatMessage(
-            session_id=session.id,
-            role="assistant",
-            content=response_content,
-            knowledge_references=knowledge_results
-        )
-        db.add(assistant_message)
+        await history_writer.enqueue(ChatMessage, {
+            "session_id": session.id,
+            "role": "assistant",
+            "content": response_content,
+            "sentiment": None,
+            "intent": None,
+            "knowledge_references": knowledge_results,
+            "created_at": datetime.utcnow()
+        })
 
         # 更新学生档案
         if request.context and request.context.get("user_id"):
-            update_student_profile(
-                request.context["user_id"],
-                request.message,
-                response_content,
-                db
+            await db.run_sync(
+                lambda sync_db: update_student_profile(
+                    request.context["user_id"],
+                    request.message,
+                    response_content,
+                    sync_db
+                )
             )
 
-        db.commit()
+        await db.commit()
 
         return ChatResponse(
             message=response_content,
@@ -89,48 +104,103 @@ async def chat(
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sessions", response_model=List[ChatSessionResponse])
 async def get_chat_sessions(
     user_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取用户的聊天会话列表"""
+    """获取用户的聊天会话列表（按最近更新排序，下一页游标见 X-Next-Cursor 响应头）"""
     try:
-        sessions = db.query(ChatSession).filter(
+        query = select(ChatSession).where(
             ChatSession.user_id == user_id,
             ChatSession.is_active == True
-        ).all()
+        )
+        query = apply_keyset(query, ChatSession.id, cursor, limit, sort_column=ChatSession.updated_at)
+        sessions, next_cursor = paginate(
+            (await db.execute(query)).scalars().all(),
+            limit,
+            lambda chat_session: (chat_session.updated_at, chat_session.id)
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return sessions
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
 async def get_session_messages(
     session_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """获取特定会话的消息历史"""
+    """获取特定会话的消息历史（按时间正序，下一页游标见 X-Next-Cursor 响应头）
+
+    include_archived 为真时先返回已归档月份中的消息，它们都早于数据库中的消息。
+    """
     try:
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at).all()
+        rows = []
+        if include_archived:
+            after = decode_cursor(cursor) if cursor else None
+            rows = await run_in_threadpool(
+                read_archived,
+                "chat_messages",
+                lambda row: row["session_id"] == session_id and (after is None or (row["created_at"], row["id"]) > after),
+                limit + 1,
+                False
+            )
+        
+        if len(rows) <= limit:
+            # 归档消息已全部返回时，游标直接用于数据库查询
+            live_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if rows else cursor
+            query = select(ChatMessage).where(
+                ChatMessage.session_id == session_id
+            )
+            query = apply_keyset(
+                query,
+                ChatMessage.id,
+                live_cursor,
+                limit - len(rows),
+                sort_column=ChatMessage.created_at,
+                descending=False
+            )
+            rows += (await db.execute(query)).scalars().all()
+        
+        messages, next_cursor = paginate(
+            rows,
+            limit,
+            lambda message: (message["created_at"], message["id"]) if isinstance(message, dict)
+            else (message.created_at, message.id)
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return messages
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/student-profile/{user_id}", response_model=StudentProfileResponse)
 async def get_student_profile(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """获取学生档案"""
     try:
-        profile = db.query(StudentProfile).filter(
-            StudentProfile.user_id == user_id
-        ).first()
+        result = await db.execute(
+            select(StudentProfile).where(StudentProfile.user_id == user_id)
+        )
+        profile = result.scalars().first()
         if not profile:
             raise HTTPException(status_code=404, detail="Student profile not found")
         return profile
@@ -140,12 +210,11 @@ async def get_student_profile(
 @router.get("/knowledge", response_model=List[ChatbotKnowledgeResponse])
 async def search_knowledge(
     query: str,
-    category: Optional[str] = None,
-    db: Session = Depends(get_db)
+    category: Optional[str] = None
 ):
     """搜索知识库"""
     try:
-        results = search_knowledge_base(query, db, category)
+        results = await run_in_threadpool(_search_knowledge, query, category)
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 from datetime import datetime
 
-from database import get_db
+from database import get_db, get_read_db
 import models
 import auth
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, apply_keyset, paginate
 
 router = APIRouter()
 
@@ -51,10 +52,11 @@ async def create_checklist(
 
 @router.get("/", response_model=List[ApplicationChecklist])
 async def read_checklists(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     school_name: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     query = db.query(models.ApplicationChecklist).filter(
@@ -62,13 +64,16 @@ async def read_checklists(
     )
     if school_name:
         query = query.filter(models.ApplicationChecklist.school_name == school_name)
-    entries = query.offset(skip).limit(limit).all()
+    query = apply_keyset(query, models.ApplicationChecklist.id, cursor, limit, descending=False)
+    entries, next_cursor = paginate(query.all(), limit, lambda e: (e.id, e.id))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return entries
 
 @router.get("/{checklist_id}", response_model=ApplicationChecklist)
 async def read_checklist(
     checklist_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     entry = db.query(models.ApplicationChecklist).filter(
@@ -121,7 +126,7 @@ async def delete_checklist(
 
 @router.get("/stats/summary")
 async def get_checklist_summary(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     # Get all checklists for the user
@@ -1,26 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
 import os
 import shutil
 from datetime import datetime
 import json
+import re
+import uuid
+import tempfile
+from pathlib import Path
 import aiofiles
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
-from database import get_db
+from database import get_async_db, get_async_read_db, SessionLocal
 import models
 import auth
 from utils.logger import log_request, log_audit, api_logger
 from utils.file_extractor import FileContentExtractor
-from utils.knowledge_processor import KnowledgeProcessor
+from utils.knowledge_registry import KnowledgeRegistry
+from utils.bulk_importer import BulkImporter, CHECKPOINT_DIR, extract_zip
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, apply_keyset, paginate
 
 # Load environment variables
 load_dotenv()
 
-# Initialize knowledge processor
-knowledge_processor = KnowledgeProcessor(openai_api_key=os.getenv("OPENAI_API_KEY"))
+# Knowledge base collections are loaded lazily on first use
+DEFAULT_COLLECTION = "default"
+# 私有知识库（逗号分隔）：检索只返回调用者自己的条目；其余知识库对所有登录用户可见
+PRIVATE_COLLECTIONS = {
+    name.strip() for name in os.getenv("KNOWLEDGE_PRIVATE_COLLECTIONS", "").split(",") if name.strip()
+}
+knowledge_processors = KnowledgeRegistry(openai_api_key=os.getenv("OPENAI_API_KEY"))
 
 router = APIRouter()
 
@@ -41,6 +54,11 @@ class KnowledgeBase(KnowledgeBaseBase):
     class Config:
         from_attributes = True
 
+# 服务器端批量导入只允许读取该目录下的文件
+IMPORT_ROOT = os.getenv("KNOWLEDGE_IMPORT_ROOT", "imports")
+# 批量导入任务 id 的格式（uuid4 十六进制）
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
 # Create upload directory if it doesn't exist
 UPLOAD_DIR = "uploads"
 if not os.path.exists(UPLOAD_DIR):
@@ -49,7 +67,7 @@ if not os.path.exists(UPLOAD_DIR):
 @router.post("/", response_model=KnowledgeBase)
 async def create_knowledge_entry(
     entry: KnowledgeBaseCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     db_entry = models.KnowledgeBase(
@@ -57,8 +75,8 @@ async def create_knowledge_entry(
         owner_id=current_user.id
     )
     db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
+    await db.commit()
+    await db.refresh(db_entry)
     return db_entry
 
 @router.post("/upload")
@@ -68,7 +86,7 @@ async def upload_knowledge(
     request: Request,
     file: UploadFile = File(...),
     category: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     """Upload a document to the knowledge base."""
@@ -90,13 +108,14 @@ async def upload_knowledge(
             "id": str(datetime.utcnow().timestamp()),
             "title": file.filename,
             "category": category or "default",
+            "collection_name": DEFAULT_COLLECTION,
             "content_type": file.content_type,
             "size": len(content),
             "owner_id": current_user.id,
             **extracted_data["metadata"]
         }
         
-        processing_result = knowledge_processor.process_document(
+        processing_result = knowledge_processors.get(DEFAULT_COLLECTION).process_document(
             content=extracted_data["content"],
             metadata=doc_metadata
         )
@@ -111,15 +130,16 @@ async def upload_knowledge(
             category=category or "default",
             file_path=file_path,
             owner_id=current_user.id,
-            metadata=json.dumps({
+            doc_key=doc_metadata["id"],
+            meta_data=json.dumps({
                 **doc_metadata,
                 "doc_ids": processing_result["doc_ids"],
                 "chunk_count": processing_result["chunk_count"]
             })
         )
         db.add(db_entry)
-        db.commit()
-        db.refresh(db_entry)
+        await db.commit()
+        await db.refresh(db_entry)
         
         # Clean up temporary file
         os.remove(file_path)
@@ -139,32 +159,109 @@ async def upload_knowledge(
             detail=f"Failed to upload knowledge: {str(e)}"
         )
 
+def _require_admin(current_user: models.User = Depends(auth.get_current_active_user)) -> models.User:
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to bulk import")
+    return current_user
+
+@router.post("/bulk-import")
+@log_request()
+@log_audit(action="bulk_import_knowledge", resource_type="knowledge")
+async def bulk_import_knowledge(
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    directory: Optional[str] = Form(None),
+    category: Optional[str] = Form(None),
+    collection_name: str = Form(DEFAULT_COLLECTION),
+    job_id: Optional[str] = Form(None),
+    workers: int = Form(4),
+    batch_size: int = Form(64),
+    current_user: models.User = Depends(_require_admin)
+):
+    """Bulk import a zip archive or a server-side directory into a knowledge base.
+
+    Admin only; the collection must already exist (``default`` is created on
+    first use). Pass the ``job_id`` of an interrupted import to resume it.
+    """
+    if (file is None) == (directory is None):
+        raise HTTPException(status_code=400, detail="Provide either a zip file or a directory")
+    if collection_name != DEFAULT_COLLECTION and not await run_in_threadpool(knowledge_processors.exists, collection_name):
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    # job_id 用作检查点文件名，只接受生成时的十六进制格式
+    if job_id is not None and not JOB_ID_PATTERN.fullmatch(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job_id")
+
+    job_id = job_id or uuid.uuid4().hex
+    importer = BulkImporter(
+        processor=knowledge_processors.get(collection_name),
+        session_factory=SessionLocal,
+        owner_id=current_user.id,
+        category=category,
+        workers=min(max(workers, 1), 16),
+        batch_size=min(max(batch_size, 1), 512),
+        checkpoint_path=CHECKPOINT_DIR / f"{job_id}.json"
+    )
+
+    try:
+        if directory is not None:
+            import_root = Path(IMPORT_ROOT).resolve()
+            root = (import_root / directory).resolve()
+            if root != import_root and import_root not in root.parents:
+                raise HTTPException(status_code=400, detail="Directory is outside the import root")
+            if not root.is_dir():
+                raise HTTPException(status_code=404, detail="Directory not found")
+            stats = await run_in_threadpool(importer.run, str(root))
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                zip_path = os.path.join(tmp_dir, "upload.zip")
+                async with aiofiles.open(zip_path, 'wb') as out_file:
+                    while chunk := await file.read(1024 * 1024):
+                        await out_file.write(chunk)
+                extract_dir = os.path.join(tmp_dir, "files")
+                await run_in_threadpool(extract_zip, zip_path, extract_dir)
+                stats = await run_in_threadpool(importer.run, extract_dir)
+    except HTTPException:
+        raise
+    except Exception as e:
+        api_logger.error(f"Knowledge bulk import failed: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Bulk import failed: {str(e)} (resume with job_id={job_id})"
+        )
+
+    return {"job_id": job_id, **stats}
+
 @router.get("/", response_model=List[KnowledgeBase])
 async def read_knowledge_entries(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     category: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    query = db.query(models.KnowledgeBase).filter(
+    query = select(models.KnowledgeBase).where(
         models.KnowledgeBase.owner_id == current_user.id
     )
     if category:
-        query = query.filter(models.KnowledgeBase.category == category)
-    entries = query.offset(skip).limit(limit).all()
+        query = query.where(models.KnowledgeBase.category == category)
+    query = apply_keyset(query, models.KnowledgeBase.id, cursor, limit, descending=False)
+    entries, next_cursor = paginate((await db.execute(query)).scalars().all(), limit, lambda e: (e.id, e.id))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return entries
 
 @router.get("/{entry_id}", response_model=KnowledgeBase)
 async def read_knowledge_entry(
     entry_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    entry = db.query(models.KnowledgeBase).filter(
+    result = await db.execute(select(models.KnowledgeBase).where(
         models.KnowledgeBase.id == entry_id,
         models.KnowledgeBase.owner_id == current_user.id
-    ).first()
+    ))
+    entry = result.scalars().first()
     if entry is None:
         raise HTTPException(status_code=404, detail="Entry not found")
     return entry
@@ -173,33 +270,83 @@ async def read_knowledge_entry(
 async def update_knowledge_entry(
     entry_id: int,
     entry: KnowledgeBaseCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    db_entry = db.query(models.KnowledgeBase).filter(
+    result = await db.execute(select(models.KnowledgeBase).where(
         models.KnowledgeBase.id == entry_id,
         models.KnowledgeBase.owner_id == current_user.id
-    ).first()
+    ))
+    db_entry = result.scalars().first()
     if db_entry is None:
         raise HTTPException(status_code=404, detail="Entry not found")
     
+    previous_content = db_entry.content
+    previous_title = db_entry.title
+    previous_category = db_entry.category
     for key, value in entry.dict().items():
         setattr(db_entry, key, value)
     
-    db.commit()
-    db.refresh(db_entry)
+    # 只重新嵌入变化的分块；上次重建失败（reindex_pending）时内容未变也重试
+    metadata = json.loads(db_entry.meta_data) if db_entry.meta_data else {}
+    needs_reindex = "doc_ids" in metadata and (
+        entry.content != previous_content
+        or entry.title != previous_title
+        or entry.category != previous_category
+        or metadata.get("reindex_pending", False)
+    )
+    if needs_reindex:
+        metadata["reindex_pending"] = True
+        db_entry.meta_data = json.dumps(metadata)
+    
+    # 先提交条目，再在线程池中重建向量，避免嵌入调用阻塞事件循环或持有事务
+    await db.commit()
+    
+    if needs_reindex:
+        try:
+            processor = knowledge_processors.get(metadata.get("collection_name", DEFAULT_COLLECTION))
+            chunk_metadata = {
+                key: value for key, value in metadata.items()
+                if key not in ("doc_ids", "chunk_count", "reindex_pending")
+            }
+            chunk_metadata.update(title=entry.title, category=entry.category)
+            reindex_result = await run_in_threadpool(
+                processor.reindex_document,
+                doc_key=str(metadata.get("id", db_entry.id)),
+                content=entry.content,
+                metadata=chunk_metadata,
+                previous_ids=metadata["doc_ids"]
+            )
+        except Exception as e:
+            api_logger.error(f"Knowledge re-index failed for entry {entry_id}: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Entry saved but re-index failed, save again to retry: {str(e)}"
+            )
+        metadata.pop("reindex_pending", None)
+        metadata.update(doc_ids=reindex_result["doc_ids"], chunk_count=reindex_result["chunk_count"])
+        db_entry.meta_data = json.dumps(metadata)
+        await db.commit()
+        api_logger.info(
+            f"Knowledge entry {entry_id} re-indexed: "
+            f"{reindex_result['embedded']} embedded, {reindex_result['unchanged']} unchanged, "
+            f"{reindex_result['deleted']} deleted"
+        )
+    
+    await db.refresh(db_entry)
     return db_entry
 
 @router.delete("/{entry_id}")
 async def delete_knowledge_entry(
     entry_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    db_entry = db.query(models.KnowledgeBase).filter(
+    result = await db.execute(select(models.KnowledgeBase).where(
         models.KnowledgeBase.id == entry_id,
         models.KnowledgeBase.owner_id == current_user.id
-    ).first()
+    ))
+    db_entry = result.scalars().first()
     if db_entry is None:
         raise HTTPException(status_code=404, detail="Entry not found")
     
@@ -207,28 +354,50 @@ async def delete_knowledge_entry(
     if db_entry.file_path and os.path.exists(db_entry.file_path):
         os.remove(db_entry.file_path)
     
-    db.delete(db_entry)
-    db.commit()
+    await db.delete(db_entry)
+    await db.commit()
     return {"message": "Entry deleted successfully"}
 
+async def _visible_results(results: List[dict], collection_name: str, user_id: int, db: AsyncSession) -> List[dict]:
+    """Shared collections are readable by everyone; private ones only return the caller's entries."""
+    if collection_name not in PRIVATE_COLLECTIONS:
+        return results
+    doc_keys = [(result.get("metadata") or {}).get("doc_key") for result in results]
+    owned = set()
+    if any(doc_keys):
+        # 整页命中一次查询
+        rows = await db.execute(select(models.KnowledgeBase.doc_key).where(
+            models.KnowledgeBase.doc_key.in_({key for key in doc_keys if key}),
+            models.KnowledgeBase.owner_id == user_id
+        ))
+        owned = set(rows.scalars())
+    return [
+        result for result, doc_key in zip(results, doc_keys)
+        if doc_key in owned
+        # 尚未关联条目的分块按所有者判断
+        or (result.get("metadata") or {}).get("owner_id") == user_id
+    ]
+
 @router.get("/search")
 @log_request()
 async def search_knowledge(
     query: str,
     category: Optional[str] = None,
     limit: int = 5,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     """Search the knowledge base."""
     try:
-        results = knowledge_processor.search_knowledge(
-            query=query,
-            category=category,
-            limit=limit
+        # 嵌入接口、向量检索和查询缓存版本（Redis）都是阻塞调用
+        results = await run_in_threadpool(
+            knowledge_processors.get(DEFAULT_COLLECTION).search_knowledge,
+            query,
+            category,
+            limit
         )
         
-        return results
+        return await _visible_results(results, DEFAULT_COLLECTION, current_user.id, db)
         
     except Exception as e:
         api_logger.error(f"Knowledge search failed: {str(e)}")
@@ -244,12 +413,12 @@ async def chat_with_knowledge(
     query: str,
     conversation_id: str,
     category: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     """Chat with the knowledge base."""
     try:
-        response = knowledge_processor.chat_with_knowledge(
+        response = knowledge_processors.get(DEFAULT_COLLECTION).chat_with_knowledge(
             query=query,
             conversation_id=conversation_id,
             category=category
@@ -269,23 +438,24 @@ async def chat_with_knowledge(
 @log_audit(action="delete_knowledge", resource_type="knowledge")
 async def delete_knowledge(
     knowledge_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     """Delete a knowledge base entry."""
     try:
-        entry = db.query(models.KnowledgeBase).filter(
+        result = await db.execute(select(models.KnowledgeBase).where(
             models.KnowledgeBase.id == knowledge_id,
             models.KnowledgeBase.owner_id == current_user.id
-        ).first()
+        ))
+        entry = result.scalars().first()
         
         if entry is None:
             raise HTTPException(status_code=404, detail="Knowledge entry not found")
         
         # Delete from ChromaDB
-        metadata = json.loads(entry.metadata)
+        metadata = json.loads(entry.meta_data)
         if "doc_ids" in metadata:
-            knowledge_processor.delete_knowledge(
+            knowledge_processors.get(DEFAULT_COLLECTION).delete_knowledge(
                 doc_ids=metadata["doc_ids"],
                 category=entry.category
             )
@@ -295,8 +465,8 @@ async def delete_knowledge(
             os.remove(entry.file_path)
         
         # Delete database entry
-        db.delete(entry)
-        db.commit()
+        await db.delete(entry)
+        await db.commit()
         
         return {"message": "Knowledge entry deleted successfully"}
         
@@ -313,14 +483,10 @@ async def create_knowledge_base(
     current_user = Depends(auth.get_current_user)
 ):
     """Create a new knowledge base instance."""
-    if collection_name in knowledge_processors:
+    if knowledge_processors.exists(collection_name):
         raise HTTPException(status_code=400, detail="Knowledge base already exists")
     
-    processor = KnowledgeProcessor.create_knowledge_base(
-        openai_api_key=os.getenv("OPENAI_API_KEY"),
-        collection_name=collection_name
-    )
-    knowledge_processors[collection_name] = processor
+    knowledge_processors.create(collection_name)
     
     return {"message": f"Knowledge base '{collection_name}' created successfully"}
 
@@ -330,13 +496,7 @@ async def list_knowledge_bases(
 ):
     """List all available knowledge bases."""
     return {
-        "knowledge_bases": [
-            {
-                "name": name,
-                "stats": processor.get_collection_stats()
-            }
-            for name, processor in knowledge_processors.items()
-        ]
+        "knowledge_bases": knowledge_processors.list_stats()
     }
 
 @router.post("/upload")
@@ -345,13 +505,13 @@ async def upload_file(
     category: Optional[str] = Form(None),
     collection_name: str = Form("default"),
     current_user = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a file to a specific knowledge base."""
-    if collection_name not in knowledge_processors:
+    if not knowledge_processors.exists(collection_name):
         raise HTTPException(status_code=404, detail="Knowledge base not found")
     
-    processor = knowledge_processors[collection_name]
+    processor = knowledge_processors.get(collection_name)
     
     try:
         # 保存文件
@@ -367,13 +527,19 @@ async def upload_file(
         
         # 处理文档
         metadata = {
+            "id": str(datetime.utcnow().timestamp()),
             "title": file.filename,
             "category": category,
+            "collection_name": collection_name,
             "created_at": datetime.now().isoformat(),
             "owner_id": current_user.id
         }
         
-        processor.process_document(content, metadata)
+        processing_result = processor.process_document(content, metadata)
+        metadata.update(
+            doc_ids=processing_result["doc_ids"],
+            chunk_count=processing_result["chunk_count"]
+        )
         
         # 保存到数据库
         knowledge_entry = models.KnowledgeBase(
@@ -382,10 +548,11 @@ async def upload_file(
             category=category,
             file_path=file_path,
             owner_id=current_user.id,
-            metadata=json.dumps(metadata)
+            doc_key=metadata["id"],
+            meta_data=json.dumps(metadata)
         )
         db.add(knowledge_entry)
-        db.commit()
+        await db.commit()
         
         return {"message": "File processed and added to knowledge base successfully"}
         
@@ -398,17 +565,18 @@ async def search_knowledge(
     category: Optional[str] = None,
     collection_name: str = "default",
     limit: int = 5,
-    current_user = Depends(auth.get_current_user)
+    current_user = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Search in a specific knowledge base."""
-    if collection_name not in knowledge_processors:
+    if not knowledge_processors.exists(collection_name):
         raise HTTPException(status_code=404, detail="Knowledge base not found")
     
-    processor = knowledge_processors[collection_name]
+    processor = knowledge_processors.get(collection_name)
     
     try:
-        results = processor.search_knowledge(query, category, limit)
-        return {"results": results}
+        results = await run_in_threadpool(processor.search_knowledge, query, category, limit)
+        return {"results": await _visible_results(results, collection_name, current_user.id, db)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -419,10 +587,10 @@ async def chat_with_knowledge(
     current_user = Depends(auth.get_current_user)
 ):
     """Chat with a specific knowledge base."""
-    if collection_name not in knowledge_processors:
+    if not knowledge_processors.exists(collection_name):
         raise HTTPException(status_code=404, detail="Knowledge base not found")
     
-    processor = knowledge_processors[collection_name]
+    processor = knowledge_processors.get(collection_name)
     
     try:
         data = await request.json()
@@ -443,20 +611,21 @@ async def delete_knowledge(
     knowledge_id: int,
     collection_name: str = "default",
     current_user = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a knowledge base entry."""
-    if collection_name not in knowledge_processors:
+    if not knowledge_processors.exists(collection_name):
         raise HTTPException(status_code=404, detail="Knowledge base not found")
     
-    processor = knowledge_processors[collection_name]
+    processor = knowledge_processors.get(collection_name)
     
     try:
         # 获取知识库条目
-        knowledge = db.query(models.KnowledgeBase).filter(
+        result = await db.execute(select(models.KnowledgeBase).where(
             models.KnowledgeBase.id == knowledge_id,
             models.KnowledgeBase.owner_id == current_user.id
-        ).first()
+        ))
+        knowledge = result.scalars().first()
         
         if not knowledge:
             raise HTTPException(status_code=404, detail="Knowledge entry not found")
@@ -466,12 +635,13 @@ async def delete_knowledge(
             os.remove(knowledge.file_path)
         
         # 从向量存储中删除
-        metadata = json.loads(knowledge.metadata)
-        processor.delete_knowledge([str(knowledge_id)], metadata.get("category"))
+        metadata = json.loads(knowledge.meta_data)
+        if "doc_ids" in metadata:
+            processor.delete_knowledge(metadata["doc_ids"], metadata.get("category"))
         
         # 从数据库中删除
-        db.delete(knowledge)
-        db.commit()
+        await db.delete(knowledge)
+        await db.commit()
         
         return {"message": "Knowledge entry deleted successfully"}
         
@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
-from ..database import get_db
-from ..models import Student, Course, Enrollment, Activity, Milestone
-from ..schemas.learning import (
+import asyncio
+from database import AsyncSessionLocal, async_read_session_factory, get_async_db, get_async_read_db
+from models.learning import Student, Course, Enrollment, Activity, Milestone, StudentProgressSnapshot
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, apply_keyset, paginate
+from utils.progress_snapshot import SNAPSHOT_LIST_SIZE, apply_activity, apply_milestone, rebuild_snapshot
+from schemas.learning import (
     ProgressResponse,
     OverallProgress,
     CourseProgress,
     ActivityResponse,
-    MilestoneResponse
+    MilestoneResponse,
+    CohortProgressEntry
 )
 
 router = APIRouter()
@@ -17,42 +22,169 @@ router = APIRouter()
 @router.get("/progress", response_model=ProgressResponse)
 async def get_learning_progress(
     student_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    courses_cursor: Optional[str] = None,
+    activities_cursor: Optional[str] = None,
+    milestones_cursor: Optional[str] = None
 ):
     """
-    Get learning progress for a specific student or all students
+    Get learning progress for a specific student or all students.
+    Every list section is limited; pass the returned cursors to page further.
     """
     try:
-        # Get overall progress
-        overall = get_overall_progress(db, student_id)
+        # A single student's first page comes straight from the snapshot row
+        if student_id and limit <= SNAPSHOT_LIST_SIZE and not (courses_cursor or activities_cursor or milestones_cursor):
+            return await get_snapshot_progress(student_id, limit)
         
-        # Get course progress
-        courses = get_course_progress(db, student_id)
-        
-        # Get recent activities
-        activities = get_recent_activities(db, student_id)
-        
-        # Get milestones
-        milestones = get_milestones(db, student_id)
+        # The four sections are independent, so fetch them concurrently.
+        # An AsyncSession cannot run queries in parallel, so each gets its own.
+        factory = await async_read_session_factory()
+        overall, (courses, next_courses), (activities, next_activities), (milestones, next_milestones) = await asyncio.gather(
+            _run_section(factory, get_overall_progress, student_id),
+            _run_section(factory, get_course_progress, student_id, limit=limit, cursor=courses_cursor),
+            _run_section(factory, get_recent_activities, student_id, limit=limit, cursor=activities_cursor),
+            _run_section(factory, get_milestones, student_id, limit=limit, cursor=milestones_cursor)
+        )
         
         return ProgressResponse(
             overall=overall,
             courses=courses,
             recentActivities=activities,
-            milestones=milestones
+            milestones=milestones,
+            coursesCursor=next_courses,
+            activitiesCursor=next_activities,
+            milestonesCursor=next_milestones
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_overall_progress(db: Session, student_id: Optional[int] = None) -> OverallProgress:
+async def get_snapshot_progress(student_id: int, limit: int) -> ProgressResponse:
+    """Serve the dashboard from the student's snapshot, building it on first use"""
+    factory = await async_read_session_factory()
+    async with factory() as db:
+        snapshot = await db.get(StudentProgressSnapshot, student_id)
+    if snapshot is None:
+        async with AsyncSessionLocal() as db:
+            snapshot = await rebuild_snapshot(db, student_id)
+            await db.commit()
+    
+    def first_page(entries, total):
+        entries = entries or []
+        page = entries[:limit]
+        more = len(entries) > limit or (total or 0) > len(page)
+        return page, (page[-1]["cursor"] if more and page else None)
+    
+    total_courses = (snapshot.completed or 0) + (snapshot.in_progress or 0) + (snapshot.not_started or 0)
+    courses, courses_cursor = first_page(snapshot.courses, total_courses)
+    activities, activities_cursor = first_page(snapshot.recent_activities, snapshot.activity_count)
+    milestones, milestones_cursor = first_page(snapshot.milestones, snapshot.milestone_count)
+    
+    return ProgressResponse(
+        overall=OverallProgress(
+            completed=snapshot.completed or 0,
+            inProgress=snapshot.in_progress or 0,
+            notStarted=snapshot.not_started or 0
+        ),
+        courses=[CourseProgress(**entry) for entry in courses],
+        recentActivities=[ActivityResponse(**entry) for entry in activities],
+        milestones=[MilestoneResponse(**entry) for entry in milestones],
+        coursesCursor=courses_cursor,
+        activitiesCursor=activities_cursor,
+        milestonesCursor=milestones_cursor
+    )
+
+def _student_count(model, *criteria):
+    """Correlated count for one student, used where the snapshot row is missing."""
+    return (
+        select(func.count(model.id))
+        .where(model.student_id == Student.id, *criteria)
+        .correlate(Student)
+        .scalar_subquery()
+    )
+
+@router.get("/progress/cohort", response_model=List[CohortProgressEntry])
+async def get_cohort_progress(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Summary counts for many students, paged by student id.
+    Counts come from the snapshot; students without one are counted from the base tables.
+    The next page cursor is returned in the X-Next-Cursor header.
+    """
+    try:
+        snapshot = StudentProgressSnapshot
+        # COALESCE 只在快照缺失时才执行后面的子查询，仍是一次查询
+        query = apply_keyset(
+            select(
+                Student.id,
+                func.coalesce(snapshot.completed, _student_count(Enrollment, Enrollment.status == "completed")),
+                func.coalesce(snapshot.in_progress, _student_count(Enrollment, Enrollment.status == "in_progress")),
+                func.coalesce(snapshot.not_started, _student_count(
+                    Enrollment,
+                    or_(Enrollment.status.is_(None), Enrollment.status.notin_(["completed", "in_progress"]))
+                )),
+                func.coalesce(snapshot.activity_count, _student_count(Activity)),
+                func.coalesce(snapshot.milestone_count, _student_count(Milestone)),
+                snapshot.updated_at
+            ).outerjoin(snapshot, snapshot.student_id == Student.id),
+            Student.id,
+            cursor,
+            limit,
+            descending=False
+        )
+        rows, next_cursor = paginate(
+            (await db.execute(query)).all(),
+            limit,
+            lambda row: (row[0], row[0])
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        return [
+            CohortProgressEntry(
+                studentId=student_id,
+                completed=completed or 0,
+                inProgress=in_progress or 0,
+                notStarted=not_started or 0,
+                activityCount=activity_count or 0,
+                milestoneCount=milestone_count or 0,
+                updatedAt=updated_at
+            )
+            for student_id, completed, in_progress, not_started, activity_count, milestone_count, updated_at in rows
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _run_section(
+    factory: Callable[[], AsyncSession],
+    section: Callable[..., Awaitable],
+    student_id: Optional[int],
+    **kwargs
+):
+    async with factory() as db:
+        return await section(db, student_id, **kwargs)
+
+async def get_overall_progress(db: AsyncSession, student_id: Optional[int] = None) -> OverallProgress:
     """Calculate overall progress statistics"""
-    query = db.query(Enrollment)
+    # One GROUP BY pass instead of a COUNT per status
+    query = select(
+        Enrollment.status,
+        func.count(Enrollment.id)
+    ).group_by(Enrollment.status)
     if student_id:
-        query = query.filter(Enrollment.student_id == student_id)
+        query = query.where(Enrollment.student_id == student_id)
     
-    total = query.count()
-    completed = query.filter(Enrollment.status == 'completed').count()
-    in_progress = query.filter(Enrollment.status == 'in_progress').count()
+    counts = dict((await db.execute(query)).all())
+    total = sum(counts.values())
+    completed = counts.get('completed', 0)
+    in_progress = counts.get('in_progress', 0)
     not_started = total - completed - in_progress
     
     return OverallProgress(
@@ -61,64 +193,96 @@ def get_overall_progress(db: Session, student_id: Optional[int] = None) -> Overa
         notStarted=not_started
     )
 
-def get_course_progress(db: Session, student_id: Optional[int] = None) -> List[CourseProgress]:
-    """Get progress for each course"""
-    query = db.query(
-        Course,
-        Enrollment
+async def get_course_progress(
+    db: AsyncSession,
+    student_id: Optional[int] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[CourseProgress], Optional[str]]:
+    """Get progress for each course, most recently active first"""
+    query = select(
+        Enrollment.id,
+        Course.id,
+        Course.name,
+        Enrollment.status,
+        Enrollment.progress,
+        Enrollment.last_activity
     ).join(
-        Enrollment,
+        Course,
         Course.id == Enrollment.course_id
     )
     
     if student_id:
-        query = query.filter(Enrollment.student_id == student_id)
+        query = query.where(Enrollment.student_id == student_id)
     
-    results = query.all()
+    query = apply_keyset(query, Enrollment.id, cursor, limit, sort_column=Enrollment.last_activity, nulls_last=True)
+    rows, next_cursor = paginate((await db.execute(query)).all(), limit, lambda row: (row[5], row[0]))
     
     return [
         CourseProgress(
-            id=course.id,
-            name=course.name,
-            status=enrollment.status,
-            progress=enrollment.progress,
-            lastActivity=enrollment.last_activity
+            id=course_id,
+            name=name,
+            status=status,
+            progress=progress,
+            lastActivity=last_activity
         )
-        for course, enrollment in results
-    ]
+        for _, course_id, name, status, progress, last_activity in rows
+    ], next_cursor
 
-def get_recent_activities(
-    db: Session,
+async def get_recent_activities(
+    db: AsyncSession,
     student_id: Optional[int] = None,
-    limit: int = 10
-) -> List[ActivityResponse]:
+    limit: int = 10,
+    cursor: Optional[str] = None
+) -> Tuple[List[ActivityResponse], Optional[str]]:
     """Get recent learning activities"""
-    query = db.query(Activity).order_by(Activity.date.desc())
+    # Join the course name in the same query instead of loading each course
+    query = select(
+        Activity.id,
+        Activity.description,
+        Course.name,
+        Activity.date,
+        Activity.status
+    ).join(
+        Course,
+        Course.id == Activity.course_id
+    )
     
     if student_id:
-        query = query.filter(Activity.student_id == student_id)
+        query = query.where(Activity.student_id == student_id)
     
-    activities = query.limit(limit).all()
+    query = apply_keyset(query, Activity.id, cursor, limit, sort_column=Activity.date)
+    rows, next_cursor = paginate((await db.execute(query)).all(), limit, lambda row: (row.date, row.id))
     
     return [
         ActivityResponse(
-            id=activity.id,
-            description=activity.description,
-            courseName=activity.course.name,
-            date=activity.date,
-            status=activity.status
+            id=row.id,
+            description=row.description,
+            courseName=row.name,
+            date=row.date,
+            status=row.status
         )
-        for activity in activities
-    ]
+        for row in rows
+    ], next_cursor
 
-def get_milestones(db: Session, student_id: Optional[int] = None) -> List[MilestoneResponse]:
+async def get_milestones(
+    db: AsyncSession,
+    student_id: Optional[int] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[MilestoneResponse], Optional[str]]:
     """Get learning milestones"""
-    query = db.query(Milestone)
+    query = select(Milestone)
     
     if student_id:
-        query = query.filter(Milestone.student_id == student_id)
+        query = query.where(Milestone.student_id == student_id)
     
-    milestones = query.all()
+    query = apply_keyset(query, Milestone.id, cursor, limit, descending=False)
+    milestones, next_cursor = paginate(
+        (await db.execute(query)).scalars().all(),
+        limit,
+        lambda milestone: (milestone.id, milestone.id)
+    )
     
     return [
         MilestoneResponse(
@@ -128,7 +292,7 @@ def get_milestones(db: Session, student_id: Optional[int] = None) -> List[Milest
             progress=milestone.progress
         )
         for milestone in milestones
-    ]
+    ], next_cursor
 
 @router.post("/activity")
 async def record_activity(
@@ -136,7 +300,7 @@ async def record_activity(
     course_id: int,
     description: str,
     status: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Record a new learning activity"""
     try:
@@ -148,10 +312,12 @@ async def record_activity(
             date=datetime.utcnow()
         )
         db.add(activity)
-        db.commit()
+        await db.flush()
+        await apply_activity(db, activity)
+        await db.commit()
         return {"message": "Activity recorded successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/milestone")
@@ -159,7 +325,7 @@ async def create_milestone(
     student_id: int,
     title: str,
     description: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new learning milestone"""
     try:
@@ -170,27 +336,30 @@ async def create_milestone(
             progress=0
         )
         db.add(milestone)
-        db.commit()
+        await db.flush()
+        await apply_milestone(db, milestone, created=True)
+        await db.commit()
         return {"message": "Milestone created successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/milestone/{milestone_id}/progress")
 async def update_milestone_progress(
     milestone_id: int,
     progress: float,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update milestone progress"""
     try:
-        milestone = db.query(Milestone).filter(Milestone.id == milestone_id).first()
+        milestone = await db.get(Milestone, milestone_id)
         if not milestone:
             raise HTTPException(status_code=404, detail="Milestone not found")
         
         milestone.progress = progress
-        db.commit()
+        await apply_milestone(db, milestone)
+        await db.commit()
         return {"message": "Milestone progress updated successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
 import os
@@ -14,6 +15,7 @@ import auth
 from utils.logger import log_request, log_audit, api_logger
 from utils.file_extractor import FileContentExtractor
 from utils.embedding_processor import EmbeddingProcessor
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, apply_keyset, paginate
 
 # Load environment variables
 load_dotenv()
@@ -130,7 +132,7 @@ async def upload_file(
             category=category or file_type,
             file_path=file_path,
             owner_id=current_user.id,
-            metadata=json.dumps({
+            meta_data=json.dumps({
                 **extracted_data["metadata"],
                 "embedding_id": embedding_data["doc_id"]
             })
@@ -174,8 +176,11 @@ async def upload_file(
 
 @router.get("/files")
 async def list_files(
+    response: Response,
     file_type: Optional[str] = None,
     category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
@@ -188,7 +193,10 @@ async def list_files(
     if category:
         query = query.filter(models.KnowledgeBase.category == category)
     
-    entries = query.all()
+    query = apply_keyset(query, models.KnowledgeBase.id, cursor, limit, descending=False)
+    entries, next_cursor = paginate(query.all(), limit, lambda entry: (entry.id, entry.id))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     return [
         {
@@ -248,26 +256,28 @@ async def search_files(
     """Search for files using semantic search."""
     try:
         # Search for similar files
-        results = embedding_processor.search_similar(
-            query=query,
-            file_type=file_type,
-            limit=limit
+        # 嵌入接口和查询缓存版本（Redis）都是阻塞调用
+        results = await run_in_threadpool(
+            embedding_processor.search_similar,
+            query,
+            file_type,
+            limit
         )
         
         # Get additional information from database
         file_ids = [result["metadata"]["file_path"] for result in results]
-        db_entries = db.query(models.KnowledgeBase).filter(
-            models.KnowledgeBase.file_path.in_(file_ids),
-            models.KnowledgeBase.owner_id == current_user.id
-        ).all()
+        db_entries = {
+            entry.file_path: entry
+            for entry in db.query(models.KnowledgeBase).filter(
+                models.KnowledgeBase.file_path.in_(file_ids),
+                models.KnowledgeBase.owner_id == current_user.id
+            )
+        }
         
         # Combine results
         combined_results = []
         for result in results:
-            db_entry = next(
-                (entry for entry in db_entries if entry.file_path == result["metadata"]["file_path"]),
-                None
-            )
+            db_entry = db_entries.get(result["metadata"]["file_path"])
             if db_entry:
                 combined_results.append({
                     "id": db_entry.id,
@@ -275,7 +285,7 @@ async def search_files(
                     "category": db_entry.category,
                     "file_path": db_entry.file_path,
                     "content": db_entry.content,
-                    "metadata": json.loads(db_entry.metadata),
+                    "metadata": json.loads(db_entry.meta_data),
                     "similarity_score": result.get("similarity", 0)
                 })
         
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 from database import get_db
 import models
-from utils.permission_utils import require_permission, log_permission_action
+from utils.permission_utils import require_permission, log_permission_action, permission_cache
+from utils.redis_client import call_redis
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, apply_keyset, paginate
 from auth import get_current_active_user
 
 router = APIRouter()
@@ -79,11 +81,18 @@ async def create_role(
 @router.get("/roles", response_model=List[Role])
 @require_permission("view_roles")
 async def get_roles(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """获取所有角色"""
-    return db.query(models.Role).all()
+    """获取角色列表（下一页游标见 X-Next-Cursor 响应头）"""
+    query = apply_keyset(db.query(models.Role), models.Role.id, cursor, limit, descending=False)
+    roles, next_cursor = paginate(query.all(), limit, lambda role: (role.id, role.id))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return roles
 
 @router.put("/roles/{role_id}", response_model=Role)
 @require_permission("manage_roles")
@@ -103,6 +112,7 @@ async def update_role(
     
     db.commit()
     db.refresh(db_role)
+    await call_redis(permission_cache.invalidate_all)
     
     log_permission_action(
         current_user.id,
@@ -127,6 +137,8 @@ async def create_permission(
     db.add(db_permission)
     db.commit()
     db.refresh(db_permission)
+    # 新权限改变位编号，所有 worker 重新编译注册表并丢弃已缓存的掩码
+    await call_redis(permission_cache.invalidate_all)
     
     log_permission_action(
         current_user.id,
@@ -176,6 +188,7 @@ async def assign_role_to_user(
     db_user_role = models.UserRole(**user_role.dict())
     db.add(db_user_role)
     db.commit()
+    await call_redis(permission_cache.invalidate_user, user_role.user_id)
     
     log_permission_action(
         current_user.id,
@@ -206,6 +219,7 @@ async def remove_role_from_user(
     
     db.delete(user_role)
     db.commit()
+    await call_redis(permission_cache.invalidate_user, user_id)
     
     log_permission_action(
         current_user.id,
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
@@ -10,6 +11,7 @@ from ..schemas.platform import (
     WechatMessage,
     TeamsMessage
 )
+from ..utils.history_archive import read_archived
 from ..utils.platform_utils import (
     handle_wechat_message,
     handle_teams_message,
@@ -72,13 +74,21 @@ async def get_user_integrations(
 @router.get("/messages/{integration_id}", response_model=List[PlatformMessageResponse])
 async def get_platform_messages(
     integration_id: int,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
-    """获取平台消息历史"""
+    """获取平台消息历史（include_archived 为真时不足 50 条会从归档中补足）"""
     try:
         messages = db.query(PlatformMessage).filter(
             PlatformMessage.platform_integration_id == integration_id
         ).order_by(PlatformMessage.created_at.desc()).limit(50).all()
+        if include_archived and len(messages) < 50:
+            messages += await run_in_threadpool(
+                read_archived,
+                "platform_messages",
+                lambda row: row["platform_integration_id"] == integration_id,
+                50 - len(messages)
+            )
         return messages
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
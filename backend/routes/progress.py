@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from database import get_db
+from database import get_async_db, get_async_read_db
 import models
 import auth
+from utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, apply_keyset, paginate
 
 router = APIRouter()
 
@@ -29,7 +31,7 @@ class PortfolioProgress(PortfolioProgressBase):
 @router.post("/", response_model=PortfolioProgress)
 async def create_progress_entry(
     entry: PortfolioProgressCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     db_entry = models.PortfolioProgress(
@@ -37,36 +39,41 @@ async def create_progress_entry(
         student_id=current_user.id
     )
     db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
+    await db.commit()
+    await db.refresh(db_entry)
     return db_entry
 
 @router.get("/", response_model=List[PortfolioProgress])
 async def read_progress_entries(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    query = db.query(models.PortfolioProgress).filter(
+    query = select(models.PortfolioProgress).where(
         models.PortfolioProgress.student_id == current_user.id
     )
     if status:
-        query = query.filter(models.PortfolioProgress.status == status)
-    entries = query.offset(skip).limit(limit).all()
+        query = query.where(models.PortfolioProgress.status == status)
+    query = apply_keyset(query, models.PortfolioProgress.id, cursor, limit, descending=False)
+    entries, next_cursor = paginate((await db.execute(query)).scalars().all(), limit, lambda e: (e.id, e.id))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return entries
 
 @router.get("/{entry_id}", response_model=PortfolioProgress)
 async def read_progress_entry(
     entry_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    entry = db.query(models.PortfolioProgress).filter(
+    result = await db.execute(select(models.PortfolioProgress).where(
         models.PortfolioProgress.id == entry_id,
         models.PortfolioProgress.student_id == current_user.id
-    ).first()
+    ))
+    entry = result.scalars().first()
     if entry is None:
         raise HTTPException(status_code=404, detail="Entry not found")
     return entry
@@ -75,13 +82,14 @@ async def read_progress_entry(
 async def update_progress_entry(
     entry_id: int,
     entry: PortfolioProgressCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    db_entry = db.query(models.PortfolioProgress).filter(
+    result = await db.execute(select(models.PortfolioProgress).where(
         models.PortfolioProgress.id == entry_id,
         models.PortfolioProgress.student_id == current_user.id
-    ).first()
+    ))
+    db_entry = result.scalars().first()
     if db_entry is None:
         raise HTTPException(status_code=404, detail="Entry not found")
     
@@ -89,47 +97,50 @@ async def update_progress_entry(
         setattr(db_entry, key, value)
     
     db_entry.last_updated = datetime.utcnow()
-    db.commit()
-    db.refresh(db_entry)
+    await db.commit()
+    await db.refresh(db_entry)
     return db_entry
 
 @router.delete("/{entry_id}")
 async def delete_progress_entry(
     entry_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    db_entry = db.query(models.PortfolioProgress).filter(
+    result = await db.execute(select(models.PortfolioProgress).where(
         models.PortfolioProgress.id == entry_id,
         models.PortfolioProgress.student_id == current_user.id
-    ).first()
+    ))
+    db_entry = result.scalars().first()
     if db_entry is None:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    db.delete(db_entry)
-    db.commit()
+    await db.delete(db_entry)
+    await db.commit()
     return {"message": "Entry deleted successfully"}
 
 @router.get("/stats/summary")
 async def get_progress_summary(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
-    # Get all entries for the user
-    entries = db.query(models.PortfolioProgress).filter(
-        models.PortfolioProgress.student_id == current_user.id
-    ).all()
-    
-    # Calculate statistics
-    total_projects = len(entries)
-    status_counts = {}
-    for entry in entries:
-        status_counts[entry.status] = status_counts.get(entry.status, 0) + 1
+    # Count entries per status in the database
+    result = await db.execute(
+        select(
+            models.PortfolioProgress.status,
+            func.count(models.PortfolioProgress.id)
+        ).where(
+            models.PortfolioProgress.student_id == current_user.id
+        ).group_by(models.PortfolioProgress.status)
+    )
+    status_counts = {row_status: count for row_status, count in result.all()}
+    total_projects = sum(status_counts.values())
     
     # Get recent activity
-    recent_entries = db.query(models.PortfolioProgress).filter(
+    result = await db.execute(select(models.PortfolioProgress).where(
         models.PortfolioProgress.student_id == current_user.id
-    ).order_by(models.PortfolioProgress.last_updated.desc()).limit(5).all()
+    ).order_by(models.PortfolioProgress.last_updated.desc()).limit(5))
+    recent_entries = result.scalars().all()
     
     return {
         "total_projects": total_projects,
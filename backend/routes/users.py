@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from typing import List
 from pydantic import BaseModel, EmailStr
 
-from database import get_db
+from database import get_async_db, get_db
 import models
 import auth
 
@@ -31,35 +33,41 @@ class Token(BaseModel):
     token_type: str
 
 @router.post("/register", response_model=User)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user already exists
-    db_user = db.query(models.User).filter(
+    result = await db.execute(select(models.User).where(
         (models.User.email == user.email) | (models.User.username == user.username)
-    ).first()
-    if db_user:
+    ))
+    if result.scalars().first():
         raise HTTPException(
             status_code=400,
             detail="Email or username already registered"
         )
     
-    # Create new user
-    hashed_password = auth.get_password_hash(user.password)
+    # Create new user (bcrypt runs on the hashing pool, off the event loop)
+    hashed_password = await auth.aget_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth.authenticate_user(
+        db,
+        form_data.username,
+        form_data.password,
+        client_ip=request.client.host if request.client else None
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,9 +75,7 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = auth.create_user_access_token(user, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=User)
@@ -78,6 +84,17 @@ async def read_users_me(
 ):
     return current_user
 
+@router.post("/me/revoke-tokens")
+async def revoke_my_tokens(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """Sign out everywhere: every token issued so far stops working."""
+    user = db.query(models.User).filter(models.User.id == current_user.id).first()
+    auth.revoke_user_tokens(user)
+    db.commit()
+    return {"message": "All tokens revoked"}
+
 @router.get("/users", response_model=List[User])
 async def read_users(
     skip: int = 0,
@@ -28,11 +28,11 @@ class ChatSessionCreate(ChatSessionBase):
     user_id: int
 
 class ChatSessionResponse(ChatSessionBase):
+    # 会话列表只返回摘要，消息通过 /sessions/{id}/messages 分页获取
     id: int
     user_id: int
     created_at: datetime
     updated_at: datetime
-    messages: List[ChatMessageResponse]
 
     class Config:
         from_attributes = True
@@ -12,7 +12,7 @@ class CourseProgress(BaseModel):
     name: str
     status: str
     progress: float
-    lastActivity: datetime
+    lastActivity: Optional[datetime] = None
 
 class ActivityResponse(BaseModel):
     id: int
@@ -32,6 +32,19 @@ class ProgressResponse(BaseModel):
     courses: List[CourseProgress]
     recentActivities: List[ActivityResponse]
     milestones: List[MilestoneResponse]
+    # Cursors for the next page of each section; None when there is no more
+    coursesCursor: Optional[str] = None
+    activitiesCursor: Optional[str] = None
+    milestonesCursor: Optional[str] = None
+
+class CohortProgressEntry(BaseModel):
+    studentId: int
+    completed: int
+    inProgress: int
+    notStarted: int
+    activityCount: int
+    milestoneCount: int
+    updatedAt: Optional[datetime] = None
 
 class ActivityCreate(BaseModel):
     student_id: int
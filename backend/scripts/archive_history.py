@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""归档冷历史数据
+
+创建未来月份的分区，并把超过保留期的月份导出为 gzip JSONL 后从数据库移除。建议每天定时运行:
+    python scripts/archive_history.py --hot-months 6
+    python scripts/archive_history.py --dry-run  # 只列出将被归档的月份
+"""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+# 让脚本可以直接导入后端模块
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import engine
+import models  # noqa: F401
+from utils.history_archive import HISTORY_HOT_MONTHS, archive_cold_history, ensure_partitions
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Archive cold chat and platform message history")
+    parser.add_argument("--hot-months", type=int, default=HISTORY_HOT_MONTHS,
+                        help="Months of history to keep in the database, including the current one")
+    parser.add_argument("--dry-run", action="store_true", help="List the months that would be archived")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.hot_months < 1:
+        logger.error("--hot-months must be at least 1")
+        sys.exit(1)
+
+    if not args.dry_run:
+        created = ensure_partitions(engine)
+        if created:
+            logger.info(f"Created partitions: {', '.join(created)}")
+
+    archived = archive_cold_history(engine, hot_months=args.hot_months, dry_run=args.dry_run)
+    print(json.dumps(archived, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""数据库初始化（部署时运行一次，而不是每个 worker 启动时）
+
+把表结构迁移到最新版本，并批量写入基础角色和权限。可以重复执行:
+    python scripts/bootstrap.py
+    python scripts/bootstrap.py --skip-seed  # 只运行迁移
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# 让脚本可以直接导入后端模块
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from alembic import command
+from alembic.config import Config
+
+from database import SessionLocal, engine
+import models  # noqa: F401
+from utils.permission_utils import initialize_permissions
+from utils.schema_version import ALEMBIC_INI, check_schema_version
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Migrate the database schema and seed base roles and permissions")
+    parser.add_argument("--skip-seed", action="store_true", help="Only run migrations")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    started = time.perf_counter()
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    command.upgrade(config, "head")
+    logger.info(f"Migrations finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            initialize_permissions(db)
+        logger.info(f"Seeding finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    current, _ = check_schema_version(engine, mode="strict")
+    logger.info(f"Database schema at revision {current}")
+
+
+if __name__ == '__main__':
+    main()
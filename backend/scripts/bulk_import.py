@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""批量导入知识库文件
+
+示例:
+    python scripts/bulk_import.py /data/semester_2024 --owner-id 1 --collection default --workers 8
+    python scripts/bulk_import.py materials.zip --owner-id 1 --job-id spring  # 中断后用同一 job-id 续传
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 让脚本可以直接导入后端模块
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from utils.bulk_importer import BulkImporter, CHECKPOINT_DIR, extract_zip
+from utils.knowledge_registry import KnowledgeRegistry
+from utils.tracing import setup_tracing, shutdown_tracing
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk import files into a knowledge base")
+    parser.add_argument("source", help="Directory or .zip archive to import")
+    parser.add_argument("--owner-id", type=int, required=True, help="Owner user id for the created entries")
+    parser.add_argument("--collection", default="default", help="Knowledge base collection name")
+    parser.add_argument("--category", default=None, help="Category for all files (default: top-level directory name)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel extraction/embedding workers")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding batch")
+    parser.add_argument("--job-id", default=None, help="Checkpoint name; reuse it to resume an interrupted import")
+    return parser.parse_args()
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    # TRACE_EXPORTER=file|otlp 时导出导入任务的 span
+    setup_tracing()
+
+    source = Path(args.source)
+    if not source.exists():
+        logger.error(f"Source not found: {source}")
+        sys.exit(1)
+
+    job_id = args.job_id or source.stem
+    registry = KnowledgeRegistry(openai_api_key=os.getenv("OPENAI_API_KEY"))
+    importer = BulkImporter(
+        processor=registry.get(args.collection),
+        session_factory=SessionLocal,
+        owner_id=args.owner_id,
+        category=args.category,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint_path=CHECKPOINT_DIR / f"{job_id}.json"
+    )
+
+    logger.info(f"Importing {source} into '{args.collection}' (job id: {job_id})")
+    if source.is_dir():
+        stats = importer.run(str(source))
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            extract_zip(str(source), tmp_dir)
+            stats = importer.run(tmp_dir)
+
+    shutdown_tracing()
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    sys.exit(0 if stats["failed"] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""模块导入耗时报告
+
+在子进程中以 `python -X importtime` 导入指定模块，汇总累计耗时最高的包，并检查
+不该在启动时加载的重型库（langchain、chromadb、openai 等）是否被导入:
+    python scripts/importtime_report.py                     # 默认导入 main
+    python scripts/importtime_report.py -m routes.users -m routes.learning --top 15
+    python scripts/importtime_report.py --max-ms 1000       # 总耗时超过 1 秒时以非零状态退出
+
+重型库被导入或超过 --max-ms 时退出码为 1，可在 CI 中运行。
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 只应在首次使用时导入的库
+HEAVY_PACKAGES = [
+    "langchain", "chromadb", "openai", "numpy", "PIL", "pytesseract",
+    "speech_recognition", "PyPDF2", "docx", "dashscope", "tiktoken",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Summarise `python -X importtime` for backend modules")
+    parser.add_argument("-m", "--module", action="append", dest="modules",
+                        help="Module to import (repeatable, default: main)")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest packages to list")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Exit non-zero if the total import time exceeds this many milliseconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args()
+
+
+def run_importtime(modules: List[str]) -> List[Tuple[str, int, int, int]]:
+    """Import ``modules`` in a fresh interpreter; returns (name, depth, self_us, cumulative_us) rows."""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        # 导入失败时仍输出已有的统计，便于定位
+        print(result.stderr.splitlines()[-1] if result.stderr else "import failed", file=sys.stderr)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # 名称前有一个空格，之后每层缩进两个空格
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def summarise(rows: List[Tuple[str, int, int, int]], top: int) -> Dict:
+    # 按顶层包汇总自身耗时
+    packages: Dict[str, int] = {}
+    for name, _, self_us, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    top_level = [row for row in rows if row[1] <= 1]
+    total_us = sum(cumulative for _, depth, _, cumulative in rows if depth == 0)
+    loaded = {name.split(".")[0] for name, _, _, _ in rows}
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules_imported": len(rows),
+        "slowest_imports": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+            for name, _, _, cumulative in sorted(top_level, key=lambda row: row[3], reverse=True)[:top]
+        ],
+        "slowest_packages": [
+            {"package": package, "self_ms": round(us / 1000, 1)}
+            for package, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+        "heavy_packages_loaded": sorted(package for package in HEAVY_PACKAGES if package in loaded),
+    }
+
+
+def main():
+    args = parse_args()
+    modules = args.modules or ["main"]
+    report = summarise(run_importtime(modules), args.top)
+    report["modules"] = modules
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Importing {', '.join(modules)}: {report['total_ms']} ms, {report['modules_imported']} modules")
+        print("\nSlowest imports (cumulative):")
+        for entry in report["slowest_imports"]:
+            print(f"  {entry['cumulative_ms']:>9.1f} ms  {entry['module']}")
+        print("\nSlowest packages (self time):")
+        for entry in report["slowest_packages"]:
+            print(f"  {entry['self_ms']:>9.1f} ms  {entry['package']}")
+        if report["heavy_packages_loaded"]:
+            print(f"\nHeavy packages imported at startup: {', '.join(report['heavy_packages_loaded'])}")
+
+    failed = bool(report["heavy_packages_loaded"])
+    if args.max_ms is not None and report["total_ms"] > args.max_ms:
+        print(f"Import time {report['total_ms']} ms exceeds {args.max_ms} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
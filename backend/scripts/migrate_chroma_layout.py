@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""把旧版按集合分目录的 Chroma 库迁移到共享持久化目录
+
+旧版每个知识库单独一个库（{CHROMA_PERSIST_DIR}/{collection}），现在所有集合共用
+CHROMA_PERSIST_DIR 下的一个库。迁移后旧目录移到 --backup-dir，确认无误后可删除:
+    python scripts/migrate_chroma_layout.py --dry-run  # 只列出旧目录和其中的集合
+    python scripts/migrate_chroma_layout.py
+"""
+import argparse
+import json
+import logging
+import shutil
+import sys
+from pathlib import Path
+
+# 让脚本可以直接导入后端模块
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.knowledge_registry import CHROMA_PERSIST_DIR, find_legacy_stores
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 每次读取和写入的向量条数
+BATCH_SIZE = 500
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Move per-collection Chroma stores into the shared store")
+    parser.add_argument("--persist-dir", default=CHROMA_PERSIST_DIR, help="Shared Chroma directory")
+    parser.add_argument("--backup-dir", default=None,
+                        help="Where migrated old directories are moved (default: <persist-dir>_legacy)")
+    parser.add_argument("--dry-run", action="store_true", help="List the old stores and their collections")
+    return parser.parse_args()
+
+
+def copy_collection(source, target) -> int:
+    """Copy every record of ``source`` into ``target``; returns the number copied."""
+    copied = 0
+    while True:
+        batch = source.get(
+            limit=BATCH_SIZE,
+            offset=copied,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        if not batch["ids"]:
+            return copied
+        target.upsert(
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"]
+        )
+        copied += len(batch["ids"])
+
+
+def main():
+    args = parse_args()
+    import chromadb
+    from chromadb.config import Settings
+
+    legacy = find_legacy_stores(args.persist_dir)
+    if not legacy:
+        logger.info(f"No old per-collection stores under {args.persist_dir}")
+        return
+
+    settings = Settings(anonymized_telemetry=False)
+    backup_dir = Path(args.backup_dir or f"{Path(args.persist_dir).resolve()}_legacy")
+    shared = None if args.dry_run else chromadb.PersistentClient(path=args.persist_dir, settings=settings)
+    report = []
+    failures = 0
+    for store in legacy:
+        if not (store / "chroma.sqlite3").exists():
+            # 0.4 之前的 duckdb/parquet 格式需先用 chroma-migrate 升级
+            failures += 1
+            logger.error(f"{store}: old duckdb/parquet format, upgrade it with chroma-migrate first")
+            continue
+        client = chromadb.PersistentClient(path=str(store), settings=settings)
+        for source in client.list_collections():
+            entry = {"store": str(store), "collection": source.name, "count": source.count()}
+            if not args.dry_run:
+                target = shared.get_or_create_collection(source.name, metadata=source.metadata)
+                entry["copied"] = copy_collection(source, target)
+            report.append(entry)
+        if not args.dry_run:
+            backup_dir.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(store), str(backup_dir / store.name))
+            logger.info(f"Migrated {store.name}; old store moved to {backup_dir / store.name}")
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
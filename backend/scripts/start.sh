@@ -7,10 +7,10 @@ while ! nc -z postgres 5432; do
 done
 echo "Database is ready!"
 
-# 运行数据库迁移
-echo "Running database migrations..."
+# 运行数据库迁移并写入基础数据（worker 启动时只检查表结构版本）
+echo "Bootstrapping database..."
 cd /app
-alembic upgrade head
+python scripts/bootstrap.py
 
 # 启动应用
 echo "Starting application..."
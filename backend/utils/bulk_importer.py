@@ -0,0 +1,286 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import time
+import zipfile
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+from utils.file_extractor import FileContentExtractor
+from utils.knowledge_processor import KnowledgeProcessor
+from utils.tracing import span, submit_in_context, traced
+
+logger = logging.getLogger(__name__)
+
+# 支持批量导入的文件类型
+FILE_TYPES = {
+    ".pdf": "document",
+    ".docx": "document",
+    ".doc": "document",
+    ".txt": "document",
+    ".md": "document",
+    ".png": "image",
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".gif": "image",
+    ".wav": "audio",
+}
+
+# 重复导入同一文件时更新的列（owner_id 和 created_at 保持不变）
+UPSERT_COLUMNS = ("title", "content", "category", "file_path", "metadata")
+
+CHECKPOINT_DIR = Path(os.getenv("KNOWLEDGE_IMPORT_CHECKPOINT_DIR", "data/import_checkpoints"))
+
+
+class ImportCheckpoint:
+    """Set of files already imported, persisted as JSON after every batch."""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.done: set = set()
+        if path is not None and path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = set(json.load(f).get("done", []))
+
+    def is_done(self, key: str) -> bool:
+        return key in self.done
+
+    def mark_done(self, keys: List[str]) -> None:
+        self.done.update(keys)
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"done": sorted(self.done), "updated_at": datetime.utcnow().isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _upsert_entries(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Insert knowledge entries, updating the ones whose doc_key already exists.
+
+    doc_key is unique, so re-importing a file (after a crash before the
+    checkpoint was written, or under a new job) refreshes its entry instead
+    of adding a duplicate. The owner of an existing entry is kept.
+    """
+    if not rows:
+        return
+    table = models.KnowledgeBase.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["doc_key"],
+            set_={name: statement.excluded[name] for name in UPSERT_COLUMNS}
+        ))
+        return
+    # 其他数据库：先查出已有的 doc_key，分别更新和插入
+    existing = dict(db.execute(
+        select(table.c.doc_key, table.c.id).where(table.c.doc_key.in_([row["doc_key"] for row in rows]))
+    ).all())
+    for row in rows:
+        if row["doc_key"] in existing:
+            db.execute(
+                table.update()
+                .where(table.c.id == existing[row["doc_key"]])
+                .values({name: row[name] for name in UPSERT_COLUMNS})
+            )
+    rows = [row for row in rows if row["doc_key"] not in existing]
+    if rows:
+        db.execute(table.insert().values(rows))
+
+
+def extract_zip(zip_path: str, target_dir: str) -> None:
+    """Extract a zip archive, refusing entries that escape ``target_dir``."""
+    root = Path(target_dir).resolve()
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            destination = (root / member.filename).resolve()
+            if root not in destination.parents and destination != root:
+                raise ValueError(f"Unsafe path in archive: {member.filename}")
+        archive.extractall(root)
+
+
+class BulkImporter:
+    """Stream a directory of files into a knowledge base collection.
+
+    Files are extracted in parallel, chunked, embedded in batches and
+    upserted into the vector store; the matching ``KnowledgeBase`` rows are
+    upserted on doc_key per batch, so importing a file twice is harmless. A
+    checkpoint file records finished files so a resumed import skips them.
+    """
+
+    def __init__(
+        self,
+        processor: KnowledgeProcessor,
+        session_factory: Callable,
+        owner_id: int,
+        category: Optional[str] = None,
+        workers: int = 4,
+        batch_size: int = 64,
+        checkpoint_path: Optional[Path] = None
+    ):
+        self.processor = processor
+        self.session_factory = session_factory
+        self.owner_id = owner_id
+        self.category = category
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.checkpoint = ImportCheckpoint(checkpoint_path)
+        self.stats: Dict[str, Any] = {
+            "docs": 0,
+            "chunks": 0,
+            "skipped": 0,
+            "failed": 0,
+            "errors": []
+        }
+
+    def iter_files(self, root: str) -> Iterator[Tuple[str, str]]:
+        """Yield (absolute path, path relative to root) for supported files."""
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() not in FILE_TYPES:
+                    continue
+                path = os.path.join(dirpath, filename)
+                yield path, os.path.relpath(path, root)
+
+    def _doc_key(self, rel_path: str) -> str:
+        return hashlib.sha1(f"{self.processor.collection_name}:{rel_path}".encode("utf-8")).hexdigest()
+
+    def _extract(self, path: str, rel_path: str) -> Dict[str, Any]:
+        file_type = FILE_TYPES[os.path.splitext(path)[1].lower()]
+        extracted = FileContentExtractor.extract_content(path, file_type)
+        content = extracted["content"]
+        chunks = self.processor.text_splitter.split_text(content) if content else []
+        doc_key = self._doc_key(rel_path)
+        category = self.category or (Path(rel_path).parts[0] if len(Path(rel_path).parts) > 1 else "default")
+        metadata = {
+            "id": doc_key,
+            "title": os.path.basename(path),
+            "category": category,
+            "collection_name": self.processor.collection_name,
+            "owner_id": self.owner_id,
+            "source_path": rel_path,
+            **extracted["metadata"]
+        }
+        return {
+            "rel_path": rel_path,
+            "doc_key": doc_key,
+            "content": content,
+            "chunks": chunks,
+            "chunk_ids": self.processor.chunk_ids(doc_key, chunks),
+            "metadata": metadata
+        }
+
+    @traced("job.bulk_import_flush")
+    def _flush(self, docs: List[Dict[str, Any]], pool: ThreadPoolExecutor) -> None:
+        """Embed, upsert and record one batch of extracted documents."""
+        ids: List[str] = []
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        for doc in docs:
+            total = len(doc["chunks"])
+            for i, (chunk_id, chunk) in enumerate(zip(doc["chunk_ids"], doc["chunks"])):
+                ids.append(chunk_id)
+                texts.append(chunk)
+                metadatas.append(self.processor.chunk_metadata(doc["doc_key"], doc["metadata"], i, total))
+
+        # 按批次并行调用嵌入接口
+        slices = [slice(i, i + self.batch_size) for i in range(0, len(texts), self.batch_size)]
+        embeddings: List[List[float]] = []
+        futures = [submit_in_context(pool, self.processor.embed_texts, texts[s]) for s in slices]
+        for future in futures:
+            embeddings.extend(future.result())
+        self.processor.upsert_chunks(ids, texts, metadatas, embeddings)
+
+        db = self.session_factory()
+        try:
+            _upsert_entries(db, [
+                {
+                    "title": doc["metadata"]["title"],
+                    "content": doc["content"],
+                    "category": doc["metadata"]["category"],
+                    "file_path": None,
+                    "owner_id": self.owner_id,
+                    "doc_key": doc["doc_key"],
+                    "metadata": json.dumps({
+                        **doc["metadata"],
+                        "doc_ids": doc["chunk_ids"],
+                        "chunk_count": len(doc["chunks"])
+                    })
+                }
+                for doc in docs
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.checkpoint.mark_done([doc["rel_path"] for doc in docs])
+        self.stats["docs"] += len(docs)
+        self.stats["chunks"] += len(ids)
+
+    def run(self, root: str) -> Dict[str, Any]:
+        """Import every supported file under ``root`` and return throughput stats."""
+        start = time.monotonic()
+        pending: List[Dict[str, Any]] = []
+        pending_chunks = 0
+
+        with span("job.bulk_import", collection=self.processor.collection_name) as job_span, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = []
+
+            def drain(wait_all: bool = False) -> None:
+                nonlocal pending_chunks
+                while in_flight and (wait_all or len(in_flight) >= self.workers * 2 or in_flight[0][1].done()):
+                    rel_path, future = in_flight.pop(0)
+                    try:
+                        doc = future.result()
+                    except Exception as e:
+                        self.stats["failed"] += 1
+                        self.stats["errors"].append({"file": rel_path, "error": str(e)})
+                        logger.error(f"Bulk import failed to extract {rel_path}: {str(e)}")
+                        continue
+                    pending.append(doc)
+                    pending_chunks += len(doc["chunks"])
+                    if pending_chunks >= self.batch_size:
+                        self._flush(pending, pool)
+                        pending.clear()
+                        pending_chunks = 0
+
+            for path, rel_path in self.iter_files(root):
+                if self.checkpoint.is_done(rel_path):
+                    self.stats["skipped"] += 1
+                    continue
+                in_flight.append((rel_path, submit_in_context(pool, self._extract, path, rel_path)))
+                drain()
+
+            drain(wait_all=True)
+            if pending:
+                self._flush(pending, pool)
+            job_span.set_attribute("docs", self.stats["docs"])
+            job_span.set_attribute("failed", self.stats["failed"])
+
+        elapsed = max(time.monotonic() - start, 1e-9)
+        self.stats["elapsed_seconds"] = round(elapsed, 3)
+        self.stats["docs_per_second"] = round(self.stats["docs"] / elapsed, 2)
+        self.stats["chunks_per_second"] = round(self.stats["chunks"] / elapsed, 2)
+        logger.info(
+            f"Bulk import finished: {self.stats['docs']} docs, {self.stats['chunks']} chunks "
+            f"in {self.stats['elapsed_seconds']}s ({self.stats['docs_per_second']} docs/s, "
+            f"{self.stats['chunks_per_second']} chunks/s)"
+        )
+        return self.stats
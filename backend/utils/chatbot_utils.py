@@ -1,21 +1,30 @@
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from ..models.chatbot import ChatbotKnowledge, StudentProfile, ChatMessage
+from ..utils.query_cache import index_versions, query_cache
 import json
 from datetime import datetime
-import openai
 from ..config import settings
+from ..utils.lazy_import import lazy_module
+from ..utils.metrics import record_embedding_batch, record_llm_usage, track_llm_call
+
+# openai 导入较慢，首次调用时才真正导入
+openai = lazy_module("openai")
+
+def _chat_completion(messages: List[Dict[str, str]]):
+    with track_llm_call("openai", "chat_completion"):
+        response = openai.ChatCompletion.create(model="gpt-3.5-turbo", messages=messages)
+    record_llm_usage("openai", response.get("usage"))
+    return response
 
 def analyze_sentiment(text: str) -> str:
     """分析文本情感"""
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "你是一个情感分析专家。请分析以下文本的情感，只返回：positive、negative或neutral。"},
-                {"role": "user", "content": text}
-            ]
-        )
+        response = _chat_completion([
+            {"role": "system", "content": "你是一个情感分析专家。请分析以下文本的情感，只返回：positive、negative或neutral。"},
+            {"role": "user", "content": text}
+        ])
         return response.choices[0].message.content.strip().lower()
     except Exception:
         return "neutral"
@@ -23,51 +32,78 @@ def analyze_sentiment(text: str) -> str:
 def classify_intent(text: str) -> str:
     """分类用户意图"""
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "你是一个意图分类专家。请分析以下文本的意图，只返回：question、greeting、feedback、help或其他。"},
-                {"role": "user", "content": text}
-            ]
-        )
+        response = _chat_completion([
+            {"role": "system", "content": "你是一个意图分类专家。请分析以下文本的意图，只返回：question、greeting、feedback、help或其他。"},
+            {"role": "user", "content": text}
+        ])
         return response.choices[0].message.content.strip().lower()
     except Exception:
         return "other"
 
+# 知识条目每次提交变更后递增索引版本，使查询缓存精确失效
+CHATBOT_KNOWLEDGE_SCOPE = "chatbot_knowledge"
+
+def _mark_knowledge_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info["chatbot_knowledge_changed"] = True
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(ChatbotKnowledge, _event, _mark_knowledge_changed)
+
+@event.listens_for(Session, "after_commit")
+def _bump_knowledge_version(session) -> None:
+    if session.info.pop("chatbot_knowledge_changed", False):
+        index_versions.bump(CHATBOT_KNOWLEDGE_SCOPE)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_knowledge_change(session) -> None:
+    session.info.pop("chatbot_knowledge_changed", None)
+
 def search_knowledge_base(query: str, db: Session, category: Optional[str] = None) -> List[Dict[str, Any]]:
     """搜索知识库"""
     try:
-        # 使用OpenAI进行语义搜索
+        return query_cache.get_or_compute(
+            CHATBOT_KNOWLEDGE_SCOPE,
+            query,
+            {"category": category},
+            lambda: _search_knowledge_base(query, db, category)
+        )
+    except Exception:
+        return []
+
+def _search_knowledge_base(query: str, db: Session, category: Optional[str] = None) -> List[Dict[str, Any]]:
+    # 使用OpenAI进行语义搜索
+    record_embedding_batch("chatbot_search", 1)
+    with track_llm_call("openai", "embedding"):
         response = openai.Embedding.create(
             input=query,
             model="text-embedding-ada-002"
         )
-        query_embedding = response.data[0].embedding
-
-        # 在数据库中搜索相关知识
-        knowledge_query = db.query(ChatbotKnowledge)
-        if category:
-            knowledge_query = knowledge_query.filter(ChatbotKnowledge.category == category)
-        
-        knowledge_items = knowledge_query.all()
-        
-        # 计算相似度并排序
-        results = []
-        for item in knowledge_items:
-            # 这里应该使用向量数据库进行相似度搜索
-            # 为了演示，我们使用简单的关键词匹配
-            if any(keyword in query.lower() for keyword in item.keywords):
-                results.append({
-                    "id": item.id,
-                    "title": item.title,
-                    "content": item.content,
-                    "category": item.category,
-                    "relevance_score": 1.0  # 实际应该计算相似度分数
-                })
-        
-        return sorted(results, key=lambda x: x["relevance_score"], reverse=True)[:5]
-    except Exception:
-        return []
+    query_embedding = response.data[0].embedding
+
+    # 在数据库中搜索相关知识
+    knowledge_query = db.query(ChatbotKnowledge)
+    if category:
+        knowledge_query = knowledge_query.filter(ChatbotKnowledge.category == category)
+    
+    knowledge_items = knowledge_query.all()
+    
+    # 计算相似度并排序
+    results = []
+    for item in knowledge_items:
+        # 这里应该使用向量数据库进行相似度搜索
+        # 为了演示，我们使用简单的关键词匹配
+        if any(keyword in query.lower() for keyword in item.keywords):
+            results.append({
+                "id": item.id,
+                "title": item.title,
+                "content": item.content,
+                "category": item.category,
+                "relevance_score": 1.0  # 实际应该计算相似度分数
+            })
+    
+    return sorted(results, key=lambda x: x["relevance_score"], reverse=True)[:5]
 
 def generate_response(
     user_message: str,
@@ -89,13 +125,10 @@ def generate_response(
                 knowledge_context += f"- {item['title']}: {item['content']}\n"
 
         # 生成响应
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"{knowledge_context}\n用户问题：{user_message}"}
-            ]
-        )
+        response = _chat_completion([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"{knowledge_context}\n用户问题：{user_message}"}
+        ])
         return response.choices[0].message.content
     except Exception:
         return "抱歉，我现在无法回答这个问题。请稍后再试。"
@@ -121,13 +154,10 @@ def update_student_profile(
 
         # 分析用户消息，更新兴趣和偏好
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "分析以下对话，提取用户的学习风格、兴趣和偏好。返回JSON格式。"},
-                    {"role": "user", "content": f"用户：{user_message}\n助手：{assistant_response}"}
-                ]
-            )
+            response = _chat_completion([
+                {"role": "system", "content": "分析以下对话，提取用户的学习风格、兴趣和偏好。返回JSON格式。"},
+                {"role": "user", "content": f"用户：{user_message}\n助手：{assistant_response}"}
+            ])
             analysis = json.loads(response.choices[0].message.content)
             
             if "learning_style" in analysis:
@@ -141,13 +171,10 @@ def update_student_profile(
 
         # 更新聊天历史摘要
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "总结以下对话的主要内容，不超过100字。"},
-                    {"role": "user", "content": f"用户：{user_message}\n助手：{assistant_response}"}
-                ]
-            )
+            response = _chat_completion([
+                {"role": "system", "content": "总结以下对话的主要内容，不超过100字。"},
+                {"role": "user", "content": f"用户：{user_message}\n助手：{assistant_response}"}
+            ])
             profile.chat_history_summary = response.choices[0].message.content
         except Exception:
             pass
@@ -0,0 +1,114 @@
+from typing import Any, Dict, List
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# 连接等待时间直方图的桶（秒）
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class PoolMetrics:
+    """Checkout wait-time histogram and timeout counts per named pool."""
+
+    def __init__(self, buckets=WAIT_BUCKETS):
+        self.buckets = buckets
+        self._pools: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, name: str) -> Dict[str, Any]:
+        entry = self._pools.get(name)
+        if entry is None:
+            entry = {
+                "checkouts": 0,
+                "timeouts": 0,
+                "wait_sum": 0.0,
+                "wait_counts": [0] * (len(self.buckets) + 1)
+            }
+            self._pools[name] = entry
+        return entry
+
+    def observe_wait(self, name: str, seconds: float, timed_out: bool = False) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._entry(name)
+            entry["wait_counts"][index] += 1
+            entry["wait_sum"] += seconds
+            if timed_out:
+                entry["timeouts"] += 1
+            else:
+                entry["checkouts"] += 1
+
+    def snapshot(self, name: str, pool: Any) -> Dict[str, Any]:
+        """Current pool state plus the cumulative wait-time histogram."""
+        with self._lock:
+            entry = self._entry(name)
+            counts = list(entry["wait_counts"])
+            stats = {
+                "checkouts": entry["checkouts"],
+                "timeouts": entry["timeouts"],
+                "wait_seconds_sum": round(entry["wait_sum"], 6),
+            }
+
+        histogram: Dict[str, int] = {}
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+            cumulative += count
+            histogram[str(bound)] = cumulative
+
+        state: Dict[str, Any] = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            state.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                timeout=pool.timeout()
+            )
+        return {**state, **stats, "wait_seconds_histogram": histogram}
+
+
+pool_metrics = PoolMetrics()
+
+
+class _InstrumentedPoolMixin:
+    """Times every checkout so pool exhaustion shows up as a wait-time histogram."""
+
+    metrics_name = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.observe_wait(self.metrics_name, time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.observe_wait(self.metrics_name, time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def label_pool(pool: Any, name: str) -> None:
+    if isinstance(pool, _InstrumentedPoolMixin):
+        pool.metrics_name = name
+
+
+def pool_snapshots(pools: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"name": name, **pool_metrics.snapshot(name, pool)} for name, pool in pools.items()]
@@ -1,37 +1,76 @@
 import os
 from typing import List, Dict, Any, Optional
-import numpy as np
-from PIL import Image
 import base64
 from io import BytesIO
-import openai
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import Chroma
-import chromadb
-from chromadb.config import Settings
 import json
+import threading
 from datetime import datetime
 
+from utils.lazy_import import lazy_module
+from utils.metrics import record_embedding_batch, track_llm_call
+from utils.tracing import span
+from utils.query_cache import index_versions, query_cache
+
+# openai 导入较慢，首次调用时才真正导入
+openai = lazy_module("openai")
+
+# 所有媒体集合共用一个索引版本
+MEDIA_INDEX_SCOPE = "media"
+
 class EmbeddingProcessor:
     def __init__(self, openai_api_key: str):
+        """Cheap to construct: clients are created on first use.
+
+        langchain, chromadb and PIL take seconds to import and Chroma opens its
+        store on connect, so nothing is loaded until a file is processed or
+        searched.
+        """
         self.openai_api_key = openai_api_key
-        openai.api_key = openai_api_key
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-        
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.Client(Settings(
-            persist_directory="data/chroma",
-            anonymized_telemetry=False
-        ))
+        self._embeddings = None
+        self._text_splitter = None
+        self._chroma_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        with self._lock:
+            if self._embeddings is None:
+                from langchain.embeddings import OpenAIEmbeddings
+                self._embeddings = OpenAIEmbeddings(openai_api_key=self.openai_api_key)
+            return self._embeddings
+
+    @property
+    def text_splitter(self):
+        with self._lock:
+            if self._text_splitter is None:
+                from langchain.text_splitter import RecursiveCharacterTextSplitter
+                self._text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=1000,
+                    chunk_overlap=200,
+                    length_function=len,
+                )
+            return self._text_splitter
+
+    @property
+    def chroma_client(self):
+        with self._lock:
+            if self._chroma_client is None:
+                # Initialize ChromaDB
+                import chromadb
+                from chromadb.config import Settings
+                self._chroma_client = chromadb.Client(Settings(
+                    persist_directory="data/chroma",
+                    anonymized_telemetry=False
+                ))
+            return self._chroma_client
+
+    def _openai(self):
+        openai.api_key = self.openai_api_key
+        return openai
         
     def _encode_image_to_base64(self, image_path: str) -> str:
         """Convert image to base64 string."""
+        from PIL import Image
         with Image.open(image_path) as img:
             buffered = BytesIO()
             img.save(buffered, format="PNG")
@@ -42,24 +81,25 @@ class EmbeddingProcessor:
         try:
             base64_image = self._encode_image_to_base64(image_path)
             
-            response = openai.ChatCompletion.create(
-                model="gpt-4-vision-preview",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "Describe this image in detail."},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
+            with track_llm_call("openai", "chat_completion"):
+                response = self._openai().ChatCompletion.create(
+                    model="gpt-4-vision-preview",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": "Describe this image in detail."},
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/png;base64,{base64_image}"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=300
-            )
+                            ]
+                        }
+                    ],
+                    max_tokens=300
+                )
             
             # Get text description
             description = response.choices[0].message.content
@@ -75,7 +115,9 @@ class EmbeddingProcessor:
     def _get_text_embedding(self, text: str) -> List[float]:
         """Get embedding for text."""
         try:
-            return self.embeddings.embed_query(text)
+            record_embedding_batch("media", 1)
+            with track_llm_call("openai", "embedding"):
+                return self.embeddings.embed_query(text)
         except Exception as e:
             print(f"Error getting text embedding: {str(e)}")
             return None
@@ -84,7 +126,8 @@ class EmbeddingProcessor:
         """Get embedding for audio using OpenAI's Whisper model."""
         try:
             with open(audio_path, "rb") as audio_file:
-                transcript = openai.Audio.transcribe("whisper-1", audio_file)
+                with track_llm_call("openai", "transcription"):
+                    transcript = self._openai().Audio.transcribe("whisper-1", audio_file)
             
             # Get embedding for the transcript
             embedding = self.embeddings.embed_query(transcript.text)
@@ -107,6 +150,7 @@ class EmbeddingProcessor:
                     text = f.read()
                 chunks = self.text_splitter.split_text(text)
                 embeddings = [self._get_text_embedding(chunk) for chunk in chunks]
+                import numpy as np
                 embedding = np.mean(embeddings, axis=0).tolist()
 
             if embedding is None:
@@ -128,11 +172,13 @@ class EmbeddingProcessor:
             }
 
             # Add to collection
-            collection.add(
-                ids=[doc_id],
-                embeddings=[embedding],
-                metadatas=[doc_metadata]
-            )
+            with span("vector.upsert", collection=collection.name):
+                collection.add(
+                    ids=[doc_id],
+                    embeddings=[embedding],
+                    metadatas=[doc_metadata]
+                )
+            index_versions.bump(MEDIA_INDEX_SCOPE)
 
             return {
                 "doc_id": doc_id,
@@ -145,46 +191,58 @@ class EmbeddingProcessor:
             return None
 
     def search_similar(self, query: str, file_type: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar files using query."""
+        """Search for similar files using query, served from the query cache when possible."""
         try:
-            # Get query embedding
-            query_embedding = self._get_text_embedding(query)
+            return query_cache.get_or_compute(
+                MEDIA_INDEX_SCOPE,
+                query,
+                {"file_type": file_type, "limit": limit},
+                lambda: self._search_similar(query, file_type, limit)
+            )
+        except Exception as e:
+            print(f"Error searching similar files: {str(e)}")
+            return []
+
+    def _search_similar(self, query: str, file_type: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        # Get query embedding
+        query_embedding = self._get_text_embedding(query)
+        if query_embedding is None:
+            raise Exception("Failed to generate query embedding")
+        
+        if file_type:
+            collection = self.chroma_client.get_collection(f"files_{file_type}")
+        else:
+            # Search across all collections
+            collections = self.chroma_client.list_collections()
+            results = []
             
-            if file_type:
-                collection = self.chroma_client.get_collection(f"files_{file_type}")
-            else:
-                # Search across all collections
-                collections = self.chroma_client.list_collections()
-                results = []
-                
-                for collection in collections:
-                    if collection.name.startswith("files_"):
+            for collection in collections:
+                if collection.name.startswith("files_"):
+                    with span("vector.query", collection=collection.name):
                         results.extend(
                             collection.query(
                                 query_embeddings=[query_embedding],
                                 n_results=limit
                             )
                         )
-                
-                return results
+            
+            return results
 
-            # Search in specific collection
+        # Search in specific collection
+        with span("vector.query", collection=collection.name):
             results = collection.query(
                 query_embeddings=[query_embedding],
                 n_results=limit
             )
-            
-            return results
-
-        except Exception as e:
-            print(f"Error searching similar files: {str(e)}")
-            return []
+        
+        return results
 
     def delete_file_embedding(self, doc_id: str, file_type: str) -> bool:
         """Delete file embedding from ChromaDB."""
         try:
             collection = self.chroma_client.get_collection(f"files_{file_type}")
             collection.delete(ids=[doc_id])
+            index_versions.bump(MEDIA_INDEX_SCOPE)
             return True
         except Exception as e:
             print(f"Error deleting file embedding: {str(e)}")
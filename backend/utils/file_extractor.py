@@ -1,18 +1,18 @@
 import os
-import PyPDF2
-import docx
-from PIL import Image
-import pytesseract
-import speech_recognition as sr
 from typing import Optional, Dict, Any
 import json
 from datetime import datetime
 
+from utils.tracing import span
+
+# 各格式的解析库（PyPDF2、docx、PIL、pytesseract、speech_recognition）导入较慢，
+# 在第一次提取该格式时才导入
 class FileContentExtractor:
     @staticmethod
     def extract_text_from_pdf(file_path: str) -> str:
         """Extract text from PDF file."""
         try:
+            import PyPDF2
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 text = ""
@@ -22,10 +22,20 @@ class FileContentExtractor:
         except Exception as e:
             return f"Error extracting text from PDF: {str(e)}"
 
+    @staticmethod
+    def extract_text_from_plain(file_path: str) -> str:
+        """Extract text from plain text or Markdown file."""
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+                return file.read().strip()
+        except Exception as e:
+            return f"Error extracting text from file: {str(e)}"
+
     @staticmethod
     def extract_text_from_docx(file_path: str) -> str:
         """Extract text from DOCX file."""
         try:
+            import docx
             doc = docx.Document(file_path)
             text = ""
             for paragraph in doc.paragraphs:
@@ -38,6 +48,8 @@ class FileContentExtractor:
     def extract_text_from_image(file_path: str) -> str:
         """Extract text from image using OCR."""
         try:
+            import pytesseract
+            from PIL import Image
             image = Image.open(file_path)
             text = pytesseract.image_to_string(image)
             return text.strip()
@@ -48,6 +60,7 @@ class FileContentExtractor:
     def extract_text_from_audio(file_path: str) -> str:
         """Extract text from audio file using speech recognition."""
         try:
+            import speech_recognition as sr
             recognizer = sr.Recognizer()
             with sr.AudioFile(file_path) as source:
                 audio = recognizer.record(source)
@@ -74,15 +87,19 @@ class FileContentExtractor:
     def extract_content(file_path: str, file_type: str) -> Dict[str, Any]:
         """Extract content and metadata from file based on type."""
         content = ""
-        if file_type == "document":
-            if file_path.lower().endswith('.pdf'):
-                content = FileContentExtractor.extract_text_from_pdf(file_path)
-            elif file_path.lower().endswith(('.docx', '.doc')):
-                content = FileContentExtractor.extract_text_from_docx(file_path)
-        elif file_type == "image":
-            content = FileContentExtractor.extract_text_from_image(file_path)
-        elif file_type == "audio":
-            content = FileContentExtractor.extract_text_from_audio(file_path)
+        with span(f"extract.{file_type}", file=os.path.basename(file_path)) as extract_span:
+            if file_type == "document":
+                if file_path.lower().endswith('.pdf'):
+                    content = FileContentExtractor.extract_text_from_pdf(file_path)
+                elif file_path.lower().endswith(('.docx', '.doc')):
+                    content = FileContentExtractor.extract_text_from_docx(file_path)
+                elif file_path.lower().endswith(('.txt', '.md')):
+                    content = FileContentExtractor.extract_text_from_plain(file_path)
+            elif file_type == "image":
+                content = FileContentExtractor.extract_text_from_image(file_path)
+            elif file_type == "audio":
+                content = FileContentExtractor.extract_text_from_audio(file_path)
+            extract_span.set_attribute("characters", len(content))
 
         metadata = FileContentExtractor.extract_metadata(file_path)
         
@@ -0,0 +1,255 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+import gzip
+import heapq
+import json
+import logging
+import os
+
+from sqlalchemy import DateTime, text
+
+from database import Base
+
+logger = logging.getLogger(__name__)
+
+# 按月分区的历史表及其分区列
+HISTORY_TABLES = {
+    "chat_history": "timestamp",
+    "chat_messages": "created_at",
+    "platform_messages": "created_at",
+}
+
+# 归档文件目录，每个表每个月一个 gzip JSONL 文件；同一月份再次归档时追加 .partN 文件
+HISTORY_ARCHIVE_DIR = Path(os.getenv("HISTORY_ARCHIVE_DIR", "data/history_archive"))
+# 保留在数据库中的月份数（含当前月）
+HISTORY_HOT_MONTHS = int(os.getenv("HISTORY_HOT_MONTHS", "6"))
+# 提前创建的未来月份分区数
+HISTORY_PARTITIONS_AHEAD = int(os.getenv("HISTORY_PARTITIONS_AHEAD", "2"))
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+    ), {"table": table}).scalar())
+
+
+def list_partitions(conn, table: str) -> List[str]:
+    return [row[0] for row in conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table"
+    ), {"table": table})]
+
+
+def create_month_partition(conn, table: str, month: datetime) -> bool:
+    """Create ``table``'s partition for ``month`` unless it already exists."""
+    name = partition_name(table, month)
+    if name in list_partitions(conn, table):
+        return False
+    conn.execute(text(
+        f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    ))
+    return True
+
+
+def ensure_partitions(engine, months_ahead: int = HISTORY_PARTITIONS_AHEAD) -> List[str]:
+    """Create partitions for the current month and the next ``months_ahead``.
+
+    Rows outside every partition land in the ``*_default`` partition, so a
+    missed run never rejects inserts. A no-op on databases without
+    partitioning (SQLite).
+    """
+    created = []
+    current = month_start(datetime.utcnow())
+    with engine.begin() as conn:
+        for table in HISTORY_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                try:
+                    with conn.begin_nested():
+                        if create_month_partition(conn, table, month):
+                            created.append(partition_name(table, month))
+                except Exception as e:
+                    # 默认分区中已有该月数据时无法直接建分区
+                    logger.error(f"Failed to create partition {partition_name(table, month)}: {str(e)}")
+    return created
+
+
+def archive_path(table: str, month: datetime) -> Path:
+    return HISTORY_ARCHIVE_DIR / table / f"{month:%Y-%m}.jsonl.gz"
+
+
+def next_archive_path(table: str, month: datetime) -> Path:
+    """First unused file for ``month``; earlier exports are never overwritten.
+
+    Late rows for an archived month (e.g. replayed from the history writer's
+    spill file) end up in the default partition and are archived again by a
+    later run, into ``{month}.part1.jsonl.gz``, ``.part2`` and so on.
+    """
+    path = archive_path(table, month)
+    part = 0
+    while path.exists():
+        part += 1
+        path = path.with_name(f"{month:%Y-%m}.part{part}.jsonl.gz")
+    return path
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _export_month(conn, table: str, source: str, column: str, month: datetime) -> Tuple[int, Path]:
+    """Write one month of ``table`` rows to a new archive file; returns (row count, path)."""
+    path = next_archive_path(table, month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    result = conn.execution_options(stream_results=True).execute(
+        text(
+            f'SELECT * FROM "{source}" WHERE "{column}" >= :start AND "{column}" < :end '
+            f'ORDER BY "{column}", id'
+        ),
+        {"start": month, "end": add_months(month, 1)}
+    )
+    count = 0
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for row in result.mappings():
+            f.write(json.dumps(dict(row), ensure_ascii=False, default=_json_default) + "\n")
+            count += 1
+    if count:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink()
+    return count, path
+
+
+def archive_cold_history(engine, hot_months: int = HISTORY_HOT_MONTHS, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """Move months older than ``hot_months`` out of the database into archive files.
+
+    On Postgres each cold monthly partition is exported, detached and dropped,
+    so the hot tables and their indexes only ever hold ``hot_months`` of data.
+    Without partitioning the same months are exported and then deleted.
+    """
+    cutoff = add_months(month_start(datetime.utcnow()), -(hot_months - 1))
+    archived = []
+    for table, column in HISTORY_TABLES.items():
+        with engine.connect() as conn:
+            partitioned = is_partitioned(conn, table)
+            oldest = conn.execute(text(f'SELECT min("{column}") FROM "{table}"')).scalar()
+        if oldest is None:
+            continue
+        if isinstance(oldest, str):
+            oldest = datetime.fromisoformat(oldest)
+
+        month = month_start(oldest)
+        while month < cutoff:
+            name = partition_name(table, month)
+            entry = {"table": table, "month": f"{month:%Y-%m}", "path": str(archive_path(table, month))}
+            if dry_run:
+                archived.append(entry)
+                month = add_months(month, 1)
+                continue
+
+            with engine.begin() as conn:
+                has_partition = partitioned and name in list_partitions(conn, table)
+                source = name if has_partition else table
+                entry["rows"], path = _export_month(conn, table, source, column, month)
+                entry["path"] = str(path)
+                if has_partition:
+                    conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+                    conn.execute(text(f'DROP TABLE "{name}"'))
+                else:
+                    conn.execute(
+                        text(f'DELETE FROM "{table}" WHERE "{column}" >= :start AND "{column}" < :end'),
+                        {"start": month, "end": add_months(month, 1)}
+                    )
+            if entry["rows"] or has_partition:
+                archived.append(entry)
+                logger.info(f"Archived {entry['rows']} rows of {table} for {entry['month']}")
+            month = add_months(month, 1)
+    return archived
+
+
+def _archive_months(table: str, newest_first: bool) -> List[Tuple[str, List[Path]]]:
+    """Archive files of ``table`` grouped by month (a month may have several parts)."""
+    directory = HISTORY_ARCHIVE_DIR / table
+    if not directory.exists():
+        return []
+    months: Dict[str, List[Path]] = {}
+    for path in directory.glob("*.jsonl.gz"):
+        months.setdefault(path.name[:7], []).append(path)
+    return sorted(months.items(), reverse=newest_first)
+
+
+def _read_file(path: Path, datetime_columns: List[str]) -> Iterator[Dict[str, Any]]:
+    # 逐行读取，不把整个文件载入内存
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            for name in datetime_columns:
+                if isinstance(row.get(name), str):
+                    row[name] = datetime.fromisoformat(row[name])
+            yield row
+
+
+def iter_archived(
+    table: str,
+    where: Callable[[Dict[str, Any]], bool],
+    limit: int,
+    newest_first: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """Yield up to ``limit`` archived rows of ``table`` matching ``where``, in time order.
+
+    Months are read one at a time and each file is streamed; only the best
+    ``limit`` matches of a month are held (a bounded heap), so memory does
+    not grow with the archive size, and later months are not opened once
+    the page is full.
+    """
+    columns = Base.metadata.tables[table].c if table in Base.metadata.tables else {}
+    datetime_columns = [c.name for c in columns if isinstance(c.type, DateTime)]
+    column = HISTORY_TABLES.get(table)
+
+    def sort_key(row: Dict[str, Any]):
+        return (row.get(column) or datetime.min, row.get("id") or 0)
+
+    select = heapq.nlargest if newest_first else heapq.nsmallest
+    remaining = limit
+    for _, paths in _archive_months(table, newest_first):
+        if remaining <= 0:
+            return
+        matches = (row for path in paths for row in _read_file(path, datetime_columns) if where(row))
+        for row in select(remaining, matches, key=sort_key):
+            yield row
+            remaining -= 1
+
+
+def read_archived(
+    table: str,
+    where: Callable[[Dict[str, Any]], bool],
+    limit: int,
+    newest_first: bool = True
+) -> List[Dict[str, Any]]:
+    return list(iter_archived(table, where, limit, newest_first))
@@ -0,0 +1,292 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+
+from sqlalchemy import DateTime, func, select
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database import AsyncSessionLocal, Base, mark_recent_write
+from utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# 每批最多写入的行数
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+# 队列中最早的行最多等待多久就会被写入（毫秒）
+HISTORY_FLUSH_INTERVAL_MS = int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "200"))
+# 队列满时请求会等待，直到写入线程追上
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+# 数据库不可用时未写入的行追加到这里，下次启动时重放；每个 worker 写自己的 history_spill.<pid>.jsonl
+HISTORY_SPILL_PATH = Path(os.getenv("HISTORY_SPILL_PATH", "data/history_spill.jsonl"))
+# 被数据库拒绝的行（违反约束等）写到这里，不再重放
+HISTORY_DEAD_LETTER_PATH = Path(os.getenv("HISTORY_DEAD_LETTER_PATH", "data/history_dead_letter.jsonl"))
+
+# 这些错误只与某一行的数据有关，重试无意义
+ROW_ERRORS = (IntegrityError, DataError)
+
+# 写入子表后同步刷新父表的 updated_at：子表 -> (父表, 外键列)
+# 会话列表按 chat_sessions.updated_at 排序，新消息必须把会话顶到前面
+TOUCH_PARENTS = {"chat_messages": ("chat_sessions", "session_id")}
+
+
+async def _touch_parents(db, table_name: str, rows: List[Dict[str, Any]]) -> None:
+    """Set each parent's ``updated_at`` to its newest child row, in the insert's transaction."""
+    if table_name not in TOUCH_PARENTS:
+        return
+    parent_name, foreign_key = TOUCH_PARENTS[table_name]
+    parent_ids = {row[foreign_key] for row in rows if row.get(foreign_key) is not None}
+    if not parent_ids:
+        return
+    child = Base.metadata.tables[table_name]
+    parent = Base.metadata.tables[parent_name]
+    newest = (
+        select(func.max(child.c.created_at))
+        .where(child.c[foreign_key] == parent.c.id)
+        .scalar_subquery()
+    )
+    await db.execute(parent.update().where(parent.c.id.in_(parent_ids)).values(updated_at=newest))
+
+
+class HistoryWriter:
+    """Buffers chat history rows and writes them in batched multi-row inserts.
+
+    Routes call ``enqueue`` instead of committing each message. A background
+    task flushes whenever ``batch_size`` rows are waiting or the oldest row has
+    waited ``flush_interval`` seconds. ``stop`` drains the queue, and rows that
+    cannot be written are spilled to a JSONL file that ``start`` replays.
+    When a batch fails it is retried row by row, so a row the database
+    rejects is dead-lettered on its own instead of taking the batch with it.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL_MS / 1000,
+        max_queue: int = HISTORY_QUEUE_SIZE,
+        spill_path: Path = HISTORY_SPILL_PATH,
+        dead_letter_path: Path = HISTORY_DEAD_LETTER_PATH
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_spilled = 0
+        self.rows_dead_lettered = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        await self._replay_spill()
+        self._task = asyncio.create_task(self._run())
+        logger.info("History writer started")
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then stop the background task."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info(
+            f"History writer stopped: {self.rows_written} rows in {self.batches_written} batches, "
+            f"{self.rows_spilled} spilled, {self.rows_dead_lettered} dead-lettered"
+        )
+
+    async def enqueue(self, model: Any, row: Dict[str, Any]) -> None:
+        """Queue one row for ``model``'s table; written within ``flush_interval``."""
+        mark_recent_write()
+        if not self.running:
+            # 写入线程未启动（如脚本中使用）时直接写入
+            await self._write([(model.__tablename__, row)])
+            return
+        await self._queue.put((model.__tablename__, row))
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+        # 关闭时把剩余的行全部写完
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._write(remaining[start:start + self.batch_size])
+
+    @traced("job.history_flush")
+    async def _write(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        # 按表和列分组，每组一条多行 INSERT
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        for table_name, row in batch:
+            groups.setdefault((table_name, tuple(sorted(row))), []).append(row)
+
+        try:
+            async with self.session_factory() as db:
+                for (table_name, _), rows in groups.items():
+                    await db.execute(Base.metadata.tables[table_name].insert().values(rows))
+                    await _touch_parents(db, table_name, rows)
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"History writer failed to write a batch of {len(batch)} rows, retrying row by row: {str(e)}")
+            await self._write_rows(batch)
+            return
+
+        self.rows_written += len(batch)
+        self.batches_written += 1
+
+    async def _write_rows(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Insert rows one transaction each; rejected rows are dead-lettered.
+
+        Any other error (database unreachable, timeout) spills that row and
+        everything after it for replay on the next start.
+        """
+        rejected = []
+        for index, (table_name, row) in enumerate(batch):
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(Base.metadata.tables[table_name].insert().values(row))
+                    await _touch_parents(db, table_name, [row])
+                    await db.commit()
+            except ROW_ERRORS as e:
+                rejected.append((table_name, row, str(e.orig)))
+                continue
+            except Exception as e:
+                logger.error(f"History writer failed to write {len(batch) - index} rows, spilling to disk: {str(e)}")
+                self._spill(batch[index:])
+                break
+            self.rows_written += 1
+        if rejected:
+            logger.error(f"History writer rejected {len(rejected)} rows, see {self.dead_letter_path}")
+            self._dead_letter(rejected)
+
+    def _spill_file(self) -> Path:
+        # 每个 worker 写自己的文件，多个 worker 同时启动重放时不会争用同一个文件
+        return self.spill_path.with_name(f"{self.spill_path.stem}.{os.getpid()}{self.spill_path.suffix}")
+
+    def _spill(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        path = self._spill_file()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = [
+            json.dumps({"table": table_name, "row": row}, ensure_ascii=False, default=_json_default) + "\n"
+            for table_name, row in batch
+        ]
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        self.rows_spilled += len(lines)
+
+    def _dead_letter(self, rows: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+        lines = [
+            json.dumps(
+                {"table": table_name, "row": row, "error": error, "rejected_at": datetime.utcnow()},
+                ensure_ascii=False, default=_json_default
+            ) + "\n"
+            for table_name, row, error in rows
+        ]
+        # 一次写入，多个 worker 追加同一文件时行不会交错
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        self.rows_dead_lettered += len(lines)
+
+    def _orphaned_spill_files(self) -> List[Path]:
+        """Spill files no running worker is writing to (including the old shared file)."""
+        files = []
+        for path in sorted(self.spill_path.parent.glob(f"{self.spill_path.stem}*")):
+            owner = _spill_owner(path)
+            if owner is None or owner == os.getpid() or not _pid_alive(owner):
+                files.append(path)
+        return files
+
+    async def _replay_spill(self) -> None:
+        if not self.spill_path.parent.exists():
+            return
+        for path in self._orphaned_spill_files():
+            replay_path = self.spill_path.with_name(f"{self.spill_path.stem}.{os.getpid()}.replay")
+            try:
+                # 同时启动的其他 worker 可能已经认领了这个文件
+                os.replace(path, replay_path)
+            except FileNotFoundError:
+                continue
+
+            batch = []
+            with open(replay_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        batch.append((record["table"], _restore_row(record["table"], record["row"])))
+            logger.info(f"Replaying {len(batch)} spilled history rows from {path.name}")
+            for start in range(0, len(batch), self.batch_size):
+                # 数据库仍不可用的行重新写入本 worker 的 spill 文件，被拒绝的行进入死信文件
+                await self._write(batch[start:start + self.batch_size])
+            replay_path.unlink()
+
+
+def _spill_owner(path: Path) -> Optional[int]:
+    """Worker pid in ``history_spill.<pid>.jsonl`` / ``.<pid>.replay``; None for the old shared file."""
+    parts = path.name.split(".")
+    if len(parts) == 3 and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _restore_row(table_name: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    table = Base.metadata.tables[table_name]
+    for key, value in row.items():
+        if isinstance(value, str) and key in table.c and isinstance(table.c[key].type, DateTime):
+            row[key] = datetime.fromisoformat(value)
+    return row
+
+
+history_writer = HistoryWriter()
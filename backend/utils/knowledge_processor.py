@@ -1,33 +1,59 @@
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Callable
 import json
+import hashlib
+import uuid
 from datetime import datetime
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.schema import Document
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain.chat_models import ChatOpenAI
-import chromadb
-from chromadb.config import Settings
 import os
 
+# langchain/chromadb 导入耗时较长，在首次使用时才导入
+if TYPE_CHECKING:
+    from langchain.embeddings import OpenAIEmbeddings
+
+from utils.metrics import record_embedding_batch, track_llm_call
+from utils.query_cache import index_versions, query_cache
+from utils.tracing import span
+
 class KnowledgeProcessor:
-    def __init__(self, openai_api_key: str, collection_name: str = "default"):
-        """Initialize the knowledge processor with a specific collection name."""
+    def __init__(
+        self,
+        openai_api_key: str,
+        collection_name: str = "default",
+        embeddings: Optional["OpenAIEmbeddings"] = None,
+        client: Optional[Any] = None,
+        on_change: Optional[Callable[[str], None]] = None
+    ):
+        """Initialize the knowledge processor with a specific collection name.
+
+        ``embeddings`` and ``client`` let a registry share one embedding client
+        and one Chroma client across many collections; ``on_change`` is called
+        with the collection name after every write.
+        """
+        from langchain.embeddings import OpenAIEmbeddings
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain.vectorstores import Chroma
+
         self.openai_api_key = openai_api_key
         self.collection_name = collection_name
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        self.embeddings = embeddings or OpenAIEmbeddings(openai_api_key=openai_api_key)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
-        self.db = Chroma(
-            collection_name=collection_name,
-            embedding_function=self.embeddings,
-            persist_directory=f"./data/chroma/{collection_name}"
-        )
+        if client is not None:
+            self.db = Chroma(
+                client=client,
+                collection_name=collection_name,
+                embedding_function=self.embeddings
+            )
+        else:
+            self.db = Chroma(
+                collection_name=collection_name,
+                embedding_function=self.embeddings,
+                # 与 KnowledgeRegistry 共用同一个库，不再按集合分目录
+                persist_directory=os.getenv("CHROMA_PERSIST_DIR", "./data/chroma")
+            )
+        self._on_change = on_change
         
         # Initialize conversation memory
         self.conversation_memory = {}
@@ -42,33 +68,161 @@ class KnowledgeProcessor:
         """Get an existing knowledge base instance."""
         return cls(openai_api_key, collection_name)
 
-    def process_document(self, content: str, metadata: Dict[str, Any]) -> str:
+    @property
+    def cache_scope(self) -> str:
+        return f"knowledge:{self.collection_name}"
+
+    def _notify_change(self) -> None:
+        index_versions.bump(self.cache_scope)
+        if self._on_change is not None:
+            self._on_change(self.collection_name)
+
+    @staticmethod
+    def chunk_hash(chunk: str) -> str:
+        """Content hash of a single chunk."""
+        return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+
+    def chunk_ids(self, doc_key: str, chunks: List[str]) -> List[str]:
+        """Derive stable vector ids for a document's chunks from their content.
+
+        Identical chunks within one document get an occurrence suffix so ids
+        stay unique; an unchanged chunk keeps its id across re-indexing.
+        """
+        seen: Dict[str, int] = {}
+        ids = []
+        for chunk in chunks:
+            digest = self.chunk_hash(chunk)
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            ids.append(f"{doc_key}:{digest}:{occurrence}")
+        return ids
+
+    def chunk_metadata(self, doc_key: str, metadata: Dict[str, Any], index: int, total: int) -> Dict[str, Any]:
+        return {
+            **metadata,
+            "doc_key": doc_key,
+            "chunk_index": index,
+            "total_chunks": total
+        }
+
+    def process_document(self, content: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Process a document and store its chunks in the knowledge base."""
+        from langchain.schema import Document
+
         try:
+            doc_key = str(metadata.get("id") or uuid.uuid4().hex)
+
             # Split the content into chunks
             chunks = self.text_splitter.split_text(content)
+            ids = self.chunk_ids(doc_key, chunks)
             
             # Create documents with metadata
             documents = [
                 Document(
                     page_content=chunk,
-                    metadata={
-                        **metadata,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    }
+                    metadata=self.chunk_metadata(doc_key, metadata, i, len(chunks))
                 )
                 for i, chunk in enumerate(chunks)
             ]
             
             # Add documents to the vector store
-            self.db.add_documents(documents)
+            if documents:
+                with span("vector.upsert", collection=self.collection_name, chunks=len(documents)):
+                    self.db.add_documents(documents, ids=ids)
+            self._notify_change()
             
-            return f"Processed {len(chunks)} chunks from document"
+            return {
+                "doc_key": doc_key,
+                "doc_ids": ids,
+                "chunk_count": len(chunks)
+            }
             
         except Exception as e:
             raise Exception(f"Error processing document: {str(e)}")
 
+    def reindex_document(
+        self,
+        doc_key: str,
+        content: str,
+        metadata: Dict[str, Any],
+        previous_ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Re-index an updated document, embedding only the chunks that changed.
+
+        New chunk ids are diffed against ``previous_ids`` (or, when those are
+        unknown, against the ids stored in the collection for ``doc_key``).
+        Added chunks are embedded and upserted, unchanged chunks only get
+        their metadata refreshed, and stale chunks are deleted.
+        """
+        try:
+            if previous_ids is None:
+                stored = self.db._collection.get(where={"doc_key": doc_key}, include=[])
+                previous_ids = stored["ids"]
+
+            chunks = self.text_splitter.split_text(content)
+            ids = self.chunk_ids(doc_key, chunks)
+            previous = set(previous_ids)
+            current = set(ids)
+
+            added = [i for i, chunk_id in enumerate(ids) if chunk_id not in previous]
+            kept = [i for i, chunk_id in enumerate(ids) if chunk_id in previous]
+            stale = [chunk_id for chunk_id in previous_ids if chunk_id not in current]
+
+            if added:
+                self.db.add_texts(
+                    texts=[chunks[i] for i in added],
+                    metadatas=[self.chunk_metadata(doc_key, metadata, i, len(chunks)) for i in added],
+                    ids=[ids[i] for i in added]
+                )
+            if kept:
+                # 未变化的分块只更新元数据（位置、标题等），不重新计算嵌入
+                self.db._collection.update(
+                    ids=[ids[i] for i in kept],
+                    metadatas=[self.chunk_metadata(doc_key, metadata, i, len(chunks)) for i in kept]
+                )
+            if stale:
+                self.db.delete(ids=stale)
+            self._notify_change()
+
+            return {
+                "doc_key": doc_key,
+                "doc_ids": ids,
+                "chunk_count": len(chunks),
+                "embedded": len(added),
+                "unchanged": len(kept),
+                "deleted": len(stale)
+            }
+
+        except Exception as e:
+            raise Exception(f"Error re-indexing document: {str(e)}")
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts in one call to the embedding API."""
+        record_embedding_batch("knowledge_import", len(texts))
+        with track_llm_call("openai", "embedding"):
+            return self.embeddings.embed_documents(texts)
+
+    def upsert_chunks(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: List[List[float]]
+    ) -> None:
+        """Upsert pre-embedded chunks into the collection in one call."""
+        try:
+            if ids:
+                with span("vector.upsert", collection=self.collection_name, chunks=len(ids)):
+                    self.db._collection.upsert(
+                        ids=ids,
+                        embeddings=embeddings,
+                        documents=texts,
+                        metadatas=metadatas
+                    )
+            self._notify_change()
+        except Exception as e:
+            raise Exception(f"Error upserting chunks: {str(e)}")
+
     def search_knowledge(self, query: str, category: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
         """Search the knowledge base."""
         try:
@@ -77,25 +231,39 @@ class KnowledgeProcessor:
             if category:
                 search_kwargs["filter"] = {"category": category}
             
-            # Perform the search
-            results = self.db.similarity_search_with_score(query, **search_kwargs)
-            
-            # Format results
-            formatted_results = []
-            for doc, score in results:
-                formatted_results.append({
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "score": score
-                })
+            def run_search() -> List[Dict[str, Any]]:
+                # Perform the search（包含查询文本的嵌入调用）
+                with span("vector.query", collection=self.collection_name, limit=limit):
+                    results = self.db.similarity_search_with_score(query, **search_kwargs)
+                
+                # Format results
+                formatted_results = []
+                for doc, score in results:
+                    formatted_results.append({
+                        "content": doc.page_content,
+                        "metadata": doc.metadata,
+                        "score": score
+                    })
+                
+                return formatted_results
             
-            return formatted_results
+            # 热门查询直接命中缓存，无需调用嵌入接口和向量检索
+            return query_cache.get_or_compute(
+                self.cache_scope,
+                query,
+                {"category": category, "limit": limit},
+                run_search
+            )
             
         except Exception as e:
             raise Exception(f"Error searching knowledge base: {str(e)}")
 
     def chat_with_knowledge(self, query: str, conversation_id: str) -> Dict[str, Any]:
         """Chat with the knowledge base using conversation history."""
+        from langchain.chains import ConversationalRetrievalChain
+        from langchain.chat_models import ChatOpenAI
+        from langchain.memory import ConversationBufferMemory
+
         try:
             # Create a conversation chain
             memory = ConversationBufferMemory(
@@ -142,6 +310,7 @@ class KnowledgeProcessor:
             
             # Delete documents
             self.db.delete(**delete_kwargs)
+            self._notify_change()
             return True
             
         except Exception as e:
@@ -149,6 +318,8 @@ class KnowledgeProcessor:
 
     def list_collections(self) -> List[str]:
         """List all available knowledge base collections."""
+        import chromadb
+
         try:
             client = chromadb.Client()
             return [collection.name for collection in client.list_collections()]
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+import os
+
+from utils.knowledge_processor import KnowledgeProcessor
+
+# chromadb/langchain 在首次创建客户端时才导入
+if TYPE_CHECKING:
+    from langchain.embeddings import OpenAIEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# 所有集合共用一个持久化目录和一个 Chroma 客户端
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./data/chroma")
+# 旧版每个集合单独一个 Chroma 库（{CHROMA_PERSIST_DIR}/{collection}），库目录中有这些文件之一
+LEGACY_STORE_FILES = ("chroma.sqlite3", "chroma-collections.parquet")
+# 同时保持加载的集合数量上限，超出后按 LRU 淘汰
+MAX_LOADED_COLLECTIONS = int(os.getenv("KNOWLEDGE_MAX_LOADED_COLLECTIONS", "32"))
+# 集合统计信息缓存时间（秒）
+STATS_CACHE_TTL = float(os.getenv("KNOWLEDGE_STATS_CACHE_TTL", "60"))
+
+
+def find_legacy_stores(persist_directory: str = CHROMA_PERSIST_DIR) -> List[Path]:
+    """Per-collection stores left by the old layout under ``persist_directory``."""
+    root = Path(persist_directory)
+    if not root.is_dir():
+        return []
+    return sorted(
+        path for path in root.iterdir()
+        if path.is_dir() and any((path / name).exists() for name in LEGACY_STORE_FILES)
+    )
+
+
+class KnowledgeRegistry:
+    """Lazily loaded, LRU-bounded set of knowledge base collections.
+
+    All processors share one embedding client and one Chroma client, so the
+    cost of a collection is only paid when it is first used.
+    """
+
+    def __init__(
+        self,
+        openai_api_key: str,
+        persist_directory: str = CHROMA_PERSIST_DIR,
+        max_loaded: int = MAX_LOADED_COLLECTIONS,
+        stats_ttl: float = STATS_CACHE_TTL
+    ):
+        self.openai_api_key = openai_api_key
+        self.persist_directory = persist_directory
+        self.max_loaded = max(1, max_loaded)
+        self.stats_ttl = stats_ttl
+
+        self._embeddings = None
+        self._client = None
+        self._processors: "OrderedDict[str, KnowledgeProcessor]" = OrderedDict()
+        self._names: Optional[set] = None
+        self._stats: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def embeddings(self) -> "OpenAIEmbeddings":
+        """Shared embedding client, created on first use."""
+        with self._lock:
+            if self._embeddings is None:
+                from langchain.embeddings import OpenAIEmbeddings
+                self._embeddings = OpenAIEmbeddings(openai_api_key=self.openai_api_key)
+            return self._embeddings
+
+    @property
+    def client(self):
+        """Shared Chroma client, created on first use."""
+        with self._lock:
+            if self._client is None:
+                import chromadb
+                from chromadb.config import Settings
+                self._warn_legacy_stores()
+                self._client = chromadb.PersistentClient(
+                    path=self.persist_directory,
+                    settings=Settings(anonymized_telemetry=False)
+                )
+            return self._client
+
+    def _warn_legacy_stores(self) -> None:
+        # 旧目录中的集合对共享客户端不可见，提示运行迁移脚本
+        legacy = find_legacy_stores(self.persist_directory)
+        if legacy:
+            logger.warning(
+                f"Found {len(legacy)} knowledge base(s) in the old per-collection layout "
+                f"({', '.join(path.name for path in legacy)}); they are not visible until migrated "
+                f"with scripts/migrate_chroma_layout.py"
+            )
+
+    def list_names(self, refresh: bool = False) -> List[str]:
+        """List the names of all collections in the vector store."""
+        with self._lock:
+            if self._names is None or refresh:
+                self._names = {collection.name for collection in self.client.list_collections()}
+            return sorted(self._names)
+
+    def exists(self, collection_name: str) -> bool:
+        """Check whether a collection exists, refreshing the name cache on a miss."""
+        with self._lock:
+            if collection_name in self._processors:
+                return True
+            if collection_name in self.list_names():
+                return True
+            return collection_name in self.list_names(refresh=True)
+
+    def get(self, collection_name: str) -> KnowledgeProcessor:
+        """Return the processor for a collection, loading it if needed."""
+        with self._lock:
+            processor = self._processors.get(collection_name)
+            if processor is not None:
+                self._processors.move_to_end(collection_name)
+                return processor
+
+            processor = KnowledgeProcessor(
+                openai_api_key=self.openai_api_key,
+                collection_name=collection_name,
+                embeddings=self.embeddings,
+                client=self.client,
+                on_change=self._on_collection_change
+            )
+            self._processors[collection_name] = processor
+            if self._names is not None:
+                self._names.add(collection_name)
+
+            while len(self._processors) > self.max_loaded:
+                self._processors.popitem(last=False)
+
+            return processor
+
+    def create(self, collection_name: str) -> KnowledgeProcessor:
+        """Create a new collection and return its processor."""
+        return self.get(collection_name)
+
+    def evict(self, collection_name: str) -> None:
+        """Drop a loaded collection from memory. Data on disk is untouched."""
+        with self._lock:
+            self._processors.pop(collection_name, None)
+
+    def loaded(self) -> List[str]:
+        """Names of the collections currently held in memory, least recent first."""
+        with self._lock:
+            return list(self._processors.keys())
+
+    def invalidate_stats(self, collection_name: str) -> None:
+        with self._lock:
+            self._stats.pop(collection_name, None)
+
+    def _on_collection_change(self, collection_name: str) -> None:
+        self.invalidate_stats(collection_name)
+
+    def get_stats(self, collection_name: str) -> Dict[str, Any]:
+        """Get collection statistics without loading the collection's processor."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._stats.get(collection_name)
+            if cached and now - cached[0] < self.stats_ttl:
+                return cached[1]
+
+        try:
+            collection = self.client.get_collection(collection_name)
+            stats = {
+                "name": collection.name,
+                "count": collection.count(),
+                "metadata": collection.metadata
+            }
+        except Exception as e:
+            raise Exception(f"Error getting collection stats: {str(e)}")
+
+        with self._lock:
+            self._stats[collection_name] = (now, stats)
+        return stats
+
+    def list_stats(self) -> List[Dict[str, Any]]:
+        """Statistics for every collection, served from cache where possible."""
+        return [
+            {
+                "name": name,
+                "stats": self.get_stats(name)
+            }
+            for name in self.list_names(refresh=True)
+        ]
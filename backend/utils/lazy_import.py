@@ -0,0 +1,53 @@
+from types import ModuleType
+from typing import Callable, Optional
+import importlib
+import threading
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    Heavy ML/LLM client libraries take seconds to import, which every worker
+    paid at boot even when no request ever touched them. Module-level code
+    keeps its ``openai.ChatCompletion.create(...)`` call sites unchanged;
+    ``on_load`` runs once after the real import (e.g. to set an API key).
+    """
+
+    def __init__(self, name: str, on_load: Optional[Callable[[ModuleType], None]] = None):
+        self._name = name
+        self._on_load = on_load
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_load is not None:
+                        self._on_load(module)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        if attr in ("_name", "_on_load", "_module", "_lock"):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        if attr.startswith("_"):
+            object.__setattr__(self, attr, value)
+        else:
+            setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name: str, on_load: Optional[Callable[[ModuleType], None]] = None) -> LazyModule:
+    return LazyModule(name, on_load)
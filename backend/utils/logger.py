@@ -1,21 +1,79 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
 import json
+import threading
+import time
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Mapping, Optional
 from pathlib import Path
 import traceback
 from functools import wraps
 
 # 创建日志目录
-LOG_DIR = Path("logs")
+LOG_DIR = Path(os.getenv("LOG_DIR", "logs"))
 LOG_DIR.mkdir(exist_ok=True)
 
+# 每个日志记录器的队列上限，队列满时丢弃新的记录并计数
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# 轮转方式: watched 交给外部 logrotate（文件被移走后自动重新打开），size 按文件大小，time 按时间
+# watched 时所有 worker 追加写同一个文件；size/time 由进程自己轮转，多个 worker 必须各写各的文件
+LOG_ROTATION = os.getenv("LOG_ROTATION", "watched").lower()
+# 每个 worker 写 api.<序号>.log；序号是最小的空闲编号，重启后复用，文件数不随重启增长
+LOG_FILE_PER_WORKER = os.getenv("LOG_FILE_PER_WORKER", str(LOG_ROTATION != "watched")).lower() == "true"
+LOG_MAX_WORKER_SLOTS = int(os.getenv("LOG_MAX_WORKER_SLOTS", "64"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "10"))
+# 容器中通常只需要标准输出，可关闭文件或控制台之一
+LOG_TO_CONSOLE = os.getenv("LOG_TO_CONSOLE", "true").lower() == "true"
+LOG_TO_FILE = os.getenv("LOG_TO_FILE", "true").lower() == "true"
+# 输出格式: json 每行一个固定字段的 JSON 对象，text 为旧的文本格式
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# 成功请求日志的采样率（0-1），错误请求始终记录
+LOG_SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "0.1"))
+# 按路由前缀覆盖采样率，如 "/health=0,/api/chatbot=0.5"，最长前缀优先
+LOG_SAMPLE_RATES = {
+    prefix.strip(): float(rate)
+    for prefix, _, rate in (
+        item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "/health=0,/metrics=0").split(",") if "=" in item
+    )
+}
+# 请求日志中允许记录的请求头，其余（Authorization、Cookie 等）一律不记录
+LOG_HEADER_ALLOWLIST = frozenset(
+    name.strip().lower()
+    for name in os.getenv(
+        "LOG_HEADER_ALLOWLIST",
+        "user-agent,content-type,content-length,referer,x-request-id,x-forwarded-for"
+    ).split(",")
+    if name.strip()
+)
+# 审计日志中允许记录的结果字段，只保留标量值
+AUDIT_DETAIL_FIELDS = (
+    "id", "title", "category", "status", "message", "chunk_count",
+    "embedding_id", "doc_key", "imported", "skipped", "failed", "total"
+)
+
+# JSON 日志的字段及顺序；不在此列的字段不会输出
+LOG_SCHEMA = (
+    "ts", "level", "logger", "event", "message",
+    "request_id", "trace_id", "method", "route", "path", "status", "duration_ms", "stages",
+    "client", "user_id",
+    "headers", "query", "action", "resource_type", "details",
+    "error", "error_type", "traceback", "context"
+)
+
 # 日志格式
 class CustomFormatter(logging.Formatter):
     def format(self, record):
-        # 添加时间戳
-        record.timestamp = datetime.utcnow().isoformat()
+        # 添加时间戳（记录产生的时间，而不是后台线程写入的时间）
+        record.timestamp = datetime.utcfromtimestamp(record.created).isoformat()
         
         # 格式化异常信息
         if record.exc_info:
@@ -25,142 +83,338 @@ class CustomFormatter(logging.Formatter):
         if isinstance(record.msg, (dict, list)):
             record.msg = json.dumps(record.msg, ensure_ascii=False)
         
-        return super().format(record)
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message = f"{message} {json.dumps(fields, ensure_ascii=False, default=str)}"
+        return message
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, limited to the keys in ``LOG_SCHEMA``.
+
+    Structured data travels in ``record.fields`` (see ``log_event``) and is
+    serialized here, on the listener thread, not by the request handler.
+    """
+
+    def format(self, record):
+        entry: Dict[str, Any] = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry["event"] = record.getMessage()
+            for key in LOG_SCHEMA:
+                value = fields.get(key)
+                if value is not None and key not in entry:
+                    entry[key] = value
+        elif isinstance(record.msg, (dict, list)):
+            entry["message"] = record.msg
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+        if record.exc_text and "traceback" not in entry:
+            entry["traceback"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a background listener without ever blocking the caller.
+
+    When the bounded queue is full, records are dropped and counted (ERROR
+    records separately in ``dropped_errors``); the count is reported in a
+    warning once the queue has room again.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.dropped_errors = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只做廉价的准备工作，格式化和写入都在后台线程完成
+        record = copy.copy(record)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+            # 不把 traceback 对象（及其栈帧）留在队列中
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                if record.levelno >= logging.ERROR:
+                    self.dropped_errors += 1
+                self._unreported += 1
+            return
+
+        if self._unreported:
+            with self._lock:
+                count, self._unreported = self._unreported, 0
+            notice = logging.LogRecord(
+                record.name, logging.WARNING, __file__, 0,
+                f"Log queue full, dropped {count} records", None, None
+            )
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                with self._lock:
+                    self._unreported += count
+
+_worker_slot: Optional[str] = None
+_worker_slot_lock = None
+
+def _claim_worker_slot() -> str:
+    """Lowest worker index not held by a running process.
+
+    The index is held with a lock on ``LOG_DIR/.worker.<n>.lock`` until the
+    process exits, so a restarted worker reuses its predecessor's files.
+    """
+    global _worker_slot, _worker_slot_lock
+    if _worker_slot is not None:
+        return _worker_slot
+    try:
+        import fcntl
+    except ImportError:  # 没有 fcntl 的平台退回按 pid 区分
+        _worker_slot = str(os.getpid())
+        return _worker_slot
+    for index in range(LOG_MAX_WORKER_SLOTS):
+        handle = open(LOG_DIR / f".worker.{index}.lock", "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _worker_slot, _worker_slot_lock = str(index), handle
+        return _worker_slot
+    _worker_slot = str(os.getpid())
+    return _worker_slot
+
+def _log_path(log_file: str) -> Path:
+    path = LOG_DIR / log_file
+    if LOG_FILE_PER_WORKER:
+        path = path.with_name(f"{path.stem}.{_claim_worker_slot()}{path.suffix}")
+    return path
+
+def _file_handler(log_file: str) -> logging.Handler:
+    path = _log_path(log_file)
+    if LOG_ROTATION == "watched":
+        return logging.handlers.WatchedFileHandler(path, encoding='utf-8')
+    if LOG_ROTATION == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            path,
+            when=LOG_ROTATE_WHEN,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding='utf-8',
+            utc=True
+        )
+    return logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # 队列满时等待后台线程腾出位置，保证停止前已入队的记录都被写入
+        self.queue.put(self._sentinel)
+
+_listeners: List[logging.handlers.QueueListener] = []
+_queue_handlers: Dict[str, DroppingQueueHandler] = {}
 
 # 日志配置
-def setup_logger(name: str, log_file: str, level=logging.INFO) -> logging.Logger:
+def setup_logger(
+    name: str,
+    log_file: str,
+    level=logging.INFO,
+    formatter: Optional[logging.Formatter] = None,
+    console: bool = LOG_TO_CONSOLE,
+    to_file: bool = LOG_TO_FILE
+) -> logging.Logger:
+    """Logger whose records are written by a background thread.
+
+    The calling thread (usually the event loop) only enqueues the record;
+    the rotating file handler and the stdout handler run on the listener.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    if name in _queue_handlers:
+        return logger
     
-    # 文件处理器
-    file_handler = logging.FileHandler(
-        LOG_DIR / log_file,
-        encoding='utf-8'
-    )
-    file_handler.setLevel(level)
+    # 设置格式
+    if formatter is None and LOG_FORMAT == "text":
+        formatter = CustomFormatter(
+            '%(timestamp)s [%(levelname)s] %(name)s: %(message)s'
+        )
+    elif formatter is None:
+        formatter = JsonFormatter()
     
-    # 控制台处理器
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(level)
+    handlers = []
+    if to_file:
+        # 文件处理器
+        file_handler = _file_handler(log_file)
+        file_handler.setLevel(level)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console:
+        # 控制台处理器
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(level)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
     
-    # 设置格式
-    formatter = CustomFormatter(
-        '%(timestamp)s [%(levelname)s] %(name)s: %(message)s'
-    )
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
+    # 记录器只入队，由后台线程写入
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
     
-    # 添加处理器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(queue_handler)
+    _queue_handlers[name] = queue_handler
+    _listeners.append(listener)
     
     return logger
 
+def stop_logging() -> None:
+    """Write out everything still queued and stop the listener threads."""
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+def logging_stats() -> Dict[str, Dict[str, int]]:
+    """Queue depth and dropped record counts per logger."""
+    return {
+        name: {"queued": handler.queue.qsize(), "dropped": handler.dropped, "dropped_errors": handler.dropped_errors}
+        for name, handler in _queue_handlers.items()
+    }
+
+atexit.register(stop_logging)
+
 # 创建日志记录器
 api_logger = setup_logger('api', 'api.log')
 error_logger = setup_logger('error', 'error.log', logging.ERROR)
 audit_logger = setup_logger('audit', 'audit.log')
 
+def log_event(logger: logging.Logger, level: int, event: str, **fields: Any) -> None:
+    """Log a structured event; ``fields`` outside ``LOG_SCHEMA`` are not written."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+def allowed_headers(headers: Mapping[str, str]) -> Dict[str, str]:
+    """Request headers on the allow-list; credentials and cookies never reach the logs."""
+    return {name: value for name, value in headers.items() if name.lower() in LOG_HEADER_ALLOWLIST}
+
+def sample_rate(path: str) -> float:
+    best, rate = -1, LOG_SUCCESS_SAMPLE_RATE
+    for prefix, prefix_rate in LOG_SAMPLE_RATES.items():
+        if path.startswith(prefix) and len(prefix) > best:
+            best, rate = len(prefix), prefix_rate
+    return rate
+
+def should_log_success(path: str) -> bool:
+    """Sampling decision for a successful request; errors are always logged."""
+    rate = sample_rate(path)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+def audit_details(result: Any, fields: Iterable[str] = AUDIT_DETAIL_FIELDS) -> Optional[Dict[str, Any]]:
+    """Allow-listed scalar fields of a route result, for the audit log."""
+    if not isinstance(result, dict):
+        return None
+    details = {
+        key: result[key] for key in fields
+        if isinstance(result.get(key), (str, int, float, bool))
+    }
+    return details or None
+
 # 请求日志装饰器
 def log_request(logger: logging.Logger = api_logger):
+    """Log failures of the decorated route with request context.
+
+    Successful requests are already logged (sampled) by the HTTP middleware,
+    so the decorator only adds the route's error with its context.
+    """
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # 获取请求信息
-            request = kwargs.get('request')
-            if request:
-                request_info = {
-                    'method': request.method,
-                    'url': str(request.url),
-                    'client': request.client.host if request.client else None,
-                    'headers': dict(request.headers),
-                    'query_params': dict(request.query_params),
-                    'path_params': kwargs.get('path_params', {}),
-                }
-                
-                # 记录请求开始
-                logger.info(f"Request started: {json.dumps(request_info, ensure_ascii=False)}")
-                
-                try:
-                    # 执行请求处理
-                    start_time = datetime.utcnow()
-                    response = await func(*args, **kwargs)
-                    end_time = datetime.utcnow()
-                    
-                    # 计算处理时间
-                    process_time = (end_time - start_time).total_seconds()
-                    
-                    # 记录响应信息
-                    response_info = {
-                        'status_code': getattr(response, 'status_code', 200),
-                        'process_time': f"{process_time:.3f}s",
-                    }
-                    logger.info(f"Request completed: {json.dumps(response_info, ensure_ascii=False)}")
-                    
-                    return response
-                    
-                except Exception as e:
-                    # 记录错误信息
-                    error_info = {
-                        'error': str(e),
-                        'traceback': traceback.format_exc(),
-                    }
-                    error_logger.error(f"Request failed: {json.dumps(error_info, ensure_ascii=False)}")
-                    raise
-                    
-            return await func(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                request = kwargs.get('request')
+                log_event(
+                    error_logger,
+                    logging.ERROR,
+                    "route_failed",
+                    route=func.__name__,
+                    method=getattr(request, 'method', None),
+                    path=request.url.path if request is not None else None,
+                    duration_ms=round((time.perf_counter() - start_time) * 1000, 1),
+                    error=str(e),
+                    error_type=type(e).__name__,
+                    traceback=traceback.format_exc(),
+                )
+                raise
         return wrapper
     return decorator
 
 # 审计日志装饰器
-def log_audit(action: str, resource_type: str, logger: logging.Logger = audit_logger):
+def log_audit(
+    action: str,
+    resource_type: str,
+    logger: logging.Logger = audit_logger,
+    detail_fields: Iterable[str] = AUDIT_DETAIL_FIELDS
+):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # 获取用户信息
             current_user = kwargs.get('current_user')
-            user_info = {
-                'user_id': getattr(current_user, 'id', None),
-                'username': getattr(current_user, 'username', None),
-            }
-            
-            # 记录审计信息
-            audit_info = {
-                'action': action,
-                'resource_type': resource_type,
-                'user': user_info,
-                'timestamp': datetime.utcnow().isoformat(),
-            }
+            user_id = getattr(current_user, 'id', None)
             
             try:
                 # 执行操作
                 result = await func(*args, **kwargs)
-                
-                # 记录成功信息
-                audit_info['status'] = 'success'
-                if isinstance(result, dict):
-                    audit_info['details'] = result
-                logger.info(f"Audit log: {json.dumps(audit_info, ensure_ascii=False)}")
-                
-                return result
-                
             except Exception as e:
                 # 记录失败信息
-                audit_info['status'] = 'failed'
-                audit_info['error'] = str(e)
-                logger.error(f"Audit log: {json.dumps(audit_info, ensure_ascii=False)}")
+                log_event(
+                    logger, logging.ERROR, "audit",
+                    action=action, resource_type=resource_type, user_id=user_id,
+                    status='failed', error=str(e), error_type=type(e).__name__
+                )
                 raise
+            
+            # 记录成功信息（只记录允许的结果字段，不记录整个响应）
+            log_event(
+                logger, logging.INFO, "audit",
+                action=action, resource_type=resource_type, user_id=user_id,
+                status='success', details=audit_details(result, detail_fields)
+            )
+            return result
                 
         return wrapper
     return decorator
 
 # 错误日志记录
 def log_error(error: Exception, context: Optional[Dict[str, Any]] = None):
-    error_info = {
-        'error': str(error),
-        'type': type(error).__name__,
-        'traceback': traceback.format_exc(),
-        'context': context or {},
-        'timestamp': datetime.utcnow().isoformat(),
-    }
-    error_logger.error(f"Error occurred: {json.dumps(error_info, ensure_ascii=False)}") 
\ No newline at end of file
+    log_event(
+        error_logger,
+        logging.ERROR,
+        "error",
+        error=str(error),
+        error_type=type(error).__name__,
+        traceback=''.join(traceback.format_exception(type(error), error, error.__traceback__)),
+        context=context or None,
+    )
@@ -0,0 +1,329 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.tracing import span
+
+# 请求和外部调用耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 单条 SQL 耗时的桶（秒）
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+# 每个请求的 SQL 条数、嵌入批大小的桶
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 每个 worker 进程各自统计，用 worker 标签区分（抓取时命中哪个 worker 就返回哪个的数据）
+WORKER_LABEL = os.getenv("METRICS_WORKER_LABEL", str(os.getpid()))
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels) + ("worker",)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names[:-1]) + (WORKER_LABEL,)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += count
+                le = 'le="' + (bound if bound == "+Inf" else _format_value(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Process-local metrics rendered in the Prometheus text exposition format.
+
+    Collectors are callbacks run at scrape time for values that already live
+    elsewhere (pool state, log queue depth), so nothing is updated per request.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                pass
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests currently being served, by path group", ("group",)
+)
+
+# 数据库
+db_queries = registry.counter("db_queries_total", "SQL statements executed", ("operation",))
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "SQL statement latency", ("operation",), QUERY_BUCKETS
+)
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS
+)
+db_time_per_request = registry.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per HTTP request", ("route",)
+)
+
+# 大模型和嵌入
+llm_request_duration = registry.histogram(
+    "llm_request_duration_seconds", "LLM API call latency", ("provider", "operation")
+)
+llm_requests = registry.counter(
+    "llm_requests_total", "LLM API calls by outcome", ("provider", "operation", "outcome")
+)
+llm_tokens = registry.counter("llm_tokens_total", "LLM tokens used", ("provider", "kind"))
+embedding_batch_size = registry.histogram(
+    "embedding_batch_size", "Texts per embedding API call", ("source",), COUNT_BUCKETS
+)
+
+# 缓存
+cache_requests = registry.counter("cache_requests_total", "Cache lookups by outcome", ("cache", "result"))
+
+# 进行中请求按这些前缀分组（与 main.py 中挂载的路由前缀一致），其余路径归为 other
+PATH_GROUPS = (
+    "/api/auth",
+    "/api/users",
+    "/api/files",
+    "/api/courses",
+    "/api/notifications",
+    "/api/permissions",
+    "/api/learning",
+    "/api/visa",
+    "/api/chatbot",
+    "/api/platform",
+    "/health",
+    "/metrics",
+    "/debug",
+    "/docs",
+    "/openapi.json",
+)
+
+
+def path_group(path: str) -> str:
+    """Low-cardinality group for a path, e.g. /api/chatbot/sessions/3 -> /api/chatbot.
+
+    Only the prefixes in ``PATH_GROUPS`` are used as labels; any other path
+    (scanners, typos) is grouped as ``other`` so the label set stays fixed.
+    """
+    if path == "/":
+        return "/"
+    for prefix in PATH_GROUPS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return prefix
+    return "other"
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def track_llm_call(provider: str, operation: str) -> Iterator[None]:
+    """Time one LLM API call and count its outcome; also recorded as an ``llm.*`` span."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(f"llm.{operation}", **{"llm.provider": provider}):
+            yield
+        outcome = "success"
+    finally:
+        llm_request_duration.observe(time.perf_counter() - start, provider=provider, operation=operation)
+        llm_requests.inc(provider=provider, operation=operation, outcome=outcome)
+
+
+def record_llm_usage(provider: str, usage: Any) -> None:
+    """Add token usage from a response's ``usage`` (object or dict); missing fields are skipped."""
+    if usage is None:
+        return
+    for kind, names in (
+        ("prompt", ("prompt_tokens", "input_tokens")),
+        ("completion", ("completion_tokens", "output_tokens")),
+    ):
+        for name in names:
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            if value:
+                llm_tokens.inc(value, provider=provider, kind=kind)
+                break
+
+
+def record_embedding_batch(source: str, size: int) -> None:
+    embedding_batch_size.observe(size, source=source)
+
+
+# 每个请求的 SQL 统计，由 HTTP 中间件设置
+class RequestDbStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def begin_request_db_stats() -> Tuple[RequestDbStats, Any]:
+    stats = RequestDbStats()
+    return stats, _request_db_stats.set(stats)
+
+
+def end_request_db_stats(stats: RequestDbStats, token: Any, route: str) -> None:
+    _request_db_stats.reset(token)
+    db_queries_per_request.observe(stats.queries, route=route)
+    db_time_per_request.observe(stats.seconds, route=route)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    db_queries.inc(operation=operation)
+    db_query_duration.observe(elapsed, operation=operation)
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_query_start"):
+        connection.info["metrics_query_start"].pop()
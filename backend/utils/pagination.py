@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+import base64
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+# 单页最大条数
+MAX_PAGE_SIZE = 200
+# 下一页游标通过响应头返回
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Opaque cursor for the position just after (sort_value, row_id)."""
+    if isinstance(sort_value, datetime):
+        payload = {"v": sort_value.isoformat(), "t": "dt", "id": row_id}
+    else:
+        payload = {"v": sort_value, "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if payload.get("t") == "dt":
+            value = datetime.fromisoformat(value)
+        return value, int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_keyset(
+    query,
+    id_column,
+    cursor: Optional[str],
+    limit: int,
+    sort_column=None,
+    descending: bool = True,
+    nulls_last: bool = False
+):
+    """Order ``query`` by (sort_column, id) and start after ``cursor``.
+
+    Fetches ``limit + 1`` rows so that ``paginate`` can tell whether another
+    page exists without a COUNT query. With no ``sort_column`` the id alone
+    is the key. ``nulls_last`` is for a nullable ``sort_column``: rows without
+    a value come after all others, in id order.
+    """
+    columns = [sort_column, id_column] if sort_column is not None else [id_column]
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        after_id = id_column < last_id if descending else id_column > last_id
+        if sort_column is None:
+            query = query.where(after_id)
+        elif nulls_last and value is None:
+            # 游标已进入末尾的 NULL 段
+            query = query.where(sort_column.is_(None), after_id)
+        else:
+            after_value = sort_column < value if descending else sort_column > value
+            conditions = [after_value, and_(sort_column == value, after_id)]
+            if nulls_last:
+                conditions.append(sort_column.is_(None))
+            query = query.where(or_(*conditions))
+    order = [column.desc() if descending else column.asc() for column in columns]
+    if nulls_last and sort_column is not None:
+        order[0] = order[0].nullslast()
+    return query.order_by(*order).limit(limit + 1)
+
+
+def paginate(
+    rows: Sequence[Any],
+    limit: int,
+    key: Callable[[Any], Tuple[Any, int]]
+) -> Tuple[List[Any], Optional[str]]:
+    """Trim the extra look-ahead row and build the cursor for the next page."""
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    return page, encode_cursor(*key(page[-1]))
@@ -1,9 +1,21 @@
-from functools import lru_cache
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from functools import wraps
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 import models
 from datetime import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+from utils.metrics import record_cache
+from utils.redis_client import get_redis, redis_in_background
+
+logger = logging.getLogger(__name__)
 
 # 预定义的权限配置
 PERMISSIONS = {
@@ -25,24 +37,234 @@ PERMISSIONS = {
     ]
 }
 
-@lru_cache(maxsize=1000)
-def get_user_permissions(user_id: int, db: Session) -> List[str]:
-    """获取用户所有权限"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+# 权限缓存有效期（秒），变更时会主动失效，TTL 只是兜底
+PERMISSION_CACHE_TTL = int(os.getenv("PERMISSION_CACHE_TTL", "300"))
+
+# 管理员的权限掩码：所有位都为 1，与任何权限位相与都非零
+ALL_PERMISSIONS = -1
+
+# 文件级权限位，permission_type 中逗号分隔的每一项对应一位
+FILE_PERMISSION_BITS = {
+    'read': 1,
+    'write': 2,
+    'delete': 4,
+    'share': 8
+}
+
+def encode_file_permissions(permission_type: Optional[str]) -> int:
+    """把 "read,write" 形式的文件权限编码为位掩码"""
+    mask = 0
+    for name in (permission_type or '').split(','):
+        mask |= FILE_PERMISSION_BITS.get(name.strip(), 0)
+    return mask
+
+class PermissionRegistry:
+    """Interns permissions to bits and compiles each role to a bitmask.
+
+    Permission ``id`` is the bit index, and both the permission name and its
+    ``resource_type:action`` form map to that bit. The registry is compiled
+    from two queries and recompiled when the permission cache generation
+    moves (a role or permission changed somewhere) or when a check names a
+    permission it has not seen yet.
+    """
+
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+        self._role_masks: Dict[int, int] = {}
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def compile(self, db: Session, generation: Optional[int] = None) -> None:
+        bits = {}
+        for permission_id, name, resource_type, action in db.query(
+            models.Permission.id,
+            models.Permission.name,
+            models.Permission.resource_type,
+            models.Permission.action
+        ):
+            bit = 1 << permission_id
+            bits[name] = bit
+            bits[f"{resource_type}:{action}"] = bits.get(f"{resource_type}:{action}", 0) | bit
+
+        role_masks: Dict[int, int] = {}
+        for role_id, permission_id in db.query(
+            models.role_permissions.c.role_id,
+            models.role_permissions.c.permission_id
+        ):
+            if role_id is not None and permission_id is not None:
+                role_masks[role_id] = role_masks.get(role_id, 0) | (1 << permission_id)
+
+        with self._lock:
+            self._bits = bits
+            self._role_masks = role_masks
+            self._generation = generation
+        logger.info(f"Compiled {len(bits)} permission names for {len(role_masks)} roles")
+
+    def ensure_current(self, db: Session, generation: int) -> None:
+        if self._generation != generation:
+            self.compile(db, generation)
+
+    def bit(self, permission: str, db: Session) -> int:
+        bit = self._bits.get(permission)
+        if bit is None:
+            # 可能是其他进程刚创建的权限，重新编译一次
+            self.compile(db, self._generation)
+            # 仍未知的权限不写入缓存，之后创建时能被下一次查找发现
+            bit = self._bits.get(permission, 0)
+        return bit
+
+    def role_mask(self, role_id: int) -> int:
+        return self._role_masks.get(role_id, 0)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation = None
+
+permission_registry = PermissionRegistry()
+
+class PermissionCache:
+    """Per-user permission masks shared across workers.
+
+    Entries are stored in Redis with the current generation; changing a role
+    or permission bumps the generation so every entry becomes stale at once,
+    while a user-role change only drops that user's entry. Without Redis a
+    process-local dict stands in. Every method may block on Redis, so async
+    code calls them through ``call_redis`` or the threadpool.
+    """
+
+    GENERATION_KEY = "permissions:generation"
+    KEY_PREFIX = "permissions:user:"
+
+    def __init__(self, ttl: int = PERMISSION_CACHE_TTL):
+        self.ttl = ttl
+        self._generation = 0
+        self._local: Dict[int, Tuple[int, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        client = get_redis()
+        if client is not None:
+            try:
+                return int(client.get(self.GENERATION_KEY) or 0)
+            except Exception as e:
+                logger.warning(f"Permission generation lookup failed: {str(e)}")
+        return self._generation
+
+    def get(self, user_id: int) -> Optional[int]:
+        client = get_redis()
+        if client is not None:
+            try:
+                generation, raw = client.mget(self.GENERATION_KEY, self.KEY_PREFIX + str(user_id))
+                if raw is None:
+                    return None
+                entry = json.loads(raw)
+                if entry["generation"] != int(generation or 0):
+                    return None
+                return entry["mask"]
+            except Exception as e:
+                logger.warning(f"Permission cache lookup failed for user {user_id}: {str(e)}")
+                return None
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            generation, expires_at, mask = entry
+            if generation != self._generation or expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            return mask
+
+    def put(self, user_id: int, mask: int, generation: int) -> None:
+        client = get_redis()
+        if client is not None:
+            try:
+                client.setex(
+                    self.KEY_PREFIX + str(user_id),
+                    self.ttl,
+                    json.dumps({"generation": generation, "mask": mask})
+                )
+            except Exception as e:
+                logger.warning(f"Permission cache store failed for user {user_id}: {str(e)}")
+            return
+        with self._lock:
+            self._local[user_id] = (generation, time.monotonic() + self.ttl, mask)
+
+    def invalidate_user(self, user_id: int) -> None:
+        client = get_redis()
+        if client is not None:
+            try:
+                client.delete(self.KEY_PREFIX + str(user_id))
+            except Exception as e:
+                logger.error(f"Permission cache invalidation failed for user {user_id}: {str(e)}")
+        with self._lock:
+            self._local.pop(user_id, None)
+
+    def invalidate_all(self) -> None:
+        client = get_redis()
+        if client is not None:
+            try:
+                client.incr(self.GENERATION_KEY)
+            except Exception as e:
+                logger.error(f"Permission cache invalidation failed: {str(e)}")
+        with self._lock:
+            self._generation += 1
+            self._local.clear()
+        permission_registry.invalidate()
+
+permission_cache = PermissionCache()
+
+# 管理员标记变更会改变权限集合，提交后使该用户缓存失效
+@event.listens_for(models.User, "after_update")
+def _mark_admin_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None and inspect(target).attrs.is_admin.history.has_changes():
+        session.info.setdefault("permission_users_changed", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_permissions(session) -> None:
+    for user_id in session.info.pop("permission_users_changed", ()):
+        redis_in_background(permission_cache.invalidate_user, user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_permission_changes(session) -> None:
+    session.info.pop("permission_users_changed", None)
+
+# 写入文件权限时同步维护位掩码
+def _encode_file_permission(mapper, connection, target) -> None:
+    target.permission_mask = encode_file_permissions(target.permission_type)
+
+for _event in ("before_insert", "before_update"):
+    event.listen(models.FilePermission, _event, _encode_file_permission)
+
+def compile_permissions(db: Session) -> None:
+    """启动时编译权限位和角色掩码"""
+    permission_registry.compile(db, permission_cache.generation())
+
+def load_user_permission_mask(user_id: int, db: Session, generation: int) -> int:
+    """从数据库计算用户有效权限掩码（所有角色掩码按位或）"""
+    user = db.query(models.User.is_admin).filter(models.User.id == user_id).first()
     if not user:
-        return []
+        return 0
     
-    # 如果是管理员，返回所有权限
+    # 如果是管理员，拥有所有权限
     if user.is_admin:
-        return ['*']
+        return ALL_PERMISSIONS
     
-    # 获取用户所有角色的权限
-    permissions = set()
-    for role in user.roles:
-        for permission in role.permissions:
-            permissions.add(f"{permission.resource_type}:{permission.action}")
-    
-    return list(permissions)
+    permission_registry.ensure_current(db, generation)
+    mask = 0
+    for (role_id,) in db.query(models.UserRole.role_id).filter(models.UserRole.user_id == user_id):
+        mask |= permission_registry.role_mask(role_id)
+    return mask
+
+def get_user_permission_mask(user_id: int, db: Session) -> int:
+    """获取用户有效权限掩码（优先读缓存）"""
+    mask = permission_cache.get(user_id)
+    record_cache("permissions", mask is not None)
+    if mask is None:
+        generation = permission_cache.generation()
+        mask = load_user_permission_mask(user_id, db, generation)
+        permission_cache.put(user_id, mask, generation)
+    return mask
 
 def check_permission(
     required_permission: str,
@@ -52,14 +274,14 @@ def check_permission(
     resource_type: Optional[str] = None
 ) -> bool:
     """检查用户是否有指定权限"""
-    user_permissions = get_user_permissions(user_id, db)
+    mask = get_user_permission_mask(user_id, db)
     
-    # 如果有通配符权限，直接返回True
-    if '*' in user_permissions:
+    # 管理员拥有所有权限
+    if mask == ALL_PERMISSIONS:
         return True
     
     # 检查具体权限
-    if required_permission in user_permissions:
+    if mask & permission_registry.bit(required_permission, db):
         # 如果是资源相关的权限，检查资源权限
         if resource_id and resource_type:
             return check_resource_permission(
@@ -73,6 +295,46 @@ def check_permission(
     
     return False
 
+def _resource_permission_query(user_id: int, resource_ids: List[Any], resource_type: str):
+    columns = (models.FilePermission.permission_mask, models.FilePermission.permission_type)
+    if resource_type == 'file':
+        # 与逐条检查一致：只看授权记录，file_id 不要求有对应的知识库条目
+        return select(models.FilePermission.file_id, *columns).where(
+            models.FilePermission.file_id.in_(resource_ids),
+            models.FilePermission.user_id == user_id
+        )
+    raise ValueError(f"Unsupported resource type: {resource_type}")
+
+def _collect_resource_masks(rows) -> Dict[Any, int]:
+    masks: Dict[Any, int] = {}
+    for resource_id, permission_mask, permission_type in rows:
+        if permission_mask is None:
+            # 旧数据可能还没有掩码，回退到解析 permission_type
+            permission_mask = encode_file_permissions(permission_type)
+        if permission_mask:
+            masks[resource_id] = masks.get(resource_id, 0) | permission_mask
+    return masks
+
+def resolve_resource_permissions(
+    user_id: int,
+    resource_ids: Iterable[Any],
+    resource_type: str,
+    db: Session
+) -> Dict[Any, int]:
+    """一次查询解析用户被授予的一组资源的权限掩码，没有授权记录的资源不在结果中
+
+    与 check_resource_permission 相同，只依据 FilePermission 授权；所有者的访问由调用方判断。
+    """
+    resource_ids = list(set(resource_ids))
+    if not resource_ids:
+        return {}
+    rows = db.execute(_resource_permission_query(user_id, resource_ids, resource_type))
+    return _collect_resource_masks(rows)
+
+def file_permission_bit(permission: str) -> int:
+    """文件权限位，接受 "read" 或 "file:read" 两种写法"""
+    return FILE_PERMISSION_BITS.get(permission.rsplit(':', 1)[-1], 0)
+
 def check_resource_permission(
     user_id: int,
     resource_id: int,
@@ -82,13 +344,8 @@ def check_resource_permission(
 ) -> bool:
     """检查用户对特定资源的权限"""
     if resource_type == 'file':
-        file_permission = db.query(models.FilePermission).filter(
-            models.FilePermission.file_id == resource_id,
-            models.FilePermission.user_id == user_id
-        ).first()
-        
-        if file_permission:
-            return permission in file_permission.permission_type.split(',')
+        masks = resolve_resource_permissions(user_id, [resource_id], resource_type, db)
+        return bool(masks.get(resource_id, 0) & file_permission_bit(permission))
     
     return False
 
@@ -117,13 +374,17 @@ def log_permission_action(
 def require_permission(permission: str):
     """权限检查装饰器"""
     def decorator(func):
+        # 保留原函数签名，FastAPI 才能解析依赖参数
+        @wraps(func)
         async def wrapper(*args, **kwargs):
             db = kwargs.get('db')
             current_user = kwargs.get('current_user')
             resource_id = kwargs.get('resource_id')
             resource_type = kwargs.get('resource_type')
             
-            if not check_permission(
+            # 权限缓存（Redis）和数据库查询都是阻塞调用，放到线程池执行
+            if not await run_in_threadpool(
+                check_permission,
                 permission,
                 current_user.id,
                 db,
@@ -139,65 +400,80 @@ def require_permission(permission: str):
         return wrapper
     return decorator
 
+# 基本角色
+BASE_ROLES = {
+    'admin': '系统管理员',
+    'teacher': '教师',
+    'student': '学生'
+}
+
+# 基本权限: (名称, 描述, 资源类型, 操作)
+BASE_PERMISSIONS = [
+    ('view_courses', '查看课程', 'course', 'read'),
+    ('edit_courses', '编辑课程', 'course', 'write'),
+    ('view_students', '查看学生', 'student', 'read'),
+    ('manage_assignments', '管理作业', 'assignment', 'write'),
+    ('grade_assignments', '评分作业', 'assignment', 'grade'),
+    ('view_analytics', '查看分析', 'analytics', 'read'),
+    ('submit_assignments', '提交作业', 'assignment', 'submit'),
+    ('view_grades', '查看成绩', 'grade', 'read'),
+    ('view_progress', '查看进度', 'progress', 'read')
+]
+
+def _insert_missing(db: Session, table, rows: List[dict], key_columns: List[str]) -> None:
+    """批量插入，已存在（按唯一键）的行跳过"""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        db.execute(insert(table).values(rows).on_conflict_do_nothing(index_elements=key_columns))
+        return
+    # 其他数据库：先查出已有的键再插入剩余行
+    columns = [table.c[name] for name in key_columns]
+    existing = set(db.execute(select(*columns)).all())
+    rows = [row for row in rows if tuple(row[name] for name in key_columns) not in existing]
+    if rows:
+        db.execute(table.insert().values(rows))
+
 def initialize_permissions(db: Session):
-    """初始化系统权限"""
-    # 创建基本角色
-    roles = {
-        'admin': '系统管理员',
-        'teacher': '教师',
-        'student': '学生'
-    }
-    
-    for role_name, description in roles.items():
-        role = db.query(models.Role).filter(models.Role.name == role_name).first()
-        if not role:
-            role = models.Role(name=role_name, description=description)
-            db.add(role)
-    
-    db.commit()
-    
-    # 创建基本权限
-    permissions = [
-        ('view_courses', '查看课程', 'course', 'read'),
-        ('edit_courses', '编辑课程', 'course', 'write'),
-        ('view_students', '查看学生', 'student', 'read'),
-        ('manage_assignments', '管理作业', 'assignment', 'write'),
-        ('grade_assignments', '评分作业', 'assignment', 'grade'),
-        ('view_analytics', '查看分析', 'analytics', 'read'),
-        ('submit_assignments', '提交作业', 'assignment', 'submit'),
-        ('view_grades', '查看成绩', 'grade', 'read'),
-        ('view_progress', '查看进度', 'progress', 'read')
-    ]
-    
-    for name, description, resource_type, action in permissions:
-        permission = db.query(models.Permission).filter(
-            models.Permission.name == name
-        ).first()
-        if not permission:
-            permission = models.Permission(
-                name=name,
-                description=description,
-                resource_type=resource_type,
-                action=action
-            )
-            db.add(permission)
-    
-    db.commit()
+    """初始化系统角色和权限（可重复执行，已有数据不会重复插入）"""
+    _insert_missing(
+        db,
+        models.Role.__table__,
+        [{'name': name, 'description': description} for name, description in BASE_ROLES.items()],
+        ['name']
+    )
+    _insert_missing(
+        db,
+        models.Permission.__table__,
+        [
+            {'name': name, 'description': description, 'resource_type': resource_type, 'action': action}
+            for name, description, resource_type, action in BASE_PERMISSIONS
+        ],
+        ['name']
+    )
     
     # 为角色分配权限
+    role_ids = dict(db.query(models.Role.name, models.Role.id).filter(models.Role.name.in_(list(PERMISSIONS))))
+    permission_ids = dict(db.query(models.Permission.name, models.Permission.id))
+    links = []
     for role_name, permission_list in PERMISSIONS.items():
-        role = db.query(models.Role).filter(models.Role.name == role_name).first()
-        if role:
-            for permission_name in permission_list:
-                if permission_name == '*':
-                    # 为管理员分配所有权限
-                    permissions = db.query(models.Permission).all()
-                    role.permissions.extend(permissions)
-                else:
-                    permission = db.query(models.Permission).filter(
-                        models.Permission.name == permission_name
-                    ).first()
-                    if permission and permission not in role.permissions:
-                        role.permissions.append(permission)
+        role_id = role_ids.get(role_name)
+        if role_id is None:
+            continue
+        if '*' in permission_list:
+            # 为管理员分配所有权限
+            targets = permission_ids.values()
+        else:
+            targets = [permission_ids[name] for name in permission_list if name in permission_ids]
+        links.extend({'role_id': role_id, 'permission_id': permission_id} for permission_id in targets)
+    _insert_missing(db, models.role_permissions, links, ['role_id', 'permission_id'])
+    
+    db.commit()
     
-    db.commit() 
\ No newline at end of file
+    # 角色权限可能已变化，所有用户的缓存失效
+    permission_cache.invalidate_all()
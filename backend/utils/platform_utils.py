@@ -6,7 +6,6 @@ from ..schemas.platform import WechatMessage, TeamsMessage
 from ..utils.chatbot_utils import generate_response, search_knowledge_base
 import json
 from datetime import datetime
-import requests
 from ..config import settings
 
 async def handle_wechat_message(message: WechatMessage) -> Dict[str, Any]:
@@ -0,0 +1,213 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import os
+
+from sqlalchemy import event, func, inspect, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.learning import Course, Enrollment, Activity, Milestone, StudentProgressSnapshot
+from utils.pagination import encode_cursor
+
+# 快照中每个列表保存的条数（即仪表盘第一页的最大长度）
+SNAPSHOT_LIST_SIZE = int(os.getenv("PROGRESS_SNAPSHOT_LIST_SIZE", "50"))
+
+
+def _activity_entry(activity_id: int, description: str, course_name: str, date: datetime, status: str) -> Dict[str, Any]:
+    return {
+        "id": activity_id,
+        "description": description,
+        "courseName": course_name,
+        "date": date.isoformat(),
+        "status": status,
+        "cursor": encode_cursor(date, activity_id)
+    }
+
+
+def _milestone_entry(milestone: Milestone) -> Dict[str, Any]:
+    return {
+        "id": milestone.id,
+        "title": milestone.title,
+        "description": milestone.description,
+        "progress": milestone.progress,
+        "cursor": encode_cursor(milestone.id, milestone.id)
+    }
+
+
+async def rebuild_snapshot(db: AsyncSession, student_id: int) -> StudentProgressSnapshot:
+    """Recompute one student's snapshot from the base tables.
+
+    Only used when a snapshot is missing; afterwards the write routes keep
+    it current through the ``apply_*`` helpers below, and enrollment or
+    course changes drop it so that the next read rebuilds it. The row is upserted,
+    so concurrent first builds for one student do not conflict. The caller
+    commits.
+    """
+    counts = dict((await db.execute(
+        select(Enrollment.status, func.count(Enrollment.id))
+        .where(Enrollment.student_id == student_id)
+        .group_by(Enrollment.status)
+    )).all())
+    total = sum(counts.values())
+
+    course_rows = (await db.execute(
+        select(
+            Enrollment.id,
+            Course.id,
+            Course.name,
+            Enrollment.status,
+            Enrollment.progress,
+            Enrollment.last_activity
+        )
+        .join(Course, Course.id == Enrollment.course_id)
+        .where(Enrollment.student_id == student_id)
+        # 与分页查询一致：没有 last_activity 的选课排在最后
+        .order_by(Enrollment.last_activity.desc().nullslast(), Enrollment.id.desc())
+        .limit(SNAPSHOT_LIST_SIZE)
+    )).all()
+
+    activity_rows = (await db.execute(
+        select(Activity.id, Activity.description, Course.name, Activity.date, Activity.status)
+        .join(Course, Course.id == Activity.course_id)
+        .where(Activity.student_id == student_id)
+        .order_by(Activity.date.desc(), Activity.id.desc())
+        .limit(SNAPSHOT_LIST_SIZE)
+    )).all()
+    activity_count = (await db.execute(
+        select(func.count(Activity.id)).where(Activity.student_id == student_id)
+    )).scalar()
+
+    milestones = (await db.execute(
+        select(Milestone)
+        .where(Milestone.student_id == student_id)
+        .order_by(Milestone.id.asc())
+        .limit(SNAPSHOT_LIST_SIZE)
+    )).scalars().all()
+    milestone_count = (await db.execute(
+        select(func.count(Milestone.id)).where(Milestone.student_id == student_id)
+    )).scalar()
+
+    completed = counts.get("completed", 0)
+    in_progress = counts.get("in_progress", 0)
+    values = {
+        "completed": completed,
+        "in_progress": in_progress,
+        "not_started": total - completed - in_progress,
+        "activity_count": activity_count,
+        "milestone_count": milestone_count,
+        "courses": [
+            {
+                "id": course_id,
+                "name": name,
+                "status": status,
+                "progress": progress,
+                "lastActivity": last_activity.isoformat() if last_activity else None,
+                "cursor": encode_cursor(last_activity, enrollment_id)
+            }
+            for enrollment_id, course_id, name, status, progress, last_activity in course_rows
+        ],
+        "recent_activities": [_activity_entry(*row) for row in activity_rows],
+        "milestones": [_milestone_entry(milestone) for milestone in milestones],
+        "updated_at": datetime.utcnow()
+    }
+    await _upsert_snapshot(db, student_id, values)
+    return await db.get(StudentProgressSnapshot, student_id, populate_existing=True)
+
+
+async def _upsert_snapshot(db: AsyncSession, student_id: int, values: Dict[str, Any]) -> None:
+    """写入快照行；两个请求同时为同一学生首次建快照时不会因主键冲突回滚调用方的写入"""
+    table = StudentProgressSnapshot.__table__
+    dialect = (await db.connection()).dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        await db.execute(
+            insert(table)
+            .values(student_id=student_id, **values)
+            .on_conflict_do_update(index_elements=["student_id"], set_=values)
+        )
+        return
+    # 其他数据库：先更新，没有行再在保存点中插入，插入冲突说明别人刚建好，再更新一次
+    update = table.update().where(table.c.student_id == student_id).values(**values)
+    if (await db.execute(update)).rowcount:
+        return
+    try:
+        async with db.begin_nested():
+            await db.execute(table.insert().values(student_id=student_id, **values))
+    except IntegrityError:
+        await db.execute(update)
+
+
+async def _locked_snapshot(db: AsyncSession, student_id: int) -> Optional[StudentProgressSnapshot]:
+    # 行锁防止同一学生的并发写入互相覆盖 JSON 列表
+    return (await db.execute(
+        select(StudentProgressSnapshot)
+        .where(StudentProgressSnapshot.student_id == student_id)
+        .with_for_update()
+    )).scalars().first()
+
+
+async def apply_activity(db: AsyncSession, activity: Activity) -> None:
+    """Add a newly flushed activity to its student's snapshot."""
+    snapshot = await _locked_snapshot(db, activity.student_id)
+    if snapshot is None:
+        await rebuild_snapshot(db, activity.student_id)
+        return
+
+    course_name = (await db.execute(
+        select(Course.name).where(Course.id == activity.course_id)
+    )).scalar()
+    entry = _activity_entry(activity.id, activity.description, course_name, activity.date, activity.status)
+    # JSON 列需要重新赋值才会被识别为已修改
+    snapshot.recent_activities = [entry] + list(snapshot.recent_activities or [])[:SNAPSHOT_LIST_SIZE - 1]
+    snapshot.activity_count = (snapshot.activity_count or 0) + 1
+    snapshot.updated_at = datetime.utcnow()
+
+
+async def apply_milestone(db: AsyncSession, milestone: Milestone, created: bool = False) -> None:
+    """Add a new milestone to, or update one in, its student's snapshot."""
+    snapshot = await _locked_snapshot(db, milestone.student_id)
+    if snapshot is None:
+        await rebuild_snapshot(db, milestone.student_id)
+        return
+
+    entries: List[Dict[str, Any]] = list(snapshot.milestones or [])
+    if created:
+        snapshot.milestone_count = (snapshot.milestone_count or 0) + 1
+        # 按 id 升序排列，新里程碑只有在第一页未满时才出现在快照中
+        if len(entries) < SNAPSHOT_LIST_SIZE:
+            entries.append(_milestone_entry(milestone))
+    else:
+        entries = [
+            _milestone_entry(milestone) if entry["id"] == milestone.id else entry
+            for entry in entries
+        ]
+    snapshot.milestones = entries
+    snapshot.updated_at = datetime.utcnow()
+
+
+# 选课和课程名称的变化没有增量更新，直接删除受影响的快照，下次读取时重建。
+# 与写入同一事务执行；绕过 ORM 的批量 UPDATE/DELETE 不会触发，需调用方自行重建
+def _drop_enrollment_snapshot(mapper, connection, target: Enrollment) -> None:
+    history = inspect(target).attrs.student_id.history
+    student_ids = {target.student_id, *(history.deleted or ())} - {None}
+    if student_ids:
+        table = StudentProgressSnapshot.__table__
+        connection.execute(table.delete().where(table.c.student_id.in_(student_ids)))
+
+
+def _drop_course_snapshots(mapper, connection, target: Course) -> None:
+    if not inspect(target).attrs.name.history.has_changes():
+        return
+    table = StudentProgressSnapshot.__table__
+    connection.execute(table.delete().where(or_(
+        table.c.student_id.in_(select(Enrollment.student_id).where(Enrollment.course_id == target.id)),
+        table.c.student_id.in_(select(Activity.student_id).where(Activity.course_id == target.id))
+    )))
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Enrollment, _event, _drop_enrollment_snapshot)
+event.listen(Course, "after_update", _drop_course_snapshots)
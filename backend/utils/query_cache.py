@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import logging
+import os
+import threading
+import time
+
+from utils.metrics import record_cache
+from utils.redis_client import get_redis, redis_in_background
+
+logger = logging.getLogger(__name__)
+
+# 每个进程缓存的查询结果条数上限
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+# 没有 Redis 时版本号只在本进程内递增，其他 worker 的写入不可见；
+# 此时结果最多缓存这么多秒（0 表示没有 Redis 就不缓存），单 worker 部署可调大
+QUERY_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("QUERY_CACHE_LOCAL_TTL_SECONDS", "30"))
+
+
+class IndexVersions:
+    """Per-index version counters, bumped on every ingest or delete.
+
+    Versions live in Redis when it is configured so that every worker sees
+    a bump immediately; otherwise they are kept in process and a worker
+    does not see bumps made by the others (see ``shared``). ``get`` is a
+    Redis round trip, so searches run in the threadpool, and a bump made on
+    the event loop thread is sent from the executor.
+    """
+
+    KEY_PREFIX = "index_version:"
+
+    def __init__(self):
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self) -> bool:
+        """Whether versions are visible to every worker (i.e. kept in Redis)."""
+        return get_redis() is not None
+
+    def get(self, scope: str) -> Optional[int]:
+        """Current version of ``scope``, or None if it cannot be determined."""
+        client = get_redis()
+        if client is not None:
+            try:
+                return int(client.get(self.KEY_PREFIX + scope) or 0)
+            except Exception as e:
+                logger.warning(f"Failed to read index version for {scope}: {str(e)}")
+                return None
+        with self._lock:
+            return self._local.get(scope, 0)
+
+    def bump(self, scope: str) -> None:
+        redis_in_background(self._bump_shared, scope)
+        with self._lock:
+            self._local[scope] = self._local.get(scope, 0) + 1
+
+    def _bump_shared(self, scope: str) -> None:
+        client = get_redis()
+        if client is not None:
+            try:
+                client.incr(self.KEY_PREFIX + scope)
+            except Exception as e:
+                logger.error(f"Failed to bump index version for {scope}: {str(e)}")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _cache_label(scope: str) -> str:
+    # 指标只按范围类别区分（knowledge:<collection> -> query:knowledge），避免标签过多
+    return "query:" + scope.split(":", 1)[0]
+
+
+class QueryResultCache:
+    """LRU cache of search results keyed by (scope, query, filters, index version).
+
+    A write bumps the scope's version, so entries computed against an older
+    index can never be returned again and simply age out of the LRU.
+
+    Without Redis a write in another worker does not bump this worker's
+    version, so entries also expire after ``local_ttl`` seconds and results
+    can be that stale; with ``local_ttl`` of 0 nothing is cached.
+    """
+
+    def __init__(
+        self,
+        versions: IndexVersions,
+        max_entries: int = QUERY_CACHE_SIZE,
+        local_ttl: float = QUERY_CACHE_LOCAL_TTL_SECONDS
+    ):
+        self.versions = versions
+        self.max_entries = max(1, max_entries)
+        self.local_ttl = local_ttl
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(
+        self,
+        scope: str,
+        query: str,
+        filters: Dict[str, Any],
+        compute: Callable[[], Any]
+    ) -> Any:
+        ttl = None if self.versions.shared else self.local_ttl
+        if ttl is not None and ttl <= 0:
+            return compute()
+        version = self.versions.get(scope)
+        if version is None:
+            return compute()
+
+        key = (scope, normalize_query(query), tuple(sorted(filters.items())), version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (ttl is None or now - entry[1] < ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                record_cache(_cache_label(scope), True)
+                return entry[0]
+            self.misses += 1
+        record_cache(_cache_label(scope), False)
+
+        result = compute()
+
+        with self._lock:
+            self._entries[key] = (result, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+index_versions = IndexVersions()
+query_cache = QueryResultCache(index_versions)
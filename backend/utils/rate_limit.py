@@ -0,0 +1,111 @@
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+import math
+import os
+import threading
+import time
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# 登录失败次数限制（固定时间窗口）
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_MAX_FAILURES_PER_ACCOUNT = int(os.getenv("LOGIN_MAX_FAILURES_PER_ACCOUNT", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+
+
+class FailureLimiter:
+    """Counts failures per key in fixed windows and blocks keys over their limit.
+
+    Counters live in Redis when it is configured so that limits hold across
+    workers; otherwise each process keeps its own, and expired windows are
+    swept on write so the dict only holds keys with recent failures.
+    """
+
+    KEY_PREFIX = "ratelimit:"
+
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        self._local: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def _count(self, key: str) -> Tuple[int, float]:
+        """Failures recorded for ``key`` and seconds until its window resets."""
+        client = get_redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline()
+                pipe.get(self.KEY_PREFIX + key)
+                pipe.ttl(self.KEY_PREFIX + key)
+                count, ttl = pipe.execute()
+                return int(count or 0), max(ttl or 0, 0)
+            except Exception as e:
+                logger.warning(f"Rate limit lookup failed for {key}: {str(e)}")
+        with self._lock:
+            count, reset_at = self._local.get(key, (0, 0.0))
+            remaining = reset_at - time.monotonic()
+            if remaining <= 0:
+                self._local.pop(key, None)
+                return 0, 0
+            return count, remaining
+
+    def retry_after(self, limits: Iterable[Tuple[str, int]]) -> Optional[int]:
+        """Seconds to wait if any (key, limit) pair is over its limit, else None."""
+        wait = 0.0
+        for key, limit in limits:
+            count, remaining = self._count(key)
+            if count >= limit:
+                wait = max(wait, remaining)
+        return math.ceil(wait) if wait > 0 else None
+
+    def record_failure(self, keys: Iterable[str]) -> None:
+        client = get_redis()
+        for key in keys:
+            if client is not None:
+                try:
+                    # 窗口从第一次失败开始计时；SET NX EX 与 INCR 在同一事务中，计数键不会没有过期时间
+                    pipe = client.pipeline()
+                    pipe.set(self.KEY_PREFIX + key, 0, ex=self.window_seconds, nx=True)
+                    pipe.incr(self.KEY_PREFIX + key)
+                    pipe.execute()
+                    continue
+                except Exception as e:
+                    logger.warning(f"Rate limit update failed for {key}: {str(e)}")
+            with self._lock:
+                now = time.monotonic()
+                self._sweep(now)
+                count, reset_at = self._local.get(key, (0, 0.0))
+                if reset_at <= now:
+                    count, reset_at = 0, now + self.window_seconds
+                self._local[key] = (count + 1, reset_at)
+
+    def _sweep(self, now: float) -> None:
+        # 调用方持有锁；最多每个窗口（且不超过一分钟）清理一次过期键
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + min(self.window_seconds, 60)
+        for key in [key for key, (_, reset_at) in self._local.items() if reset_at <= now]:
+            del self._local[key]
+
+    def reset(self, key: str) -> None:
+        client = get_redis()
+        if client is not None:
+            try:
+                client.delete(self.KEY_PREFIX + key)
+            except Exception:
+                pass
+        with self._lock:
+            self._local.pop(key, None)
+
+
+login_limiter = FailureLimiter(LOGIN_WINDOW_SECONDS)
+
+
+def login_limits(username: str, client_ip: Optional[str]) -> Dict[str, int]:
+    """Rate limit keys and their failure limits for a login attempt."""
+    limits = {f"login:account:{username.lower()}": LOGIN_MAX_FAILURES_PER_ACCOUNT}
+    if client_ip:
+        limits[f"login:ip:{client_ip}"] = LOGIN_MAX_FAILURES_PER_IP
+    return limits
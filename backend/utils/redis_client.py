@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Callable, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import redis
+except ImportError:  # redis 为可选依赖，未安装时使用进程内实现
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+T = TypeVar("T")
+
+_client = None
+_initialized = False
+_lock = threading.Lock()
+
+
+def get_redis():
+    """Return the shared Redis client, or None when Redis is not configured or unavailable."""
+    global _client, _initialized
+    if _initialized:
+        return _client
+    with _lock:
+        if _initialized:
+            return _client
+        if redis is not None and REDIS_URL:
+            try:
+                client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, decode_responses=True)
+                client.ping()
+                _client = client
+            except Exception as e:
+                logger.warning(f"Redis unavailable, falling back to in-process state: {str(e)}")
+        _initialized = True
+        return _client
+
+
+async def call_redis(func: Callable[..., T], *args: Any) -> T:
+    """Run ``func``, which may talk to Redis, without blocking the event loop.
+
+    The sync client blocks on every round trip, so with Redis configured the
+    call goes to the threadpool; the in-process fallbacks run inline.
+    """
+    if get_redis() is None:
+        return func(*args)
+    return await run_in_threadpool(func, *args)
+
+
+def redis_in_background(func: Callable[..., Any], *args: Any) -> None:
+    """Fire-and-forget a Redis write from sync code such as session events.
+
+    On the event loop thread (e.g. after an AsyncSession commit) the call is
+    handed to the default executor; elsewhere it runs inline. ``func`` must
+    handle its own errors.
+    """
+    if get_redis() is not None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            loop.run_in_executor(None, func, *args)
+            return
+    func(*args)
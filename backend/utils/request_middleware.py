@@ -0,0 +1,111 @@
+from typing import Optional
+import logging
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database import bind_request_identity, reset_request_identity
+from utils import metrics
+from utils.logger import allowed_headers, api_logger, error_logger, log_event, should_log_success
+from utils.tracing import current_trace_id, span
+
+
+def _route(scope: Scope) -> Optional[str]:
+    # 路由匹配后 FastAPI 把 APIRoute 写入 scope
+    return getattr(scope.get("route"), "path", None)
+
+
+def _request_fields(request: Request, start_time: float) -> dict:
+    return {
+        "method": request.method,
+        # 路由模板基数低，便于聚合；path 保留实际请求路径
+        "route": _route(request.scope),
+        "path": request.url.path,
+        "duration_ms": round((time.perf_counter() - start_time) * 1000, 1),
+        "client": request.client.host if request.client else None,
+        "request_id": request.headers.get("x-request-id"),
+        "trace_id": current_trace_id(),
+    }
+
+
+class RequestMiddleware:
+    """Per-request tracing, metrics, read-your-writes binding and request logging.
+
+    A plain ASGI middleware rather than four ``@app.middleware("http")``
+    layers: each of those wraps the app in its own task and buffers the
+    response through a memory stream. Everything here runs until the last
+    body chunk is sent, so the root span, the duration metric and the logged
+    ``duration_ms`` cover a ``StreamingResponse`` body, not only its headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        method, path = request.method, request.url.path
+        group = metrics.path_group(path)
+        start_time = time.perf_counter()
+        status_code = 500
+
+        metrics.http_in_flight.inc(group=group)
+        db_stats, stats_token = metrics.begin_request_db_stats()
+        # 绑定请求身份，用于写后读一致（写入后的读取暂时走主库）
+        identity_token = bind_request_identity(request.headers.get("authorization"))
+        try:
+            # 每个请求一个根 span，SQL、向量检索、大模型调用等作为子 span
+            with span(
+                f"{method} {path}",
+                headers=request.headers,
+                **{"http.method": method, "http.target": path}
+            ) as request_span:
+                async def send_with_trace(message: Message) -> None:
+                    nonlocal status_code
+                    if message["type"] == "http.response.start":
+                        status_code = message["status"]
+                        request_span.set_attribute("http.status_code", status_code)
+                        if request_span.trace is not None:
+                            MutableHeaders(scope=message).append("X-Trace-Id", request_span.trace.trace_id)
+                    await send(message)
+
+                try:
+                    await self.app(scope, receive, send_with_trace)
+                except Exception as e:
+                    log_event(
+                        error_logger, logging.ERROR, "request_failed",
+                        **_request_fields(request, start_time),
+                        headers=allowed_headers(request.headers),
+                        error=str(e),
+                        error_type=type(e).__name__
+                    )
+                    raise
+                finally:
+                    route = _route(scope)
+                    if route:
+                        request_span.rename(f"{method} {route}")
+                        request_span.set_attribute("http.route", route)
+
+                # 每个请求最多一行日志，成功请求按路由采样，错误始终记录
+                if status_code >= 400:
+                    log_event(
+                        api_logger, logging.ERROR if status_code >= 500 else logging.WARNING, "request",
+                        **_request_fields(request, start_time),
+                        status=status_code,
+                        headers=allowed_headers(request.headers)
+                    )
+                elif should_log_success(path):
+                    log_event(api_logger, logging.INFO, "request", **_request_fields(request, start_time), status=status_code)
+        finally:
+            reset_request_identity(identity_token)
+            # 按路由模板统计延迟和状态码，以及每个请求的 SQL 条数和耗时
+            route = _route(scope) or "unmatched"
+            metrics.http_in_flight.dec(group=group)
+            metrics.http_request_duration.observe(time.perf_counter() - start_time, method=method, route=route)
+            metrics.http_requests.inc(method=method, route=route, status=status_code)
+            metrics.end_request_db_stats(db_stats, stats_token, route)
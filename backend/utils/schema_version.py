@@ -0,0 +1,56 @@
+from pathlib import Path
+from typing import Optional, Tuple
+import logging
+import os
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# 启动时的表结构版本检查: strict 版本不符时拒绝启动，warn 只记录日志，off 跳过
+DB_SCHEMA_CHECK = os.getenv("DB_SCHEMA_CHECK", "strict").lower()
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def expected_revision() -> Optional[str]:
+    """Head revision of the migration scripts shipped with this code."""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def current_revision(engine) -> Optional[str]:
+    """Revision recorded in the database's alembic_version row, or None if never migrated."""
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+        except Exception:
+            return None
+
+
+def check_schema_version(engine, mode: str = DB_SCHEMA_CHECK) -> Tuple[Optional[str], Optional[str]]:
+    """Compare the database revision with the code's head; one single-row query.
+
+    Worker startup calls this instead of creating tables or seeding data;
+    ``scripts/bootstrap.py`` brings the database up to date.
+    """
+    if mode == "off":
+        return None, None
+    current, expected = current_revision(engine), expected_revision()
+    if current != expected:
+        message = (
+            f"Database schema is at revision {current or 'none'}, code expects {expected}; "
+            f"run python scripts/bootstrap.py"
+        )
+        if mode == "strict":
+            raise SchemaVersionError(message)
+        logger.warning(message)
+    return current, expected
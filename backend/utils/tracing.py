@@ -0,0 +1,384 @@
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import random
+import secrets
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.logger import api_logger, log_event, setup_logger
+
+logger = logging.getLogger(__name__)
+
+# 关闭后 span() 不做任何记录
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# 导出方式: none 只在进程内保留慢请求，file 写入 JSON Lines，otlp 发送到本地 collector（需要 opentelemetry-sdk）
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+# file 导出的文件名（位于 LOG_DIR 下，按日志配置轮转）
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# 导出的请求比例（0-1）；慢请求始终导出
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+# 超过该耗时（毫秒）的请求记录各阶段耗时并保留完整 span
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+# 单个 trace 最多记录的 span 数，超过的只计数
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+# 进程内保留的最近慢 trace 数
+TRACE_KEEP_SLOW = int(os.getenv("TRACE_KEEP_SLOW", "50"))
+# SQL 语句在 span 中保留的最大长度
+TRACE_STATEMENT_LENGTH = 500
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# opentelemetry 只在 TRACE_EXPORTER=otlp 时导入
+_tracer = None
+_tracer_provider = None
+_otel = None
+_trace_file_logger: Optional[logging.Logger] = None
+
+slow_traces: "deque[Dict[str, Any]]" = deque(maxlen=TRACE_KEEP_SLOW)
+
+
+class Trace:
+    """Spans recorded for one request or background job."""
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            if len(self.spans) < TRACE_MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def stages(self) -> Dict[str, Dict[str, Any]]:
+        """Self time per stage (the span name's prefix: db, vector, llm, ...).
+
+        A span's self time excludes its children, so nested stages are not
+        counted twice; the root's self time is reported as ``app``.
+        """
+        with self._lock:
+            spans = [span for span in self.spans if span.duration is not None]
+        child_time: Dict[int, float] = {}
+        for span in spans:
+            if span.parent is not None:
+                child_time[id(span.parent)] = child_time.get(id(span.parent), 0.0) + span.duration
+        stages: Dict[str, Dict[str, Any]] = {}
+        for span in spans:
+            stage = "app" if span.parent is None else span.name.split(".", 1)[0]
+            entry = stages.setdefault(stage, {"ms": 0.0, "count": 0})
+            entry["ms"] += max(0.0, span.duration - child_time.get(id(span), 0.0)) * 1000
+            entry["count"] += 1
+        return {
+            stage: {"ms": round(entry["ms"], 1), "count": entry["count"]}
+            for stage, entry in sorted(stages.items(), key=lambda item: item[1]["ms"], reverse=True)
+        }
+
+    def finish(self, root: "Span") -> None:
+        duration_ms = root.duration * 1000
+        slow = duration_ms >= TRACE_SLOW_MS
+        if not (slow or (self.sampled and _trace_file_logger is not None)):
+            return
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        if slow:
+            stages = self.stages()
+            slow_traces.append({
+                "trace_id": self.trace_id,
+                "name": root.name,
+                "duration_ms": round(duration_ms, 1),
+                "started_at": root.start_wall,
+                "stages": stages,
+                "dropped_spans": self.dropped,
+                "spans": spans,
+            })
+            log_event(
+                api_logger, logging.WARNING, "slow_trace",
+                trace_id=self.trace_id,
+                route=root.attributes.get("http.route"),
+                method=root.attributes.get("http.method"),
+                duration_ms=round(duration_ms, 1),
+                stages=stages
+            )
+        if _trace_file_logger is not None:
+            for span in spans:
+                _trace_file_logger.info(span)
+
+
+class Span:
+    __slots__ = ("trace", "parent", "span_id", "parent_span_id", "name", "attributes",
+                 "start", "start_wall", "duration", "error", "otel")
+
+    def __init__(self, trace: Trace, parent: Optional["Span"], name: str, attributes: Dict[str, Any],
+                 span_id: str, parent_span_id: Optional[str], otel: Any = None):
+        self.trace = trace
+        self.parent = parent
+        self.span_id = span_id
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.start_wall = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self.otel = otel
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+        if self.otel is not None:
+            self.otel.set_attribute(key, value)
+
+    def rename(self, name: str) -> None:
+        self.name = name
+        if self.otel is not None:
+            self.otel.update_name(name)
+
+    def record_error(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+        if self.otel is not None:
+            self.otel.record_exception(exc)
+            self.otel.set_status(_otel.Status(_otel.StatusCode.ERROR, str(exc)))
+
+    def end(self) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if self.otel is not None:
+            self.otel.end()
+        if self.parent is None:
+            self.trace.finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        start_ns = int(self.start_wall * 1e9)
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": start_ns,
+            "end_time_unix_nano": start_ns + int(duration * 1e9),
+            "duration_ms": round(duration * 1000, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    trace = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def rename(self, name: str) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span_id, sampled) from a W3C ``traceparent`` header."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    require_parent: bool = False
+) -> Optional[Span]:
+    """Start a span under the current one; without a current span it starts a new trace.
+
+    The caller must ``end()`` it. ``headers`` continue an incoming W3C trace;
+    ``require_parent`` skips spans outside any trace (startup queries etc.).
+    """
+    if not TRACING_ENABLED:
+        return None
+    parent = _current_span.get()
+    if parent is None and require_parent:
+        return None
+    attributes = dict(attributes or {})
+
+    otel = None
+    if _tracer is not None:
+        context = _otel.propagate.extract(headers) if parent is None and headers is not None else None
+        otel = _tracer.start_span(name, context=context, attributes=attributes)
+
+    if parent is not None:
+        trace, parent_span_id = parent.trace, parent.span_id
+    else:
+        remote = _parse_traceparent(headers.get("traceparent")) if headers is not None else None
+        parent_span_id = remote[1] if remote else None
+        if otel is not None:
+            context = otel.get_span_context()
+            trace = Trace(format(context.trace_id, "032x"), context.trace_flags.sampled)
+        elif remote:
+            trace = Trace(remote[0], remote[2])
+        else:
+            trace = Trace(secrets.token_hex(16), random.random() < TRACE_SAMPLE_RATE)
+
+    span_id = format(otel.get_span_context().span_id, "016x") if otel is not None else secrets.token_hex(8)
+    span = Span(trace, parent, name, attributes, span_id, parent_span_id, otel)
+    trace.add(span)
+    return span
+
+
+@contextmanager
+def span(name: str, headers: Optional[Mapping[str, str]] = None, **attributes: Any) -> Iterator[Any]:
+    """Record ``name`` as the current span for the duration of the block."""
+    current = start_span(name, attributes, headers)
+    if current is None:
+        yield NOOP_SPAN
+        return
+    token = _current_span.set(current)
+    scope = (
+        _otel.trace.use_span(current.otel, record_exception=False, set_status_on_exception=False)
+        if current.otel is not None else nullcontext()
+    )
+    try:
+        with scope:
+            yield current
+    except Exception as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of ``span`` for sync and async functions."""
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.trace_id if current is not None else None
+
+
+def submit_in_context(pool, func: Callable, *args: Any):
+    """Submit ``func`` to an executor so spans it opens join the caller's trace."""
+    return pool.submit(copy_context().run, func, *args)
+
+
+def get_slow_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    for entry in reversed(slow_traces):
+        if entry["trace_id"] == trace_id:
+            return entry
+    return None
+
+
+class _SpanFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+def setup_tracing() -> None:
+    """Configure the exporter named by ``TRACE_EXPORTER``; call once per process."""
+    global _tracer, _tracer_provider, _otel, _trace_file_logger
+    if not TRACING_ENABLED:
+        return
+
+    if TRACE_EXPORTER == "file" and _trace_file_logger is None:
+        _trace_file_logger = setup_logger(
+            "trace", TRACE_FILE, formatter=_SpanFormatter(), console=False, to_file=True
+        )
+        _trace_file_logger.propagate = False
+
+    if TRACE_EXPORTER == "otlp" and _tracer is None:
+        try:
+            from types import SimpleNamespace
+            from opentelemetry import propagate, trace
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+            from opentelemetry.trace import Status, StatusCode
+        except ImportError:
+            logger.warning("TRACE_EXPORTER=otlp but opentelemetry-sdk is not installed; traces stay in-process")
+            return
+
+        # collector 地址等由标准的 OTEL_EXPORTER_OTLP_* 环境变量配置
+        _tracer_provider = TracerProvider(
+            resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "course-system-api")}),
+            sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATE))
+        )
+        _tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        _otel = SimpleNamespace(trace=trace, propagate=propagate, Status=Status, StatusCode=StatusCode)
+        _tracer = _tracer_provider.get_tracer("course-system")
+
+
+def shutdown_tracing() -> None:
+    """Flush spans still buffered by the OTLP exporter."""
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_span(conn, cursor, statement, parameters, context, executemany) -> None:
+    query_span = start_span("db.query", require_parent=True)
+    if query_span is not None:
+        query_span.set_attribute("db.statement", statement[:TRACE_STATEMENT_LENGTH])
+        query_span.set_attribute("db.system", conn.dialect.name)
+    conn.info.setdefault("trace_query_spans", []).append(query_span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query_span(conn, cursor, statement, parameters, context, executemany) -> None:
+    spans = conn.info.get("trace_query_spans")
+    query_span = spans.pop() if spans else None
+    if query_span is not None:
+        if cursor is not None and cursor.rowcount is not None and cursor.rowcount >= 0:
+            query_span.set_attribute("db.rowcount", cursor.rowcount)
+        query_span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_query_span(exception_context) -> None:
+    connection = exception_context.connection
+    spans = connection.info.get("trace_query_spans") if connection is not None else None
+    query_span = spans.pop() if spans else None
+    if query_span is not None:
+        query_span.record_error(exception_context.original_exception)
+        query_span.end()
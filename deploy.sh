@@ -255,7 +255,7 @@ print_info "检测到服务器IP: $SERVER_IP"
 
 # 运行数据库迁移
 print_info "运行数据库迁移..."
-$DOCKER_COMPOSE_CMD exec -T backend alembic upgrade head
+$DOCKER_COMPOSE_CMD exec -T backend python scripts/bootstrap.py
 
 # 初始化数据
 print_info "初始化数据..."
@@ -273,7 +273,8 @@ EOF
 # 创建日志轮转配置
 print_info "配置日志轮转..."
 cat > /etc/logrotate.d/ai_course_system << EOF
-/var/log/ai_course_system_*.log {
+# 应用日志默认所有 worker 追加写同一文件（LOG_ROTATION=watched），由这里轮转
+/var/log/ai_course_system_*.log /opt/ai_course_system/logs/*.log {
     daily
     rotate 7
     compress
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 测试用独立的 SQLite 库，必须在导入 backend 模块之前设置
+_TEST_DB = os.path.join(tempfile.mkdtemp(prefix="ai_course_test_"), "test.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TEST_DB}")
+
+# 与容器内一致只用一个包路径：backend 目录本身（容器里 tests 挂在 /app/tests 下）
+_TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(_TESTS_DIR), "backend")
+if not os.path.isdir(BACKEND_DIR):
+    BACKEND_DIR = os.path.dirname(_TESTS_DIR)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def backend_dir() -> str:
+    return BACKEND_DIR
@@ -0,0 +1,42 @@
+"""Importing the same document twice updates its entry instead of duplicating it."""
+import pytest
+
+import models
+from database import Base, SessionLocal, engine
+from utils.bulk_importer import _upsert_entries
+
+# 只建被测的表
+TABLES = [models.User.__table__, models.KnowledgeBase.__table__]
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine, tables=TABLES)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine, tables=TABLES)
+
+
+def _entry(doc_key: str, title: str, owner_id: int = 1) -> dict:
+    return {
+        "title": title,
+        "content": f"{title} content",
+        "category": "default",
+        "file_path": None,
+        "owner_id": owner_id,
+        "doc_key": doc_key,
+        "metadata": "{}"
+    }
+
+
+def test_reimport_updates_existing_entry(db):
+    _upsert_entries(db, [_entry("doc-1", "first")])
+    db.commit()
+    # 新的导入任务（没有检查点）再次导入同一文件
+    _upsert_entries(db, [_entry("doc-1", "renamed", owner_id=2), _entry("doc-2", "second")])
+    db.commit()
+
+    rows = db.query(models.KnowledgeBase.doc_key, models.KnowledgeBase.title, models.KnowledgeBase.owner_id) \
+        .order_by(models.KnowledgeBase.doc_key).all()
+    assert rows == [("doc-1", "renamed", 1), ("doc-2", "second", 1)]
@@ -0,0 +1,44 @@
+"""Writing chat messages moves their session to the top of the session list."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import AsyncSessionLocal, Base, SessionLocal, engine
+from models.chatbot import ChatMessage, ChatSession
+from models import User
+from utils.history_writer import HistoryWriter
+
+# 只建被测的表
+TABLES = [User.__table__, ChatSession.__table__, ChatMessage.__table__]
+
+
+@pytest.fixture
+def sessions():
+    Base.metadata.create_all(engine, tables=TABLES)
+    created = datetime(2024, 1, 1)
+    db = SessionLocal()
+    db.add_all([
+        User(id=1, email="student@example.com", username="student"),
+        ChatSession(id=1, user_id=1, title="old", created_at=created, updated_at=created),
+        ChatSession(id=2, user_id=1, title="new", created_at=created, updated_at=created + timedelta(days=1)),
+    ])
+    db.commit()
+    yield db
+    db.close()
+    Base.metadata.drop_all(engine, tables=TABLES)
+
+
+@pytest.mark.asyncio
+async def test_message_bumps_session_updated_at(sessions, tmp_path):
+    writer = HistoryWriter(
+        session_factory=AsyncSessionLocal,
+        spill_path=tmp_path / "spill.jsonl",
+        dead_letter_path=tmp_path / "dead_letter.jsonl"
+    )
+    sent = datetime(2024, 1, 5)
+    await writer.enqueue(ChatMessage, {"session_id": 1, "role": "user", "content": "hi", "created_at": sent})
+
+    assert writer.rows_written == 1
+    sessions.expire_all()
+    assert sessions.get(ChatSession, 1).updated_at == sent
+    assert sessions.get(ChatSession, 2).updated_at == datetime(2024, 1, 2)
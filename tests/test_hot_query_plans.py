@@ -0,0 +1,95 @@
+"""Hot queries must stay on an index after `alembic upgrade head`.
+
+Runs the migrations the same way a deployment does (`alembic upgrade head`
+inside backend/), then EXPLAINs every query against the migrated test
+database. On Postgres enable_seqscan is turned off so the planner picks any
+usable index even on tiny tables; on SQLite any SCAN in EXPLAIN QUERY PLAN
+without USING INDEX fails the test.
+"""
+import os
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+# (名称, 表名, SQL) —— 与各路由中的过滤和排序条件保持一致
+HOT_QUERIES: List[Tuple[str, str, str]] = [
+    ("chat history by agent", "chat_history",
+     "SELECT * FROM chat_history WHERE user_id = 1 AND agent_type = 'course_qa' "
+     "ORDER BY timestamp DESC LIMIT 50"),
+    ("chat history", "chat_history",
+     "SELECT * FROM chat_history WHERE user_id = 1 ORDER BY timestamp DESC LIMIT 50"),
+    ("chat sessions", "chat_sessions",
+     "SELECT * FROM chat_sessions WHERE user_id = 1 AND is_active = true "
+     "ORDER BY updated_at DESC, id DESC LIMIT 21"),
+    ("session messages", "chat_messages",
+     "SELECT * FROM chat_messages WHERE session_id = 1 ORDER BY created_at, id LIMIT 101"),
+    ("knowledge list", "knowledge_base",
+     "SELECT * FROM knowledge_base WHERE owner_id = 1 ORDER BY id LIMIT 101"),
+    ("knowledge list by category", "knowledge_base",
+     "SELECT * FROM knowledge_base WHERE owner_id = 1 AND category = 'document' ORDER BY id LIMIT 101"),
+    ("portfolio progress", "portfolio_progress",
+     "SELECT * FROM portfolio_progress WHERE student_id = 1 ORDER BY id LIMIT 101"),
+    ("portfolio recent", "portfolio_progress",
+     "SELECT * FROM portfolio_progress WHERE student_id = 1 ORDER BY last_updated DESC LIMIT 5"),
+    ("checklists", "application_checklist",
+     "SELECT * FROM application_checklist WHERE user_id = 1 ORDER BY id LIMIT 101"),
+    ("file permission", "file_permissions",
+     "SELECT * FROM file_permissions WHERE file_id = 1 AND user_id = 1"),
+    ("user roles", "user_roles",
+     "SELECT * FROM user_roles WHERE user_id = 1 AND role_id = 1"),
+    ("platform integration lookup", "platform_integrations",
+     "SELECT * FROM platform_integrations WHERE platform_type = 'wechat' "
+     "AND platform_user_id = 'u1' AND is_active = true"),
+    ("platform messages", "platform_messages",
+     "SELECT * FROM platform_messages WHERE platform_integration_id = 1 "
+     "ORDER BY created_at DESC LIMIT 50"),
+    ("enrollment status counts", "enrollments",
+     "SELECT status, count(id) FROM enrollments WHERE student_id = 1 GROUP BY status"),
+    ("recent activities", "activities",
+     "SELECT * FROM activities WHERE student_id = 1 ORDER BY date DESC, id DESC LIMIT 11"),
+    ("milestones", "milestones",
+     "SELECT * FROM milestones WHERE student_id = 1 ORDER BY id LIMIT 51"),
+]
+
+
+def full_scan(conn, sql: str) -> Optional[str]:
+    """Return the offending plan line if ``sql`` scans a whole table."""
+    if conn.dialect.name == "postgresql":
+        plan = [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+        offending = [line for line in plan if "Seq Scan" in line]
+    else:
+        plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        offending = [
+            line for line in plan
+            if line.startswith("SCAN") and "USING" not in line
+        ]
+    return offending[0].strip() if offending else None
+
+
+@pytest.fixture(scope="module")
+def migrated_conn(backend_dir):
+    # 子进程里执行，迁移使用的 backend 模块不会进入测试进程
+    result = subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=backend_dir, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    engine = create_engine(os.environ["DATABASE_URL"])
+    try:
+        with engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SET enable_seqscan = off"))
+            yield conn
+    finally:
+        engine.dispose()
+
+
+@pytest.mark.parametrize("name,table,sql", HOT_QUERIES, ids=[name for name, _, _ in HOT_QUERIES])
+def test_hot_query_uses_index(migrated_conn, name, table, sql):
+    # 表缺失同样算失败，说明迁移漏建了它
+    assert table in inspect(migrated_conn).get_table_names(), f"{name}: table {table} is missing"
+    offending = full_scan(migrated_conn, sql)
+    assert offending is None, f"{name}: full table scan ({offending})"
@@ -0,0 +1,73 @@
+"""File grants must not leak knowledge entries, and search keeps the collection's visibility."""
+import pytest
+import pytest_asyncio
+from fastapi import Response
+
+import models
+from database import AsyncSessionLocal, Base, SessionLocal, engine
+from routes import knowledge, media
+from utils.permission_utils import FILE_PERMISSION_BITS, resolve_resource_permissions
+
+OWNER = 1
+GRANTEE = 2
+ENTRY_ID = 7
+
+# 只建被测的表
+TABLES = [models.User.__table__, models.KnowledgeBase.__table__, models.FilePermission.__table__]
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine, tables=TABLES)
+    session = SessionLocal()
+    session.add_all([
+        models.User(id=OWNER, email="owner@example.com", username="owner"),
+        models.User(id=GRANTEE, email="grantee@example.com", username="grantee"),
+        models.KnowledgeBase(id=ENTRY_ID, title="notes", category="document", owner_id=OWNER, doc_key="doc-7"),
+        # files.id 与 knowledge_base.id 恰好相同的授权
+        models.FilePermission(file_id=ENTRY_ID, user_id=GRANTEE, permission_type="read"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine, tables=TABLES)
+
+
+@pytest.mark.asyncio
+async def test_file_grant_does_not_expose_knowledge_entry(db):
+    grantee = db.get(models.User, GRANTEE)
+    # 授权本身对文件有效
+    masks = resolve_resource_permissions(GRANTEE, [ENTRY_ID], "file", db)
+    assert masks[ENTRY_ID] & FILE_PERMISSION_BITS["read"]
+
+    entries = await media.list_files(
+        response=Response(), file_type=None, category=None, cursor=None, limit=100, db=db, current_user=grantee
+    )
+    assert entries == []
+
+    owner = db.get(models.User, OWNER)
+    entries = await media.list_files(
+        response=Response(), file_type=None, category=None, cursor=None, limit=100, db=db, current_user=owner
+    )
+    assert [entry["id"] for entry in entries] == [ENTRY_ID]
+
+
+@pytest_asyncio.fixture
+async def async_db(db):
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.mark.asyncio
+async def test_shared_collection_search_is_unfiltered(async_db, monkeypatch):
+    monkeypatch.setattr(knowledge, "PRIVATE_COLLECTIONS", set())
+    hits = [{"content": "notes", "metadata": {"doc_key": "doc-7"}}]
+    assert await knowledge._visible_results(hits, "course", GRANTEE, async_db) == hits
+
+
+@pytest.mark.asyncio
+async def test_private_collection_search_returns_own_entries(async_db, monkeypatch):
+    monkeypatch.setattr(knowledge, "PRIVATE_COLLECTIONS", {"personal"})
+    hits = [{"content": "notes", "metadata": {"doc_key": "doc-7"}}]
+    assert await knowledge._visible_results(hits, "personal", GRANTEE, async_db) == []
+    assert await knowledge._visible_results(hits, "personal", OWNER, async_db) == hits
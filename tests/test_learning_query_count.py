@@ -0,0 +1,181 @@
+"""The learning progress endpoints must issue a fixed number of queries, however much data a student has."""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi import Response
+from sqlalchemy import event, update
+
+from database import AsyncSessionLocal, Base, async_engine
+from models.learning import Activity, Course, Enrollment, Milestone, Student, StudentProgressSnapshot
+from routes import learning
+from utils.pagination import MAX_PAGE_SIZE
+from utils.progress_snapshot import SNAPSHOT_LIST_SIZE
+
+SMALL_STUDENT = 1
+LARGE_STUDENT = 2
+
+# 只建被测的表
+TABLES = [
+    model.__table__
+    for model in (Student, Course, Enrollment, Activity, Milestone, StudentProgressSnapshot)
+]
+
+
+@contextmanager
+def count_queries():
+    """Count every statement sent to the database inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def _seed(db, student_id: int, size: int) -> None:
+    start = datetime.utcnow() - timedelta(days=size)
+    db.add(Student(id=student_id, name=f"student-{student_id}"))
+    courses = [Course(name=f"course-{student_id}-{i}") for i in range(size)]
+    db.add_all(courses)
+    await db.flush()
+    for i, course in enumerate(courses):
+        db.add(Enrollment(
+            student_id=student_id,
+            course_id=course.id,
+            status=("completed", "in_progress", "not_started")[i % 3],
+            progress=float(i % 100),
+            last_activity=start + timedelta(days=i)
+        ))
+        db.add(Activity(
+            student_id=student_id,
+            course_id=course.id,
+            description=f"activity {i}",
+            status="completed",
+            date=start + timedelta(days=i)
+        ))
+        db.add(Milestone(
+            student_id=student_id,
+            title=f"milestone {i}",
+            description=f"milestone {i}",
+            progress=float(i % 100)
+        ))
+
+
+@pytest_asyncio.fixture
+async def seeded():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    async with AsyncSessionLocal() as db:
+        await _seed(db, SMALL_STUDENT, 3)
+        await _seed(db, LARGE_STUDENT, 300)
+        await db.commit()
+    yield
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all, tables=TABLES)
+
+
+async def _progress(student_id, limit):
+    return await learning.get_learning_progress(
+        student_id=student_id,
+        limit=limit,
+        courses_cursor=None,
+        activities_cursor=None,
+        milestones_cursor=None
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("student_id", [SMALL_STUDENT, LARGE_STUDENT])
+async def test_section_progress_query_count(seeded, student_id):
+    # 超过快照长度的 limit 走四个并发分区查询
+    limit = min(SNAPSHOT_LIST_SIZE + 1, MAX_PAGE_SIZE)
+    with count_queries() as statements:
+        await _progress(student_id, limit)
+    # 总体统计、课程、活动、里程碑各一条
+    assert len(statements) == 4, statements
+
+
+@pytest.mark.asyncio
+async def test_snapshot_progress_query_count(seeded):
+    counts = {}
+    for student_id in (SMALL_STUDENT, LARGE_STUDENT):
+        await _progress(student_id, 10)  # 首次访问时建快照
+        with count_queries() as statements:
+            await _progress(student_id, 10)
+        counts[student_id] = len(statements)
+    # 快照建好后只读一行
+    assert counts == {SMALL_STUDENT: 1, LARGE_STUDENT: 1}
+
+
+@pytest.mark.asyncio
+async def test_cohort_progress_query_count(seeded):
+    await _progress(LARGE_STUDENT, 10)  # 只有一个学生有快照
+    async with AsyncSessionLocal() as db:
+        with count_queries() as statements:
+            entries = await learning.get_cohort_progress(response=Response(), limit=100, cursor=None, db=db)
+    assert len(statements) == 1, statements
+    # 没有快照的学生从基础表统计，结果与快照一致
+    counts = {
+        entry.studentId: (entry.completed, entry.inProgress, entry.notStarted, entry.activityCount, entry.milestoneCount)
+        for entry in entries
+    }
+    assert counts == {SMALL_STUDENT: (1, 1, 1, 3, 3), LARGE_STUDENT: (100, 100, 100, 300, 300)}
+
+
+@pytest.mark.asyncio
+async def test_courses_without_activity_come_last(seeded):
+    async with AsyncSessionLocal() as db:
+        course = Course(name="never opened")
+        db.add(course)
+        await db.flush()
+        enrollment = Enrollment(student_id=SMALL_STUDENT, course_id=course.id, status="not_started")
+        db.add(enrollment)
+        await db.flush()
+        # 列有默认值，NULL 只能事后写入（如旧数据）
+        await db.execute(update(Enrollment).where(Enrollment.id == enrollment.id).values(last_activity=None))
+        await db.commit()
+
+    snapshot = await _progress(SMALL_STUDENT, 10)
+    assert (snapshot.courses[-1].name, snapshot.courses[-1].lastActivity) == ("never opened", None)
+
+    # 第一页来自快照，之后按游标逐条翻页走分区查询，一直翻到 NULL 段
+    page = await _progress(SMALL_STUDENT, 1)
+    names, cursor = [entry.name for entry in page.courses], page.coursesCursor
+    while cursor:
+        page = await learning.get_learning_progress(
+            student_id=SMALL_STUDENT,
+            limit=1,
+            courses_cursor=cursor,
+            activities_cursor=None,
+            milestones_cursor=None
+        )
+        names.extend(entry.name for entry in page.courses)
+        cursor = page.coursesCursor
+    assert names == [entry.name for entry in snapshot.courses]
+
+
+@pytest.mark.asyncio
+async def test_enrollment_change_refreshes_snapshot(seeded):
+    before = await _progress(SMALL_STUDENT, 10)  # 建快照
+    async with AsyncSessionLocal() as db:
+        course = Course(name="new course")
+        db.add(course)
+        await db.flush()
+        db.add(Enrollment(student_id=SMALL_STUDENT, course_id=course.id, status="completed"))
+        await db.commit()
+
+    after = await _progress(SMALL_STUDENT, 10)
+    assert after.overall.completed == before.overall.completed + 1
+    assert after.courses[0].name == "new course"
+
+    async with AsyncSessionLocal() as db:
+        course.name = "renamed course"
+        db.add(course)
+        await db.commit()
+    assert (await _progress(SMALL_STUDENT, 10)).courses[0].name == "renamed course"
@@ -0,0 +1,56 @@
+"""The request middleware keeps the root span and metrics open while a streamed body is sent."""
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from utils import metrics
+from utils.request_middleware import RequestMiddleware
+from utils.tracing import current_trace_id
+
+CHUNK_DELAY = 0.05
+
+
+def _app(seen_trace_ids: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestMiddleware)
+
+    @app.get("/stream/{chunks}")
+    async def stream(chunks: int):
+        async def body():
+            for i in range(chunks):
+                await asyncio.sleep(CHUNK_DELAY)
+                seen_trace_ids.append(current_trace_id())
+                yield f"{i}\n"
+        return StreamingResponse(body(), media_type="text/plain")
+
+    return app
+
+
+def _duration_sum(route: str) -> float:
+    return sum(total[0] for key, (_, total) in metrics.http_request_duration._values.items() if key[1] == route)
+
+
+def test_streamed_body_runs_inside_the_request_span():
+    seen_trace_ids = []
+    before = _duration_sum("/stream/{chunks}")
+
+    response = TestClient(_app(seen_trace_ids)).get("/stream/3")
+
+    assert response.status_code == 200
+    assert response.text == "0\n1\n2\n"
+    trace_id = response.headers["X-Trace-Id"]
+    # 响应体的每一块都在根 span 内生成
+    assert seen_trace_ids == [trace_id] * 3
+    # 延迟指标包含发送响应体的时间，并按路由模板记录
+    assert _duration_sum("/stream/{chunks}") - before >= 3 * CHUNK_DELAY
+
+
+def test_unmatched_path_is_counted_as_404():
+    response = TestClient(_app([])).get("/missing")
+
+    assert response.status_code == 404
+    assert "X-Trace-Id" in response.headers
+    key = metrics.http_requests._key({"method": "GET", "route": "unmatched", "status": 404})
+    assert metrics.http_requests._values[key] >= 1